@@ -0,0 +1,41 @@
+# benchmarks/_timing.py
+"""Timing helpers and the result record format shared by all benchmarks."""
+import statistics
+import time
+
+
+def measure(func, repeat=5, number=1, warmup=1):
+    """
+    Call ``func`` ``number`` times per round for ``repeat`` rounds, after
+    ``warmup`` untimed calls (template compilation, query caches, ...).
+
+    Returns:
+        dict: per-call ``min``, ``median`` and ``mean`` seconds.
+    """
+    for _ in range(warmup):
+        func()
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - started) / number)
+    return {
+        "min": min(rounds),
+        "median": statistics.median(rounds),
+        "mean": statistics.fmean(rounds),
+    }
+
+
+def record(benchmark, params, timings, ops=1):
+    """
+    Build one result record. ``ops`` is the amount of work per call (rows,
+    readings, ...) so ``ops_per_sec`` is comparable across sizes.
+    """
+    return {
+        "benchmark": benchmark,
+        "params": params,
+        "seconds": timings,
+        "ops_per_sec": ops / timings["median"] if timings["median"] else None,
+    }
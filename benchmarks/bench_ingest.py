@@ -0,0 +1,31 @@
+# benchmarks/bench_ingest.py
+"""Rows/sec through the simulator write path (BlockSimulatorThread.tick)."""
+from benchmarks._django import seed_readings
+from benchmarks._timing import measure, record
+
+DEFAULT_TICKS = 500
+DEFAULT_EXISTING = (0, 10_000)
+
+
+def run(ticks=DEFAULT_TICKS, existing_sizes=DEFAULT_EXISTING, repeat=3):
+    from django.contrib.auth.models import User
+
+    from flock.models import FlockBlock
+    from monitoring.services.block_simulator import BlockSimulatorThread
+
+    results = []
+    for existing in existing_sizes:
+        user = User.objects.create_user(f"ingest{existing}", f"ingest{existing}@example.com", "bench")
+        block = FlockBlock.objects.create(user=user, name="Ingest", breed="broiler", age_group="adult")
+        seed_readings(block, existing)
+
+        # Never started: tick() runs the write path on this thread, no sleeping
+        sim = BlockSimulatorThread(block)
+
+        def ingest():
+            for _ in range(ticks):
+                sim.tick()
+
+        timings = measure(ingest, repeat=repeat)
+        results.append(record("ingest.simulator_tick", {"ticks": ticks, "existing_rows": existing}, timings, ops=ticks))
+    return results
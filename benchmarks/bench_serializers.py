@@ -0,0 +1,75 @@
+# benchmarks/bench_serializers.py
+"""
+Compare the DRF ModelSerializer path with the values_list fast path.
+
+Usage:
+    python -m benchmarks.bench_serializers [--sizes 200,10000,100000] [--repeat 3]
+"""
+import argparse
+
+from benchmarks._django import benchmark_database, seed_readings
+from benchmarks._timing import measure, record
+
+DEFAULT_SIZES = (200, 10_000, 100_000)
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3):
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+
+    from flock.models import FlockBlock
+    from monitoring.models import SensorData
+    from monitoring.serializers import SensorDataSerializer, FastSensorDataSerializer
+
+    user = User.objects.create_user("serializers", "serializers@example.com", "bench")
+    block = FlockBlock.objects.create(user=user, name="Bench", breed="broiler", age_group="adult")
+    seeded = 0
+    results = []
+
+    for size in sorted(sizes):
+        seed_readings(block, size - seeded)
+        seeded = size
+        qs = SensorData.objects.filter(block=block).order_by("-timestamp")[:size]
+
+        def drf():
+            return JSONRenderer().render(SensorDataSerializer(qs, many=True).data)
+
+        def fast():
+            return FastSensorDataSerializer(qs).json().encode()
+
+        identical = drf() == fast()
+        for path, func in (("drf", drf), ("fast", fast)):
+            results.append(record(
+                f"serializers.sensor_data.{path}",
+                {"rows": size},
+                measure(func, repeat=repeat),
+                ops=size,
+            ))
+        results[-1]["identical_output"] = identical
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    with benchmark_database():
+        results = run(sizes, args.repeat)
+
+    by_rows = {}
+    for r in results:
+        by_rows.setdefault(r["params"]["rows"], {})[r["benchmark"].rsplit(".", 1)[1]] = r
+
+    print(f"{'rows':>8}  {'drf (s)':>10}  {'fast (s)':>10}  {'speedup':>8}  identical")
+    for rows, paths in sorted(by_rows.items()):
+        drf_time = paths["drf"]["seconds"]["median"]
+        fast_time = paths["fast"]["seconds"]["median"]
+        print(f"{rows:>8}  {drf_time:>10.4f}  {fast_time:>10.4f}  "
+              f"{drf_time / fast_time:>7.1f}x  {paths['fast']['identical_output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# benchmarks/bench_simulator.py
+"""SensorSimulatorCore.generate_data throughput per breed."""
+from types import SimpleNamespace
+
+from benchmarks._timing import measure, record
+
+DEFAULT_CALLS = 20_000
+
+
+def run(calls=DEFAULT_CALLS, repeat=5):
+    from flock.models import BREEDS
+    from monitoring.services.simulator_core import SensorSimulatorCore
+
+    results = []
+    for breed, _ in BREEDS:
+        flock = SimpleNamespace(number_of_birds=500, breed=breed, age_group="adult")
+        core = SensorSimulatorCore(initial_settings={}, flock=flock)
+
+        def generate():
+            for _ in range(calls):
+                core.generate_data()
+
+        timings = measure(generate, repeat=repeat)
+        results.append(record("simulator.generate_data", {"breed": breed, "calls": calls}, timings, ops=calls))
+    return results
@@ -0,0 +1,55 @@
+# benchmarks/bench_views.py
+"""Latency of the data-heavy pages at several history sizes."""
+from benchmarks._django import seed_readings
+from benchmarks._timing import measure, record
+
+DEFAULT_SIZES = (100, 1_000, 5_000)
+BLOCKS_PER_USER = 3
+
+# (benchmark name, url pattern); "{block}" is the seeded block id
+VIEWS = (
+    ("views.history_detail", "/m/history/{block}/?range=24h"),
+    ("views.export_history_csv", "/m/history/{block}/export/csv/?range=24h"),
+    ("views.export_history_pdf", "/m/history/{block}/export/pdf/?range=24h"),
+    ("views.dashboard", "/users/dashboard/"),
+    ("views.blocks_list", "/flock/"),
+)
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5):
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from flock.models import FlockBlock
+    from monitoring.services.history_cache import history_cache
+    from monitoring.services.singleflight import read_coalescer
+
+    results = []
+    for size in sizes:
+        user = User.objects.create_user(f"views{size}", f"views{size}@example.com", "bench")
+        blocks = [
+            FlockBlock.objects.create(user=user, name=f"Block {i}", breed="broiler", age_group="adult")
+            for i in range(BLOCKS_PER_USER)
+        ]
+        # Keep every reading inside the 24h range the pages default to
+        step = min(3, 86_000 / max(size, 1))
+        for block in blocks:
+            seed_readings(block, size, step_seconds=step)
+
+        client = Client()
+        client.force_login(user)
+
+        for name, pattern in VIEWS:
+            url = pattern.format(block=blocks[0].id)
+
+            def fetch():
+                # Measure the full computation, not a coalesced or cached hit
+                read_coalescer.clear()
+                history_cache.clear()
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}")
+
+            timings = measure(fetch, repeat=repeat)
+            results.append(record(name, {"rows_per_block": size, "blocks": BLOCKS_PER_USER}, timings))
+    return results
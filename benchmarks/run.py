@@ -0,0 +1,109 @@
+# benchmarks/run.py
+"""
+Run the benchmark suite and write the results as JSON.
+
+Usage:
+    python -m benchmarks.run [--only simulator,ingest,views,serializers]
+                             [--sizes 100,1000,5000] [--repeat 5]
+                             [--output benchmarks/results/latest.json]
+                             [--compare benchmarks/results/baseline.json]
+                             [--threshold 0.25]
+
+With --compare, every benchmark whose median time grew by more than
+--threshold (fraction) against the baseline file is reported as a
+regression and the command exits with status 1.
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import bench_ingest, bench_serializers, bench_simulator, bench_views
+from benchmarks._django import BASE_DIR, benchmark_database
+
+DEFAULT_OUTPUT = BASE_DIR / "benchmarks" / "results" / "latest.json"
+
+
+def _suites(sizes, repeat):
+    """Suite name -> callable returning result records."""
+    return {
+        "simulator": lambda: bench_simulator.run(repeat=repeat),
+        "ingest": lambda: bench_ingest.run(repeat=max(1, repeat // 2)),
+        "views": lambda: bench_views.run(sizes=sizes or bench_views.DEFAULT_SIZES, repeat=repeat),
+        "serializers": lambda: bench_serializers.run(
+            sizes=sizes or bench_serializers.DEFAULT_SIZES, repeat=max(1, repeat // 2),
+        ),
+    }
+
+
+def result_key(result):
+    return (result["benchmark"], json.dumps(result["params"], sort_keys=True))
+
+
+def compare(results, baseline, threshold):
+    """Return (benchmark, params, old median, new median) for each regression."""
+    previous = {result_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        old_median = old["seconds"]["median"]
+        new_median = result["seconds"]["median"]
+        if old_median and (new_median - old_median) / old_median > threshold:
+            regressions.append((result["benchmark"], result["params"], old_median, new_median))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--only", default="", help="comma-separated suite names")
+    parser.add_argument("--sizes", default="", help="comma-separated data sizes for views/serializers")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    parser.add_argument("--compare", default=None, help="baseline results JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    sizes = tuple(int(s) for s in args.sizes.split(",") if s)
+    suites = _suites(sizes, args.repeat)
+    selected = [s for s in args.only.split(",") if s] or list(suites)
+    unknown = set(selected) - set(suites)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    results = []
+    with benchmark_database():
+        for name in selected:
+            print(f"Running {name} benchmarks...", file=sys.stderr)
+            results.extend(suites[name]())
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    for r in results:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['benchmark']:<36} {params:<36} {r['seconds']['median'] * 1000:>10.2f} ms")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for benchmark, params, old, new in regressions:
+            print(f"REGRESSION {benchmark} {params}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,29 @@
 from django.test import TestCase
 
-# Create your tests here.
+from poultry_monitoring.testing import QueryBudgetMixin
+
+# Session and user lookups plus FlockSetupMiddleware's has-blocks check
+BASE_QUERIES = 3
+
+
+class FlockViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts must not grow with the number of blocks or readings."""
+
+    def test_blocks_list(self):
+        # blocks with open-alert counts, reading count
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 2, lambda farm: "/flock/")
+
+    def test_choose_block(self):
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 2, lambda farm: "/flock/choose/")
+
+    def test_block_detail(self):
+        # block, data count + page, alerts count + page, chart
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 6, lambda farm: f"/flock/{farm[-1].id}/")
+
+    def test_block_detail_later_pages(self):
+        self.assertBudgetForAllFarmSizes(
+            BASE_QUERIES + 6, lambda farm: f"/flock/{farm[-1].id}/?data_page=2&alerts_page=2",
+        )
+
+    def test_block_update_form(self):
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 1, lambda farm: f"/flock/{farm[-1].id}/edit/")
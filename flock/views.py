@@ -5,12 +5,12 @@ import logging
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
+from django.db.models import Count, Q
 from django.core.paginator import Paginator 
 from .models import FlockBlock
 from .forms import BlockForm
 from monitoring.models import SensorData, Alert
-from monitoring.services.block_simulator import is_running
+from monitoring.services.block_simulator import is_running, catch_up
 
 logger = logging.getLogger("flock.views")
 
@@ -52,28 +52,24 @@ def blocks_list(request):
     """
     List all poultry blocks for the logged-in user.
     """
-    blocks = FlockBlock.objects.filter(user=request.user)
+    # One query for the blocks with their open-alert counts
+    blocks = list(
+        FlockBlock.objects.filter(user=request.user).annotate(
+            recent_alerts=Count('alerts', filter=Q(alerts__resolved=False)),
+        )
+    )
     
-    if not blocks.exists():
+    if not blocks:
         messages.info(request, "📋 You don't have any flock blocks yet. Create your first one to get started!")
         return redirect("flock:flock_setup")
     
-    total_birds_result = blocks.aggregate(total=Sum('number_of_birds'))
-    total_birds = total_birds_result['total'] or 0
-    
-    active_simulations = 0
-    for block in blocks:
-        if is_running(block):
-            active_simulations += 1
-    
-    data_points = SensorData.objects.filter(block__in=blocks).count()
+    total_birds = sum(block.number_of_birds for block in blocks)
     
     for block in blocks:
         block.is_running = is_running(block)
-        block.recent_alerts = Alert.objects.filter(
-            block=block, 
-            resolved=False
-        ).count()
+    active_simulations = sum(1 for block in blocks if block.is_running)
+    
+    data_points = SensorData.objects.filter(block__user=request.user).count()
     
     context = {
         'blocks': blocks,
@@ -147,6 +143,7 @@ def block_detail(request, block_id):
     try:
         # Get the block
         block = get_object_or_404(FlockBlock, id=block_id, user=request.user)
+        catch_up(block.id)
         
         # --- Pagination for Sensor Data ---
         data_page = request.GET.get('data_page', 1)
@@ -159,13 +156,17 @@ def block_detail(request, block_id):
         active_alerts = alerts_paginator.get_page(alerts_page)
         
         # Data for charts (last 50 data points for a smooth line)
-        chart_data = SensorData.objects.filter(block=block).order_by('timestamp')[:50]
+        chart_data = SensorData.objects.filter(block=block).order_by('timestamp').values_list(
+            'timestamp', 'temperature', 'humidity', 'ammonia'
+        )[:50]
         
         # Prepare data lists for the chart labels and datasets
-        timestamps = [data.timestamp.strftime('%H:%M') for data in chart_data]
-        temperatures = [float(data.temperature) for data in chart_data]
-        humidities = [float(data.humidity) for data in chart_data]
-        ammonia_levels = [float(data.ammonia) for data in chart_data]
+        timestamps, temperatures, humidities, ammonia_levels = [], [], [], []
+        for timestamp, temperature, humidity, ammonia in chart_data:
+            timestamps.append(timestamp.strftime('%H:%M'))
+            temperatures.append(float(temperature))
+            humidities.append(float(humidity))
+            ammonia_levels.append(float(ammonia))
         
         context = {
             "block": block,
@@ -173,7 +174,7 @@ def block_detail(request, block_id):
             "is_running": is_running(block),
             "recent_data": recent_data,  # This is now a paginated Page object
             "active_alerts": active_alerts,  # This is now a paginated Page object
-            "data_points_count": SensorData.objects.filter(block=block).count(),
+            "data_points_count": data_paginator.count,  # same query as the paginator's count
             "chart_labels": timestamps,
             "chart_temperatures": temperatures,
             "chart_humidities": humidities,
@@ -199,13 +200,7 @@ def block_update(request, block_id):
         if form.is_valid():
             form.save()
             messages.success(request, f"✅ Flock block '{block.name}' updated successfully!")
-            
-            # Warn if simulation is running
-            try:
-                if is_running(block):
-                    messages.warning(request, "⚠️ Note: Changes may not affect an active simulation until it's restarted.")
-            except:
-                pass
+            # A running simulation picks up the changes itself (monitoring/signals.py)
             
             return redirect("flock:detail", block_id=block.id)
     else:
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.utils import timezone
 from datetime import timedelta
-from .models import SensorData, Alert
+from .models import SensorData, Alert, AlertNotification, SimulatorCheckpoint
 from django.contrib.auth.models import User
 
 @admin.register(SensorData)
@@ -106,4 +106,22 @@ class AlertAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         """Only allow superusers to add alerts manually"""
-        return request.user.is_superuser
\ No newline at end of file
+        return request.user.is_superuser
+
+
+@admin.register(SimulatorCheckpoint)
+class SimulatorCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('block', 'running', 'lazy', 'interval', 'owner', 'updated_at')
+    list_filter = ('running', 'lazy')
+    search_fields = ('block__name', 'block__user__username', 'owner')
+    ordering = ('-updated_at',)
+    readonly_fields = ('block', 'state', 'rng_seed', 'owner', 'updated_at')
+
+
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'user', 'channel', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('user__username', 'alert__alert_type', 'last_error')
+    ordering = ('-created_at',)
+    readonly_fields = ('alert', 'user', 'channel', 'claim', 'attempts', 'last_error', 'created_at', 'sent_at')
@@ -8,8 +8,14 @@ class MonitoringConfig(AppConfig):
     def ready(self):
         # IMPORTANT:
         # Do NOT start simulators here.
-        # Block simulators are controlled explicitly from views.
-        pass
+        # Block simulators are controlled explicitly from views. The only
+        # exception is the warm restart of the ones that were running when
+        # the server stopped, done later from a background thread.
+        from .services.supervisor import should_restore_on_startup, start_supervisor
+        from . import signals  # noqa: F401  (connects the FlockBlock receivers)
+
+        if should_restore_on_startup():
+            start_supervisor()
 
 
 
@@ -0,0 +1,196 @@
+# monitoring/async_views.py
+"""
+Native async versions of the polled read endpoints.
+
+Same URLs, parameters and JSON as the DRF views in monitoring/views.py
+(``latest_data``, ``data_history``, ``alerts``, ``simulation_status``), but
+written as plain async views on Django's async ORM: under an ASGI server
+a client waiting on a poll holds a coroutine rather than a thread. They
+authenticate with the session (``request.auser()``), answer anonymous
+requests with DRF's 403 body and always render JSON (no browsable API).
+Set ``ASYNC_READ_API = True`` to route the endpoints here (see
+monitoring/urls.py).
+
+The only thread hop left is lazy catch-up (which writes readings), and it
+happens only while a lazily simulated block exists.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData, Alert
+from monitoring.serializers import SensorDataSerializer, FastSensorDataSerializer, FastAlertSerializer
+from monitoring.renderers import ColumnarJSONRenderer
+from monitoring.etags import arevalidate, alatest_data_etag, aalerts_etag, asimulation_status_etag
+from monitoring.services.history_codec import HISTORY_METRICS, encode_columnar
+from monitoring.services.singleflight import read_coalescer
+from monitoring.services.block_simulator import (
+    LazyBlockSimulator,
+    running_simulators,
+    is_running,
+    catch_up,
+    catch_up_user,
+)
+
+
+def _json_response(data, status=200):
+    """``data`` rendered like DRF's JSONRenderer (compact, same encoder)."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _async_api_view(view):
+    """
+    GET-only, session-authenticated async endpoint: sets ``request.user``
+    from ``request.auser()`` so the wrapped validators and view can use it.
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return _json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return _json_response({'detail': 'Authentication credentials were not provided.'}, status=403)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def _ablock_id_param(view):
+    """``views._block_id_param`` for async views."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        block_id = request.GET.get('block_id')
+        try:
+            request.block_id = int(block_id) if block_id else None
+        except ValueError:
+            return _json_response({'error': 'block_id must be a block id'}, status=400)
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def _acatches_up(view):
+    """``views._catches_up`` for async views; place it above ``@arevalidate``."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        # Catch-up writes through the sync ORM: only pay for the thread hop
+        # when there is a lazy simulator to bring up to date
+        if any(isinstance(sim, LazyBlockSimulator) for sim in running_simulators.values()):
+            block_id = kwargs.get('block_id') or getattr(request, 'block_id', None)
+            if block_id:
+                await sync_to_async(catch_up)(block_id, user=request.user)
+            else:
+                await sync_to_async(catch_up_user)(request.user)
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+async def _aserialize_latest(queryset):
+    """Serialized newest reading of ``queryset``, or None."""
+    latest = await queryset.order_by('-timestamp').afirst()
+    return SensorDataSerializer(latest).data if latest else None
+
+
+@_async_api_view
+@_ablock_id_param
+@_acatches_up
+@arevalidate(alatest_data_etag)
+async def latest_data(request):
+    """
+    Return the latest sensor reading for the logged-in user.
+    Optionally restricted to one block with ?block_id=<id>.
+    """
+    qs = SensorData.objects.filter(user=request.user)
+    block_id = request.block_id
+    if block_id:
+        qs = qs.filter(block_id=block_id)
+
+    data = await read_coalescer.ado(
+        ('user-latest', request.user.pk, block_id, request.etag),
+        lambda: _aserialize_latest(qs),
+    )
+    if data is None:
+        data = SensorDataSerializer(None).data
+    return _json_response(data)
+
+
+@_async_api_view
+@_acatches_up
+async def data_history(request):
+    """
+    Return the last 200 sensor readings for the logged-in user.
+    Optionally filtered to one block with ?block=<id>.
+
+    ?format=columnar (or the columnar media type in Accept) selects the
+    columnar encoding, as the DRF view's renderer negotiation does.
+    """
+    qs = SensorData.objects.filter(user=request.user).order_by('-timestamp')
+    block_id = request.GET.get('block')
+    if block_id:
+        try:
+            block_id = int(block_id)
+        except ValueError:
+            return _json_response({'error': 'block must be a block id'}, status=400)
+        qs = qs.filter(block_id=block_id)
+    qs = qs[:200]
+
+    columnar = (
+        request.GET.get('format') == ColumnarJSONRenderer.format
+        or ColumnarJSONRenderer.media_type in request.headers.get('Accept', '')
+    )
+    fmt = ColumnarJSONRenderer.format if columnar else 'json'
+    coalesce_key = ('data-history', request.user.pk, block_id, fmt)
+
+    if columnar:
+        async def build_columnar():
+            rows = [row async for row in qs.values_list('timestamp', 'block_id', *HISTORY_METRICS)]
+            rows.reverse()
+            payload = encode_columnar((row[0],) + row[2:] for row in rows)
+            payload['block'] = [row[1] for row in rows]
+            return payload
+        payload = await read_coalescer.ado(coalesce_key, build_columnar)
+        return HttpResponse(ColumnarJSONRenderer().render(payload), content_type=ColumnarJSONRenderer.media_type)
+
+    body = await read_coalescer.ado(coalesce_key, FastSensorDataSerializer(qs).ajson)
+    return HttpResponse(body, content_type='application/json')
+
+
+@_async_api_view
+@arevalidate(aalerts_etag)
+async def alerts(request):
+    """
+    Return the latest unresolved alerts for the logged-in user.
+    """
+    qs = Alert.objects.filter(user=request.user, resolved=False).order_by('-timestamp')[:50]
+    return HttpResponse(await FastAlertSerializer(qs).ajson(), content_type='application/json')
+
+
+@_async_api_view
+@_acatches_up
+@arevalidate(asimulation_status_etag)
+async def simulation_status(request, block_id):
+    """
+    API endpoint to check if simulation is running for a block.
+    """
+    block = await FlockBlock.objects.filter(id=block_id, user=request.user).afirst()
+    if block is None:
+        return _json_response({'error': 'Block not found'}, status=404)
+
+    is_running_status = is_running(block)
+
+    # Get latest data if simulation is running
+    latest_data = None
+    if is_running_status:
+        latest_data = await read_coalescer.ado(
+            ('block-latest', block.id, request.etag),
+            lambda: _aserialize_latest(SensorData.objects.filter(block=block)),
+        )
+
+    return _json_response({
+        'is_running': is_running_status,
+        'block_id': block_id,
+        'block_name': block.name,
+        'latest_data': latest_data,
+    })
@@ -0,0 +1,139 @@
+# monitoring/etags.py
+"""
+Cheap ETag validators for the polled API endpoints.
+
+Each validator runs a single index-backed query that returns a version
+(latest reading id, open-alert id/count) instead of the payload itself, so
+an unchanged poll is answered with ``304 Not Modified`` before the view's
+main query and serializer run. The ``a``-prefixed validators and
+``arevalidate`` do the same for the async views (monitoring/async_views.py).
+
+The computed ETag is kept as ``request.etag``. Views that coalesce their
+body (read_coalescer) put it in the coalesce key, so a body cached for an
+older version is never sent with a newer ETag.
+"""
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData, Alert
+from monitoring.services.block_simulator import is_running
+
+
+def revalidate(etag_func):
+    """
+    Serve GETs conditionally using ``etag_func`` and ask clients to always
+    revalidate (``Cache-Control: private, no-cache``).
+
+    Place it below ``@api_view`` / ``@permission_classes`` so that DRF has
+    already authenticated ``request.user`` when the validator runs.
+    """
+    def decorator(view):
+        def remembered_etag(request, *args, **kwargs):
+            request.etag = etag_func(request, *args, **kwargs)
+            return request.etag
+
+        conditional_view = condition(etag_func=remembered_etag)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def arevalidate(etag_func):
+    """
+    ``revalidate`` for async views, with an async ``etag_func``. The view
+    must have set ``request.user`` before this runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            request.etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(request.etag) if request.etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag and request.method in ("GET", "HEAD"):
+                response.headers.setdefault("ETag", etag)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def latest_reading_id(queryset):
+    """Id of the newest reading in ``queryset`` (by timestamp) or None."""
+    return queryset.order_by('-timestamp').values_list('id', flat=True).first()
+
+
+def latest_data_etag(request):
+    # Parsed by the view's _block_id_param
+    block_id = request.block_id
+    qs = SensorData.objects.filter(user=request.user)
+    if block_id:
+        qs = qs.filter(block_id=block_id)
+    return f"latest-{request.user.pk}-{block_id or 'all'}-{latest_reading_id(qs)}"
+
+
+def alerts_etag(request):
+    version = Alert.objects.filter(user=request.user, resolved=False).aggregate(
+        last=Max('id'), open=Count('id'),
+    )
+    return f"alerts-{request.user.pk}-{version['last']}-{version['open']}"
+
+
+def simulation_status_etag(request, block_id):
+    updated_at = FlockBlock.objects.filter(id=block_id, user=request.user).values_list(
+        'updated_at', flat=True,
+    ).first()
+    if updated_at is None:
+        # Let the view produce its 404
+        return None
+
+    block = FlockBlock(id=block_id)
+    running = is_running(block)
+    reading_id = latest_reading_id(SensorData.objects.filter(block_id=block_id)) if running else None
+    return f"status-{block_id}-{updated_at.timestamp()}-{int(running)}-{reading_id}"
+
+
+# -----------------------------
+# Async validators
+# -----------------------------
+async def alatest_reading_id(queryset):
+    return await queryset.order_by('-timestamp').values_list('id', flat=True).afirst()
+
+
+async def alatest_data_etag(request):
+    block_id = request.block_id
+    qs = SensorData.objects.filter(user=request.user)
+    if block_id:
+        qs = qs.filter(block_id=block_id)
+    return f"latest-{request.user.pk}-{block_id or 'all'}-{await alatest_reading_id(qs)}"
+
+
+async def aalerts_etag(request):
+    version = await Alert.objects.filter(user=request.user, resolved=False).aaggregate(
+        last=Max('id'), open=Count('id'),
+    )
+    return f"alerts-{request.user.pk}-{version['last']}-{version['open']}"
+
+
+async def asimulation_status_etag(request, block_id):
+    updated_at = await FlockBlock.objects.filter(id=block_id, user=request.user).values_list(
+        'updated_at', flat=True,
+    ).afirst()
+    if updated_at is None:
+        return None
+
+    block = FlockBlock(id=block_id)
+    running = is_running(block)
+    reading_id = await alatest_reading_id(SensorData.objects.filter(block_id=block_id)) if running else None
+    return f"status-{block_id}-{updated_at.timestamp()}-{int(running)}-{reading_id}"
@@ -0,0 +1,33 @@
+# monitoring/management/commands/dispatch_notifications.py
+"""
+Deliver queued alert notifications.
+
+    python manage.py dispatch_notifications            # loop
+    python manage.py dispatch_notifications --once     # one pass
+
+Useful with ``ALERT_DISPATCH_IN_PROCESS = False``, to deliver from one
+dedicated process instead of a thread in every web worker.
+"""
+import json
+import threading
+
+from django.core.management.base import BaseCommand
+
+from monitoring.services.notifications import dispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver queued alert notifications (email, webhooks)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="dispatch the due notifications once and exit")
+        parser.add_argument("--interval", type=float, default=None, help="seconds between dispatch passes")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            self.stdout.write(json.dumps(dispatcher.dispatch_once()))
+            return
+        try:
+            dispatcher.run(interval=options["interval"], stop=threading.Event())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,79 @@
+# monitoring/management/commands/ingest_listener.py
+"""
+Listen for line-protocol readings from sensor gateways.
+
+    python manage.py ingest_listener --udp-port 8094 --tcp-port 8094
+
+Each line is ``<block_id> <ts|-> <temperature> <humidity> <ammonia> <feed>
+<water> <activity>`` (see monitoring/services/line_protocol.py). Counters
+of received, written, malformed, late and dropped lines are printed every
+``--stats-interval`` seconds and on exit.
+
+Only the gateways in LINE_INGEST_GATEWAYS, or given as
+``--gateway <address>=<username>``, may write, and only to blocks of
+their user.
+"""
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.services.line_protocol import BatchWriter, IngestStats, LineProtocolServer, gateway_users
+
+
+class Command(BaseCommand):
+    help = "Run the UDP/TCP line-protocol ingest listener for sensor gateways."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="address to bind (0.0.0.0 for the whole LAN)")
+        parser.add_argument(
+            "--gateway", action="append", default=[], metavar="ADDRESS=USERNAME",
+            help="gateway address allowed to write to the user's blocks (repeatable; default LINE_INGEST_GATEWAYS)",
+        )
+        parser.add_argument("--udp-port", type=int, default=8094, help="0 picks a free port, -1 disables UDP")
+        parser.add_argument("--tcp-port", type=int, default=8094, help="0 picks a free port, -1 disables TCP")
+        parser.add_argument("--batch-size", type=int, default=None, help="readings per INSERT batch")
+        parser.add_argument("--flush-interval", type=float, default=None, help="seconds before a partial batch is written")
+        parser.add_argument("--stats-interval", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        udp_port = options["udp_port"] if options["udp_port"] >= 0 else None
+        tcp_port = options["tcp_port"] if options["tcp_port"] >= 0 else None
+        if udp_port is None and tcp_port is None:
+            raise CommandError("Enable at least one of --udp-port and --tcp-port")
+
+        gateways = None
+        if options["gateway"]:
+            try:
+                gateways = dict(spec.split("=", 1) for spec in options["gateway"])
+            except ValueError:
+                raise CommandError("--gateway takes ADDRESS=USERNAME")
+        try:
+            gateways = gateway_users(gateways)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not gateways:
+            raise CommandError("No gateways allowed: set LINE_INGEST_GATEWAYS or pass --gateway ADDRESS=USERNAME")
+
+        stats = IngestStats()
+        writer = BatchWriter(stats, batch_size=options["batch_size"], flush_interval=options["flush_interval"])
+        server = LineProtocolServer(options["host"], udp_port, tcp_port, writer, gateways)
+        try:
+            asyncio.run(self._serve(server, options["stats_interval"]))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(json.dumps(stats.snapshot()))
+
+    async def _serve(self, server, stats_interval):
+        await server.start()
+        listening = [
+            f"{protocol} {server.host}:{port}"
+            for protocol, port in (("udp", server.udp_port), ("tcp", server.tcp_port)) if port is not None
+        ]
+        self.stdout.write(f"Listening on {', '.join(listening)}")
+        try:
+            while True:
+                await asyncio.sleep(stats_interval)
+                self.stdout.write(json.dumps(server.stats.snapshot()))
+        finally:
+            await server.close()
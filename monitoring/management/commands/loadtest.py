@@ -0,0 +1,333 @@
+# monitoring/management/commands/loadtest.py
+"""
+Load-test harness: synthetic users, running simulators and concurrent pollers.
+
+    python manage.py loadtest --users 20 --blocks-per-user 3 --pollers 50 --duration 60
+
+Creates N synthetic users with their FlockBlocks, starts a simulator for
+every block, then drives simulated browser traffic against dashboard,
+live_simulation, simulation_status, latest_data and history_detail for the
+given duration, and reports throughput, latency percentiles and error
+rates per endpoint. Only 2xx and 304 responses count as successful; a
+redirect (e.g. to the login page) is an error. Requests go through Django's test client by default,
+or through a local threaded HTTP server with --http.
+
+Synthetic users are named ``loadtest_<run>_<n>`` and are deleted (with their
+blocks and readings) at the end unless --keep is given.
+"""
+import http.client
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.utils import timezone
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData
+from monitoring.services.block_simulator import start_simulator_for_block, stop_simulator_for_block
+
+# (endpoint name, url pattern, weight); "{block}" is one of the user's blocks
+ENDPOINTS = (
+    ("dashboard", "/users/dashboard/", 1),
+    ("live_simulation", "/m/live/{block}/", 1),
+    ("simulation_status", "/api/sim/status/{block}/", 4),
+    ("latest_data", "/api/data/latest/?block_id={block}", 4),
+    ("history_detail", "/m/history/{block}/?range=24h", 1),
+)
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ClientTransport:
+    """Requests through Django's test client (in-process, full middleware stack)."""
+
+    def __init__(self, user, host):
+        self.client = Client(SERVER_NAME=host)
+        self.client.force_login(user)
+
+    def get(self, url):
+        return self.client.get(url).status_code
+
+    def close(self):
+        pass
+
+
+class _HttpTransport:
+    """Requests over a real socket to the local HTTP server."""
+
+    def __init__(self, user, host, port):
+        client = Client(SERVER_NAME=host)
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.headers = {"Cookie": f"{settings.SESSION_COOKIE_NAME}={session}", "Host": host}
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def get(self, url):
+        self.connection.request("GET", url, headers=self.headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def _is_success(status):
+    return 200 <= status < 300 or status == 304
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name, _, _ in ENDPOINTS}
+        self.errors = {name: 0 for name, _, _ in ENDPOINTS}
+        self.setup_failures = []  # (poller index, error) of pollers that never sent a request
+
+    def add(self, name, elapsed, ok):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+
+    def setup_failed(self, index, exc):
+        with self.lock:
+            self.setup_failures.append((index, f"{type(exc).__name__}: {exc}"))
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+class Command(BaseCommand):
+    help = "Simulate many users, blocks and pollers and report throughput and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--blocks-per-user", type=int, default=3)
+        parser.add_argument("--pollers", type=int, default=20, help="concurrent simulated browsers")
+        parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+        parser.add_argument("--think", type=float, default=0.0, help="seconds each poller waits between requests")
+        parser.add_argument("--interval", type=float, default=3.0, help="simulator tick interval")
+        parser.add_argument("--seed-rows", type=int, default=0, help="history rows pre-seeded per block")
+        parser.add_argument("--no-simulators", action="store_true", help="do not start simulators")
+        parser.add_argument("--lazy", action="store_true", help="simulate lazily (catch up on read) instead of threads")
+        parser.add_argument("--http", action="store_true", help="go through a local HTTP server")
+        parser.add_argument("--host", default="localhost", help="Host header (must be in ALLOWED_HOSTS)")
+        parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+        parser.add_argument("--keep", action="store_true", help="keep the synthetic users afterwards")
+
+    def _check_options(self, options):
+        for name in ("users", "blocks_per_user", "pollers"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+        for name in ("duration", "interval"):
+            if not (math.isfinite(options[name]) and options[name] > 0):
+                raise CommandError(f"--{name} must be a positive number of seconds")
+        if not (math.isfinite(options["think"]) and options["think"] >= 0):
+            raise CommandError("--think must not be negative")
+        if options["seed_rows"] < 0:
+            raise CommandError("--seed-rows must not be negative")
+
+    def handle(self, *args, **options):
+        self._check_options(options)
+        run_id = uuid.uuid4().hex[:8]
+        users = self._create_users(run_id, options)
+        blocks = {user.id: list(FlockBlock.objects.filter(user=user)) for user in users}
+        all_blocks = [block for user_blocks in blocks.values() for block in user_blocks]
+        self.stdout.write(f"Run {run_id}: {len(users)} users, {len(all_blocks)} blocks")
+
+        server = None
+        try:
+            if not options["no_simulators"]:
+                for block in all_blocks:
+                    start_simulator_for_block(block, interval=options["interval"], lazy=options["lazy"] or None)
+                self.stdout.write(f"Started {len(all_blocks)} {'lazy ' if options['lazy'] else ''}simulators")
+
+            if options["http"]:
+                server = make_server(
+                    "127.0.0.1", 0, get_wsgi_application(),
+                    server_class=_ThreadingWSGIServer, handler_class=_QuietHandler,
+                )
+                threading.Thread(target=server.serve_forever, daemon=True, name="Loadtest-HTTP").start()
+                self.stdout.write(f"Serving on http://127.0.0.1:{server.server_port}/")
+
+            stats, elapsed = self._drive(users, blocks, server, options)
+            report = self._report(stats, elapsed, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+            for block in all_blocks:
+                stop_simulator_for_block(block)
+            if not options["keep"]:
+                # Let simulator threads finish their current tick first
+                time.sleep(min(options["interval"], 3.0) + 0.5)
+                User.objects.filter(id__in=[u.id for u in users]).delete()
+                self.stdout.write(f"Removed synthetic users for run {run_id}")
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Report written to {options['json_path']}")
+        if len(stats.setup_failures) == options["pollers"]:
+            raise CommandError("No poller could start; see the error above")
+
+    def _create_users(self, run_id, options):
+        users = []
+        for n in range(options["users"]):
+            user = User.objects.create_user(f"loadtest_{run_id}_{n}", f"loadtest_{run_id}_{n}@example.com", uuid.uuid4().hex)
+            users.append(user)
+
+        FlockBlock.objects.bulk_create([
+            FlockBlock(
+                user=user,
+                name=f"Load block {i + 1}",
+                number_of_birds=random.choice([50, 200, 1000, 2000]),
+                breed=random.choice(["broiler", "layer", "kuroiler", "local"]),
+                age_group=random.choice(["chick", "grower", "adult"]),
+            )
+            for user in users for i in range(options["blocks_per_user"])
+        ])
+
+        if options["seed_rows"]:
+            self._seed_history(users, options["seed_rows"])
+        return users
+
+    def _seed_history(self, users, rows):
+        now = timezone.now()
+        step = min(3.0, 86_000 / rows)
+        for block in FlockBlock.objects.filter(user__in=users):
+            SensorData.objects.bulk_create([
+                SensorData(
+                    user_id=block.user_id,
+                    block=block,
+                    timestamp=now - timedelta(seconds=step * (rows - i)),
+                    temperature=round(random.uniform(26, 36), 1),
+                    humidity=round(random.uniform(50, 90), 1),
+                    ammonia=round(random.uniform(5, 30), 1),
+                    feed_level=round(random.uniform(0, 100), 1),
+                    water_level=round(random.uniform(0, 100), 1),
+                    activity_level=round(random.uniform(10, 100), 1),
+                )
+                for i in range(rows)
+            ], batch_size=2000)
+
+    def _drive(self, users, blocks, server, options):
+        stats = _Stats()
+        names = [name for name, _, _ in ENDPOINTS]
+        weights = [weight for _, _, weight in ENDPOINTS]
+        patterns = {name: pattern for name, pattern, _ in ENDPOINTS}
+        deadline = time.monotonic() + options["duration"]
+
+        def poller(index):
+            rng = random.Random(index)
+            user = users[index % len(users)]
+            try:
+                try:
+                    if server is not None:
+                        transport = _HttpTransport(user, options["host"], server.server_port)
+                    else:
+                        transport = _ClientTransport(user, options["host"])
+                except Exception as exc:
+                    stats.setup_failed(index, exc)
+                    return
+                try:
+                    while time.monotonic() < deadline:
+                        name = rng.choices(names, weights)[0]
+                        url = patterns[name].format(block=rng.choice(blocks[user.id]).id)
+                        started = time.perf_counter()
+                        try:
+                            ok = _is_success(transport.get(url))
+                        except Exception:
+                            ok = False
+                        stats.add(name, time.perf_counter() - started, ok)
+                        if options["think"]:
+                            time.sleep(options["think"])
+                finally:
+                    transport.close()
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [
+            threading.Thread(target=poller, args=(i,), daemon=True, name=f"Loadtest-Poller-{i}")
+            for i in range(options["pollers"])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats, time.monotonic() - started
+
+    def _report(self, stats, elapsed, options):
+        report = {
+            "duration_seconds": elapsed,
+            "users": options["users"],
+            "blocks_per_user": options["blocks_per_user"],
+            "pollers": options["pollers"],
+            "transport": "http" if options["http"] else "test-client",
+            "poller_setup_failures": len(stats.setup_failures),
+            "endpoints": {},
+        }
+        total_requests = total_errors = 0
+
+        if stats.setup_failures:
+            index, error = stats.setup_failures[0]
+            self.stderr.write(
+                f"{len(stats.setup_failures)} of {options['pollers']} pollers could not start "
+                f"(poller {index}: {error})"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(f"{'endpoint':<20} {'reqs':>7} {'req/s':>8} {'err %':>6} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, latencies in stats.latencies.items():
+            values = sorted(latencies)
+            count = len(values)
+            errors = stats.errors[name]
+            total_requests += count
+            total_errors += errors
+            row = {
+                "requests": count,
+                "requests_per_second": count / elapsed if elapsed else 0.0,
+                "error_rate": errors / count if count else 0.0,
+                "p50_ms": _percentile(values, 0.50) * 1000,
+                "p95_ms": _percentile(values, 0.95) * 1000,
+                "p99_ms": _percentile(values, 0.99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+            }
+            report["endpoints"][name] = row
+            self.stdout.write(
+                f"{name:<20} {count:>7} {row['requests_per_second']:>8.1f} {row['error_rate'] * 100:>6.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+            )
+
+        report["total_requests"] = total_requests
+        report["requests_per_second"] = total_requests / elapsed if elapsed else 0.0
+        report["error_rate"] = total_errors / total_requests if total_requests else 0.0
+        self.stdout.write(
+            f"\nTotal: {total_requests} requests in {elapsed:.1f}s "
+            f"({report['requests_per_second']:.1f} req/s, {report['error_rate'] * 100:.1f}% errors)"
+        )
+        return report
@@ -0,0 +1,60 @@
+# monitoring/management/commands/rebuild_sketches.py
+"""
+Rebuild percentile sketches from stored readings.
+
+    python manage.py rebuild_sketches [--days 30] [--block 12]
+
+Needed once for readings written before sketches existed (or after
+changing SKETCH_METRICS / SKETCH_BUCKET_SECONDS). Only whole buckets before
+the current one are rebuilt, so running simulators are not counted twice.
+Unflushed sketches of this process in the rebuilt range are dropped first,
+as their readings are counted again from SensorData; other processes that
+write readings into past buckets meanwhile (lazy catch-up, ingest of old
+readings) may still flush theirs on top of the rebuilt rows.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData, SensorSketch
+from monitoring.services.sketches import SketchStore, bucket_start, sketch_metrics, sketch_store
+
+# Readings folded in between two flushes
+FLUSH_EVERY = 50_000
+
+
+class Command(BaseCommand):
+    help = "Rebuild the percentile sketches of SensorData from the stored readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=30.0, help="how far back to rebuild")
+        parser.add_argument("--block", type=int, help="only this block id")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = bucket_start(now - timedelta(days=options["days"]))
+        until = bucket_start(now)
+        metrics = sketch_metrics()
+
+        blocks = FlockBlock.objects.order_by("id")
+        if options["block"]:
+            blocks = blocks.filter(id=options["block"])
+
+        for block in blocks:
+            sketch_store.forget_range(block.id, since, until)
+            SensorSketch.objects.filter(block=block, bucket_start__gte=since, bucket_start__lt=until).delete()
+            store = SketchStore(autoflush=False)
+            readings = SensorData.objects.filter(
+                block=block, timestamp__gte=since, timestamp__lt=until,
+            ).values_list("timestamp", *metrics)
+
+            count = 0
+            for timestamp, *values in readings.iterator(chunk_size=5000):
+                store.record(block.id, timestamp, dict(zip(metrics, values)))
+                count += 1
+                if count % FLUSH_EVERY == 0:
+                    store.flush()
+            store.flush()
+            self.stdout.write(f"Block {block.id}: {count} readings")
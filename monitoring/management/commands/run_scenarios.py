@@ -0,0 +1,99 @@
+# monitoring/management/commands/run_scenarios.py
+"""
+Monte Carlo parameter sweep over flock sizes, breeds and age groups.
+
+    python manage.py run_scenarios --birds 500,2000 --breeds broiler --trajectories 1000 --days 7
+
+Runs independent simulator trajectories for every combination (see
+monitoring/services/scenarios.py) and prints, per combination, the
+probability of crossing each alert threshold within the horizon and the
+median time until feed and water run out. Nothing is written to the
+database.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flock.models import AGE_GROUPS, BREEDS
+from monitoring.services.scenarios import EVENTS, run_scenarios, scenario_grid
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _hours(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+class Command(BaseCommand):
+    help = "Run Monte Carlo simulator trajectories across flock sizes, breeds and age groups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--birds", default="50,200,1000,2000", help="comma-separated flock sizes")
+        parser.add_argument("--breeds", default=",".join(key for key, _ in BREEDS))
+        parser.add_argument("--age-groups", default=",".join(key for key, _ in AGE_GROUPS))
+        parser.add_argument("--trajectories", type=int, default=1000, help="trajectories per combination")
+        parser.add_argument("--days", type=float, default=7.0, help="simulated horizon")
+        parser.add_argument("--interval", type=float, default=3.0, help="seconds between readings")
+        parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+        parser.add_argument("--chunk-size", type=int, default=100, help="trajectories per pool task")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", dest="json_path", help="also write the summaries to this file")
+
+    def handle(self, *args, **options):
+        try:
+            birds = [int(n) for n in _csv(options["birds"])]
+        except ValueError:
+            raise CommandError("--birds must be comma-separated integers")
+        breeds = _csv(options["breeds"])
+        age_groups = _csv(options["age_groups"])
+        unknown = (set(breeds) - {key for key, _ in BREEDS}) | (set(age_groups) - {key for key, _ in AGE_GROUPS})
+        if unknown:
+            raise CommandError(f"Unknown breed or age group: {', '.join(sorted(unknown))}")
+        if options["trajectories"] < 1 or options["days"] <= 0 or options["interval"] <= 0:
+            raise CommandError("--trajectories, --days and --interval must be positive")
+
+        scenarios = scenario_grid(birds, breeds, age_groups)
+        self.stdout.write(
+            f"{len(scenarios)} scenarios x {options['trajectories']} trajectories, "
+            f"{options['days']:g} days at {options['interval']:g}s"
+        )
+        results = run_scenarios(
+            scenarios,
+            trajectories=options["trajectories"],
+            days=options["days"],
+            interval=options["interval"],
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            seed=options["seed"],
+        )
+        self._print(results)
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"Summaries written to {options['json_path']}")
+
+    def _print(self, results):
+        threshold_events = [name for name, _, side, _ in EVENTS if side != "empty"]
+        self.stdout.write("")
+        self.stdout.write("Probability of crossing each threshold within the horizon:")
+        self.stdout.write(f"{'birds':>6} {'breed':<9} {'age':<7} " + " ".join(f"{name:>19}" for name in threshold_events))
+        for result in results:
+            self.stdout.write(
+                f"{result['number_of_birds']:>6} {result['breed']:<9} {result['age_group']:<7} "
+                + " ".join(f"{result['events'][name]['probability']:>19.3f}" for name in threshold_events)
+            )
+
+        self.stdout.write("")
+        self.stdout.write("Hours until feed / water run out (median, p90; '-' = not within the horizon):")
+        self.stdout.write(f"{'birds':>6} {'breed':<9} {'age':<7} {'P(feed)':>8} {'feed h':>8} {'p90':>8} "
+                          f"{'P(water)':>8} {'water h':>8} {'p90':>8}")
+        for result in results:
+            feed, water = result["events"]["feed_empty"], result["events"]["water_empty"]
+            self.stdout.write(
+                f"{result['number_of_birds']:>6} {result['breed']:<9} {result['age_group']:<7} "
+                f"{feed['probability']:>8.3f} {_hours(feed['median_hours']):>8} {_hours(feed['p90_hours']):>8} "
+                f"{water['probability']:>8.3f} {_hours(water['median_hours']):>8} {_hours(water['p90_hours']):>8}"
+            )
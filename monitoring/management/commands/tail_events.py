@@ -0,0 +1,42 @@
+# monitoring/management/commands/tail_events.py
+"""
+Print events of the reading / alert event log as JSON lines.
+
+    python manage.py tail_events --from-offset 0 --follow
+
+Each line is the event with its "offset" added. Without --from-offset only
+new events are printed (with --follow) or the last --limit ones.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from monitoring.services.event_log import event_log
+
+
+class Command(BaseCommand):
+    help = "Print (and optionally follow) the reading / alert event log."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from-offset", type=int, default=None)
+        parser.add_argument("--limit", type=int, default=100, help="events to print without --follow")
+        parser.add_argument("--follow", action="store_true", help="keep printing new events")
+        parser.add_argument("--type", choices=("reading", "alert"), help="only events of this type")
+
+    def handle(self, *args, **options):
+        start = options["from_offset"]
+        if options["follow"]:
+            events = event_log.subscribe(from_offset=start)
+        else:
+            if start is None:
+                start = max(0, event_log.next_offset - options["limit"])
+            events = event_log.read(start, limit=options["limit"])
+
+        try:
+            for offset, event in events:
+                if options["type"] and event.get("type") != options["type"]:
+                    continue
+                self.stdout.write(json.dumps({"offset": offset, **event}))
+                self.stdout.flush()
+        except KeyboardInterrupt:
+            pass
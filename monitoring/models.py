@@ -27,8 +27,10 @@ class SensorData(models.Model):
 
     @staticmethod
     def cleanup_old_data(user, days=30):
+        """Delete the user's readings older than ``days``; returns how many were deleted."""
         threshold = timezone.now() - timedelta(days=days)
-        SensorData.objects.filter(user=user, timestamp__lt=threshold).delete()
+        _, deleted = SensorData.objects.filter(user=user, timestamp__lt=threshold).delete()
+        return deleted.get(SensorData._meta.label, 0)
 
     def __str__(self):
         return f"{self.user.username} reading @ {self.timestamp:%Y-%m-%d %H:%M:%S}"
@@ -48,3 +50,95 @@ class Alert(models.Model):
 
     def __str__(self):
         return f"{self.user.username}: {self.alert_type} at {self.timestamp:%Y-%m-%d %H:%M:%S}"
+
+
+class AlertNotification(models.Model):
+    """
+    Outbox row: one alert to be delivered on one notification channel (see
+    services/notifications.py). Rows are inserted in the same transaction
+    as their alert and delivered later by the dispatcher, which groups the
+    pending rows of a user into one message per channel.
+
+    ``claim`` identifies the dispatcher pass currently delivering the row;
+    it holds the row until ``next_attempt_at``.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+        (SKIPPED, 'Skipped'),
+    ]
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='notifications')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_notifications')
+    channel = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['user', 'channel', 'sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} notification of alert {self.alert_id} ({self.status})"
+
+
+class SimulatorCheckpoint(models.Model):
+    """
+    Last saved state of a block's simulator, used to warm-restart it after a
+    server restart (see services/supervisor.py).
+
+    ``state`` holds the SensorSimulatorCore values and ``rng_seed`` the seed
+    its RNG was reset to when the checkpoint was taken, so a restored
+    simulator continues the same series. ``owner`` is the ``host:pid:nonce`` of
+    the process running the simulator (see ``process_owner``).
+    """
+    block = models.OneToOneField(
+        "flock.FlockBlock", on_delete=models.CASCADE, primary_key=True, related_name='simulator_checkpoint',
+    )
+    running = models.BooleanField(default=True)
+    lazy = models.BooleanField(default=False)
+    interval = models.FloatField(default=3)
+    state = models.JSONField(default=dict)
+    rng_seed = models.BigIntegerField(null=True, blank=True)
+    owner = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Checkpoint for block {self.block_id} @ {self.updated_at:%Y-%m-%d %H:%M:%S}"
+
+
+class SensorSketch(models.Model):
+    """
+    DDSketch of one sensor value of a block over one time bucket, so that
+    percentiles over any range come from merging a few buckets instead of
+    sorting SensorData (see services/sketches.py).
+    """
+    block = models.ForeignKey("flock.FlockBlock", on_delete=models.CASCADE, related_name='sketches')
+    metric = models.CharField(max_length=30)
+    bucket_start = models.DateTimeField()
+
+    count = models.PositiveIntegerField(default=0)
+    zero_count = models.PositiveIntegerField(default=0)
+    min_value = models.FloatField(null=True)
+    max_value = models.FloatField(null=True)
+    bins = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['block', 'metric', 'bucket_start'], name='unique_sensor_sketch_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} sketch for block {self.block_id} @ {self.bucket_start:%Y-%m-%d %H:%M}"
@@ -0,0 +1,14 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Compact JSON renderer for columnar history payloads.
+
+    Selected with ``?format=columnar`` or the vendor media type in the
+    ``Accept`` header. Views check ``request.accepted_renderer.format`` and
+    hand it a payload from ``history_codec.encode_columnar``.
+    """
+    media_type = 'application/vnd.poultry.columnar+json'
+    format = 'columnar'
+    compact = True
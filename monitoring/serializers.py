@@ -1,3 +1,7 @@
+import math
+from json.encoder import encode_basestring
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import SensorData, Alert
 
@@ -10,3 +14,134 @@ class AlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = Alert
         fields = '__all__'
+
+
+# -----------------------------
+# Fast read-only serializers
+# -----------------------------
+class FastValuesSerializer:
+    """
+    Read-only, many=True serializer that skips model instantiation.
+
+    Rows are read with ``values_list`` and turned straight into JSON text
+    (``.json``) or plain dicts (``.data``). The output is identical to the
+    matching ModelSerializer with ``fields = '__all__'`` rendered by DRF's
+    compact JSONRenderer. Subclasses list their fields in the ModelSerializer
+    order (pk, concrete fields, then foreign keys) and say how to encode them.
+    Floats JSON cannot represent (NaN, infinities) come out as null.
+    """
+    # (output name, values_list lookup, kind) where kind is one of
+    # "int", "float", "bool", "str", "datetime"
+    fields = ()
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @classmethod
+    def lookups(cls):
+        return [lookup for _, lookup, _ in cls.fields]
+
+    def rows(self):
+        return self.queryset.values_list(*self.lookups())
+
+    @property
+    def data(self):
+        tz = timezone.get_current_timezone()
+        names = [name for name, _, _ in self.fields]
+        kinds = [kind for _, _, kind in self.fields]
+        result = []
+        for row in self.rows():
+            item = {}
+            for name, kind, value in zip(names, kinds, row):
+                if value is not None:
+                    if kind == "datetime":
+                        value = _format_datetime(value, tz)
+                    elif kind == "float":
+                        value = float(value)
+                        if not math.isfinite(value):
+                            value = None
+                item[name] = value
+            result.append(item)
+        return result
+
+    def _encoders(self):
+        return [
+            (encode_basestring(name) + ":", _VALUE_ENCODERS[kind])
+            for name, _, kind in self.fields
+        ]
+
+    @staticmethod
+    def _encode_row(encoders, row, tz):
+        return "{" + ",".join(
+            key + (encode(value, tz) if value is not None else "null")
+            for (key, encode), value in zip(encoders, row)
+        ) + "}"
+
+    def json(self):
+        tz = timezone.get_current_timezone()
+        encoders = self._encoders()
+        parts = [self._encode_row(encoders, row, tz) for row in self.rows()]
+        return "[" + ",".join(parts) + "]"
+
+    async def ajson(self):
+        """``json`` iterating the queryset asynchronously, for async views."""
+        tz = timezone.get_current_timezone()
+        encoders = self._encoders()
+        parts = [self._encode_row(encoders, row, tz) async for row in self.rows()]
+        return "[" + ",".join(parts) + "]"
+
+
+def _encode_str(value):
+    # Like DRF's JSONRenderer: U+2028/U+2029 are valid JSON but end a line
+    # in JavaScript source, so they are escaped too
+    return encode_basestring(value).replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+
+
+def _format_datetime(value, tz):
+    # Same as rest_framework.fields.DateTimeField.to_representation
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _encode_float(value, tz):
+    value = float(value)
+    # repr() would write nan / inf, which is not JSON
+    return repr(value) if math.isfinite(value) else "null"
+
+
+_VALUE_ENCODERS = {
+    "int": lambda value, tz: str(value),
+    "float": _encode_float,
+    "bool": lambda value, tz: "true" if value else "false",
+    "str": lambda value, tz: _encode_str(value),
+    "datetime": lambda value, tz: '"' + _format_datetime(value, tz) + '"',
+}
+
+
+class FastSensorDataSerializer(FastValuesSerializer):
+    fields = (
+        ("id", "id", "int"),
+        ("timestamp", "timestamp", "datetime"),
+        ("temperature", "temperature", "float"),
+        ("humidity", "humidity", "float"),
+        ("ammonia", "ammonia", "float"),
+        ("feed_level", "feed_level", "float"),
+        ("water_level", "water_level", "float"),
+        ("activity_level", "activity_level", "float"),
+        ("user", "user_id", "int"),
+        ("block", "block_id", "int"),
+    )
+
+
+class FastAlertSerializer(FastValuesSerializer):
+    fields = (
+        ("id", "id", "int"),
+        ("timestamp", "timestamp", "datetime"),
+        ("alert_type", "alert_type", "str"),
+        ("message", "message", "str"),
+        ("resolved", "resolved", "bool"),
+        ("user", "user_id", "int"),
+        ("block", "block_id", "int"),
+    )
@@ -0,0 +1,263 @@
+# monitoring/services/anomaly.py
+"""
+Streaming anomaly detection per block and sensor value.
+
+Each (block, sensor value) pair keeps an exponentially weighted mean and
+variance of the reading-to-reading change and a two-sided CUSUM of the
+standardized residuals: a handful of floats, updated in constant time per
+reading. A reading is anomalous when
+
+- its change is more than ``ANOMALY_Z_THRESHOLD`` standard deviations
+  from the usual change (a spike), or
+- the CUSUM passes ``ANOMALY_CUSUM_THRESHOLD`` (a sustained shift that no
+  single reading gives away).
+
+Detection starts after ``ANOMALY_WARMUP`` readings and a pair stays quiet
+for ``ANOMALY_COOLDOWN`` readings after it fired. Anomalies become Alerts of
+type ``ANOMALY_ALERT_TYPE``.
+
+Detection runs in the simulator tick and the catch-up / ingest paths; it
+never reads SensorData. Alert rows from all blocks are queued on
+``alert_batcher`` and written by one background thread with a single
+bulk INSERT every ``ANOMALY_FLUSH_INTERVAL`` seconds, so thousands of
+simulators do not each pay for an INSERT.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from monitoring.models import Alert
+from . import event_log, metrics, notifications
+from .history_codec import HISTORY_METRICS
+
+logger = logging.getLogger("monitoring.anomaly")
+
+ANOMALY_ALERT_TYPE = "Anomaly Alert"
+
+# Alerts kept for the next flush while the database is unavailable; the
+# oldest are dropped beyond that
+MAX_REQUEUED_ALERTS = 10_000
+
+# Readings are rounded to 0.1; changes below this spread are not meaningful
+MIN_STDDEV = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def detection_params():
+    """MetricDetector.update arguments from settings; read once per batch on bulk paths."""
+    return (
+        _setting("ANOMALY_EWMA_ALPHA", 0.05),
+        _setting("ANOMALY_Z_THRESHOLD", 5.0),
+        _setting("ANOMALY_CUSUM_SLACK", 1.0),
+        _setting("ANOMALY_CUSUM_THRESHOLD", 12.0),
+        _setting("ANOMALY_WARMUP", 30),
+        _setting("ANOMALY_COOLDOWN", 100),
+    )
+
+
+class MetricDetector:
+    """
+    EWMA / EW-variance z-score plus two-sided CUSUM for one series.
+
+    Works on the change between consecutive readings rather than on the
+    level: the simulated values are random walks, whose increments are
+    stationary while the levels are not.
+    """
+    __slots__ = ("count", "last", "mean", "var", "cusum_up", "cusum_down", "quiet")
+
+    def __init__(self):
+        self.count = 0
+        self.last = None
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum_up = 0.0
+        self.cusum_down = 0.0
+        self.quiet = 0
+
+    def update(self, value, alpha, z_threshold, slack, cusum_threshold, warmup, cooldown):
+        """
+        Fold ``value`` in. Returns None, or (kind, z) with kind "spike" or
+        "shift up" / "shift down" when the reading is anomalous.
+        """
+        previous, self.last = self.last, value
+        if previous is None:
+            return None
+        change = value - previous
+        self.count += 1
+        if self.count == 1:
+            self.mean = change
+            return None
+
+        diff = change - self.mean
+        z = diff / max(math.sqrt(self.var), MIN_STDDEV)
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+        if self.count <= warmup:
+            # Mean and variance are still settling; do not accumulate yet
+            return None
+        self.cusum_up = max(0.0, self.cusum_up + z - slack)
+        self.cusum_down = max(0.0, self.cusum_down - z - slack)
+
+        if self.quiet:
+            self.quiet -= 1
+            return None
+
+        if abs(z) > z_threshold:
+            kind = "spike"
+        elif self.cusum_up > cusum_threshold:
+            kind = "shift up"
+        elif self.cusum_down > cusum_threshold:
+            kind = "shift down"
+        else:
+            return None
+
+        self.cusum_up = self.cusum_down = 0.0
+        self.quiet = cooldown
+        return kind, z
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self._blocks = {}
+
+    def observe(self, block_id, data, params=None):
+        """
+        Update the detectors of ``block_id`` with one reading.
+        Returns [(metric, value, kind, z)] for the anomalous values.
+        """
+        detectors = self._blocks.get(block_id)
+        if detectors is None:
+            detectors = self._blocks.setdefault(block_id, {metric: MetricDetector() for metric in HISTORY_METRICS})
+
+        params = params or detection_params()
+        found = []
+        for metric, detector in detectors.items():
+            value = data.get(metric)
+            if value is None:
+                continue
+            result = detector.update(value, *params)
+            if result is not None:
+                found.append((metric, value, *result))
+        return found
+
+    def forget(self, block_id):
+        self._blocks.pop(block_id, None)
+
+
+detector = AnomalyDetector()
+
+
+def detect(block, timestamp, data, params=None):
+    """Unsaved anomaly Alerts for one reading of ``block``."""
+    alerts = []
+    for metric, value, kind, z in detector.observe(block.id, data, params):
+        label = metric.replace("_", " ").capitalize()
+        alerts.append(Alert(
+            user_id=block.user_id,
+            block=block,
+            timestamp=timestamp,
+            alert_type=ANOMALY_ALERT_TYPE,
+            message=f"{label} anomaly ({kind}): {value} (z={z:+.1f})",
+        ))
+    return alerts
+
+
+class AlertBatcher:
+    """Collects unsaved Alerts from any thread and bulk-inserts them periodically."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+
+    def add(self, alerts):
+        if not alerts:
+            return
+        with self._lock:
+            self._pending.extend(alerts)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="Alert-Batcher")
+                self._thread.start()
+
+    def forget_block(self, block_id):
+        """Drop queued alerts of a deleted block (their INSERT would fail the batch)."""
+        with self._lock:
+            self._pending = [alert for alert in self._pending if alert.block_id != block_id]
+
+    @staticmethod
+    def _write(alerts):
+        for alert in alerts:
+            # A rolled back bulk_create may have assigned primary keys
+            alert.pk = None
+            alert._state.adding = True
+        with transaction.atomic():
+            Alert.objects.bulk_create(alerts)
+            notifications.enqueue(alerts)
+
+    def flush(self):
+        """
+        Write the queued alerts now; returns how many were written.
+
+        When the batch fails, the alerts are written one by one: alerts
+        the database rejects (their block is gone) are dropped, the others
+        are queued again for the next flush (at most MAX_REQUEUED_ALERTS).
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        started = time.perf_counter()
+        try:
+            self._write(pending)
+        except Exception:
+            logger.warning("Failed to write %d anomaly alerts in one batch; retrying one by one",
+                           len(pending), exc_info=True)
+            written, retry = [], []
+            for alert in pending:
+                try:
+                    self._write([alert])
+                except IntegrityError:
+                    logger.exception("Dropping anomaly alert of block %s", alert.block_id)
+                except Exception:
+                    retry.append(alert)
+                else:
+                    written.append(alert)
+            if retry:
+                logger.error("Failed to write %d anomaly alerts; keeping them for the next flush", len(retry))
+                with self._lock:
+                    self._pending[:0] = retry
+                    dropped = len(self._pending) - MAX_REQUEUED_ALERTS
+                    if dropped > 0:
+                        del self._pending[:dropped]
+                if dropped > 0:
+                    logger.error("Dropped the %d oldest unwritten anomaly alerts", dropped)
+            pending = written
+            if not pending:
+                return 0
+        metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="alert_batch")
+        for alert in pending:
+            metrics.ALERTS_RAISED.inc(alert_type=alert.alert_type)
+        event_log.publish_alerts(pending)
+        return len(pending)
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(_setting("ANOMALY_FLUSH_INTERVAL", 1.0))
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Anomaly alert flush failed")
+        finally:
+            connection.close()
+
+
+alert_batcher = AlertBatcher()
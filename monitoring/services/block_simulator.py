@@ -1,27 +1,170 @@
 # poultry_monitoring/monitoring/services/block_simulator.py
+import os
+import socket
 import threading
 import time
 import logging
 import random
+from collections import deque
+from datetime import timedelta
 
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
-from .simulator_core import SensorSimulatorCore
-from monitoring.models import SensorData, Alert
+from .simulator_core import SensorSimulatorCore, STATE_FIELDS, ALERT_THRESHOLDS
+from . import anomaly, event_log, metrics, notifications, online_stats, sketches
+from monitoring.models import SensorData, Alert, SimulatorCheckpoint
 from flock.models import FlockBlock
 
 logger = logging.getLogger("monitoring.block_simulator")
 
-# Global dictionary to track running simulators
-running_simulators = {}
+
+class SimulatorRegistry:
+    """
+    The simulators running in this process, by block id (as a string).
+
+    Request threads and the simulator threads themselves start, stop and
+    drop entries concurrently, so every change goes through ``start``,
+    ``stop`` and ``discard``, which check and change the registry under one
+    lock: two concurrent starts of a block give one simulator, and only one
+    of two concurrent stops gets it. Reads (``get``, ``in``, ``values()``,
+    ...) work on snapshots and never block on a starting simulator.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._simulators = {}
+        self._starting = set()
+
+    @staticmethod
+    def _key(block_id):
+        return str(block_id)
+
+    def start(self, block_id, create):
+        """
+        Register and start ``create()``'s simulator unless the block already
+        has a live (or still starting) one. Returns ``(simulator, started)``.
+        """
+        key = self._key(block_id)
+        # Built before taking the lock (it may query); unused if one runs already
+        sim = create()
+        with self._lock:
+            current = self._simulators.get(key)
+            if current is not None and (current.is_alive() or key in self._starting):
+                return current, False
+            self._simulators[key] = sim
+            self._starting.add(key)
+        # Started outside the lock: it checkpoints (a DB write)
+        try:
+            sim.start()
+        except Exception:
+            self.discard(block_id, sim)
+            raise
+        finally:
+            with self._lock:
+                self._starting.discard(key)
+        return sim, True
+
+    def stop(self, block_id):
+        """Remove the block's simulator and stop it; returns it, or None if none ran."""
+        with self._lock:
+            sim = self._simulators.pop(self._key(block_id), None)
+        if sim is not None:
+            sim.stop()
+        return sim
+
+    def discard(self, block_id, sim):
+        """Remove ``sim`` if it is still the block's entry (an exiting thread)."""
+        key = self._key(block_id)
+        with self._lock:
+            if self._simulators.get(key) is sim:
+                del self._simulators[key]
+
+    def is_running(self, block_id):
+        sim = self.get(block_id)
+        return sim is not None and sim.is_alive()
+
+    def get(self, block_id, default=None):
+        return self._simulators.get(self._key(block_id), default)
+
+    def __contains__(self, block_id):
+        return self._key(block_id) in self._simulators
+
+    def __getitem__(self, block_id):
+        return self._simulators[self._key(block_id)]
+
+    def __len__(self):
+        return len(self._simulators)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(self._simulators)
+
+    def values(self):
+        with self._lock:
+            return list(self._simulators.values())
+
+    def items(self):
+        with self._lock:
+            return list(self._simulators.items())
+
+
+# Simulators running in this process
+running_simulators = SimulatorRegistry()
+
+# Tick durations kept per simulator for introspection (avg / p99)
+TICK_HISTORY = 500
+
+# Readings written per INSERT when a lazy simulator catches up
+CATCH_UP_BATCH_SIZE = 1000
+
+
+# Tells this process from an earlier one that had the same pid: its start
+# time where /proc has it, a random token otherwise
+_BOOT_NONCE = str(metrics.process_start_time(os.getpid()) or f"x{random.getrandbits(32):08x}")
+
+
+def process_owner():
+    """
+    ``host:pid:nonce`` of this process, recorded on the checkpoints it
+    writes; the nonce is the process start time (see _BOOT_NONCE).
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{_BOOT_NONCE}"
+
+
+def checkpoint_interval():
+    return getattr(settings, "SIMULATOR_CHECKPOINT_INTERVAL", 60.0)
+
+
+def threshold_alerts(data):
+    """Yield (alert_type, message) for every value of ``data`` outside ALERT_THRESHOLDS."""
+    for key, (min_val, max_val) in ALERT_THRESHOLDS.items():
+        value = data.get(key)
+
+        if min_val is not None and value < min_val:
+            yield f"{key.capitalize()} Alert", f"{key.capitalize()} too low: {value}"
+
+        if max_val is not None and value > max_val:
+            yield f"{key.capitalize()} Alert", f"{key.capitalize()} too high: {value}"
+
 
 class BlockSimulatorThread:
-    def __init__(self, block: FlockBlock, interval=3):
+    def __init__(self, block: FlockBlock, interval=3, phase=0.0):
         self.block = block
         self.user = block.user
         self.interval = interval
+        # Delay of the first tick, so that simulators started together
+        # don't all write at the same moment of every interval
+        self.phase = phase
 
         self._stop = threading.Event()
+        # Orders checkpoint writes against stop(): once stop() returns, no
+        # checkpoint can mark the block as running again
+        self._checkpoint_lock = threading.Lock()
 
         self.thread = threading.Thread(
             target=self.run,
@@ -29,113 +172,490 @@ class BlockSimulatorThread:
             name=f"Sim-Block-{block.id}"
         )
 
+        # Own RNG so that its seed can be checkpointed
+        self.rng = random.Random()
+
         # Provide default settings or handle None in SensorSimulatorCore
-        self.core = SensorSimulatorCore(initial_settings={}, flock=block)
+        self.core = SensorSimulatorCore(initial_settings={}, flock=block, rng=self.rng)
+        self._checkpointed_at = None
+
+        # Runtime stats (see services/introspection.py)
+        self.started_at = None
+        self.last_tick_at = None
+        self.tick_count = 0
+        self.error_count = 0
+        self.tick_durations = deque(maxlen=TICK_HISTORY)
 
     def start(self):
-        if not self.thread.is_alive():
+        if not self.thread.is_alive() and not self._stop.is_set():
             logger.info("Starting block simulator for block=%s", self.block.id)
+            self.started_at = timezone.now()
+            self.checkpoint()
             self.thread.start()
 
     def stop(self):
         logger.info("Stopping block simulator for block=%s", self.block.id)
-        self._stop.set()
+        with self._checkpoint_lock:
+            self._stop.set()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def reconfigure(self, block):
+        """Continue with the edited ``block`` (number of birds, breed, age group)."""
+        self.block = block
+        self.core.reconfigure(block)
+
+    def restore(self, checkpoint):
+        """Continue from a SimulatorCheckpoint instead of the default values."""
+        self.core.load_state(checkpoint.state)
+        if checkpoint.rng_seed is not None:
+            self.rng.seed(checkpoint.rng_seed)
+
+    def _next_seed(self):
+        # Reseed so that the checkpointed seed reproduces the rest of the series.
+        # Only called from the simulator's own thread (or before it starts).
+        seed = self.rng.getrandbits(63)
+        self.rng.seed(seed)
+        return seed
+
+    def checkpoint(self):
+        """
+        Save core state, RNG seed and interval to this block's
+        SimulatorCheckpoint. Does nothing once the simulator is stopped.
+        """
+        self._checkpointed_at = time.monotonic()
+        with self._checkpoint_lock:
+            if self._stop.is_set():
+                return
+            self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        try:
+            SimulatorCheckpoint.objects.update_or_create(
+                block_id=self.block.id,
+                defaults={
+                    "running": True,
+                    "lazy": isinstance(self, LazyBlockSimulator),
+                    "interval": self.interval,
+                    "state": {field: round(getattr(self.core, field), 4) for field in STATE_FIELDS},
+                    "rng_seed": self._next_seed(),
+                    "owner": process_owner(),
+                },
+            )
+        except Exception:
+            logger.exception("Checkpoint failed for block %s", self.block.id)
+            self.error_count += 1
+
+    def _checkpoint_due(self):
+        return time.monotonic() - self._checkpointed_at >= checkpoint_interval()
+
+    def tick(self):
+        """
+        Generate one reading and run the write path for it: save, cleanup
+        and alert checks. Returns the generated data.
+        """
+        data = self.core.generate_data()
+
+        # Save reading
+        try:
+            started = time.perf_counter()
+            reading = SensorData.objects.create(
+                user=self.user,
+                block=self.block,
+                **data
+            )
+            metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="reading")
+            metrics.READINGS_WRITTEN.inc(source="simulator")
+            online_stats.record_reading(self.block.id, reading.timestamp, data)
+            sketches.record_reading(self.block.id, reading.timestamp, data)
+            event_log.publish_readings([(self.block.id, self.user.id, reading.timestamp, data)])
+        except Exception:
+            logger.exception("Failed to save SensorData for block %s", self.block.id)
+            self.error_count += 1
+        else:
+            # Anomaly alerts are written in batches across all blocks
+            try:
+                anomaly.alert_batcher.add(anomaly.detect(self.block, reading.timestamp, data))
+            except Exception:
+                logger.exception("Anomaly detection failed for block %s", self.block.id)
+                self.error_count += 1
+
+        # Cleanup old data
+        try:
+            started = time.perf_counter()
+            deleted = SensorData.cleanup_old_data(self.user, days=30)
+            metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="cleanup")
+            if deleted:
+                metrics.RETENTION_ROWS_DELETED.inc(deleted)
+        except Exception:
+            logger.exception("Cleanup failed for block %s", self.block.id)
+            self.error_count += 1
+
+        # Check for alerts
+        try:
+            self._create_alerts(data)
+        except Exception:
+            logger.exception("Alert error for block %s", self.block.id)
+            self.error_count += 1
+
+        return data
 
     def run(self):
         try:
+            due = time.monotonic() + self.phase
+            if self.phase and self._stop.wait(self.phase):
+                return
             while not self._stop.is_set():
-                data = self.core.generate_data()
-
-                # Save reading
-                try:
-                    SensorData.objects.create(
-                        user=self.user,
-                        block=self.block,
-                        **data
-                    )
-                except Exception:
-                    logger.exception("Failed to save SensorData for block %s", self.block.id)
-
-                # Cleanup old data
-                try:
-                    SensorData.cleanup_old_data(self.user, days=30)
-                except Exception:
-                    logger.exception("Cleanup failed for block %s", self.block.id)
-
-                # Check for alerts
-                try:
-                    self._create_alerts(data)
-                except Exception:
-                    logger.exception("Alert error for block %s", self.block.id)
+                started = time.monotonic()
+                metrics.TICK_LAG.observe(max(0.0, started - due))
+                self.tick()
+                elapsed = time.monotonic() - started
+                metrics.TICK_DURATION.observe(elapsed)
+                self.tick_durations.append(elapsed)
+                self.tick_count += 1
+                self.last_tick_at = timezone.now()
+                if self._checkpoint_due():
+                    self.checkpoint()
 
                 # Sleep with some randomness
-                sleep_time = self.interval + (0.1 * (random.random() - 0.5))
-                time.sleep(max(0.5, sleep_time))
+                sleep_time = max(0.5, self.interval + (0.1 * (self.rng.random() - 0.5)))
+                due = time.monotonic() + sleep_time
+                # Returns at once when stopped
+                self._stop.wait(sleep_time)
 
         except Exception:
             logger.exception("Thread crashed for block %s", self.block.id)
 
         finally:
             logger.info("Block simulator exiting for block=%s", self.block.id)
-            # Remove from running simulators
-            if str(self.block.id) in running_simulators:
-                del running_simulators[str(self.block.id)]
+            # Remove from running simulators (unless already replaced)
+            running_simulators.discard(self.block.id, self)
+
+    def _create_alert(self, alert_type, message):
+        started = time.perf_counter()
+        # The notification is queued with the alert and delivered by the
+        # dispatcher thread, never from the tick
+        with transaction.atomic():
+            alert = Alert.objects.create(
+                user=self.user,
+                block=self.block,
+                alert_type=alert_type,
+                message=message,
+            )
+            notifications.enqueue([alert])
+        metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="alert")
+        metrics.ALERTS_RAISED.inc(alert_type=alert_type)
+        event_log.publish_alerts([alert])
 
     def _create_alerts(self, data):
-        THRESHOLDS = {
-            "temperature": (28, 34),
-            "humidity": (None, 85),
-            "ammonia": (None, 25),
-            "feed_level": (20, None),
-            "water_level": (20, None),
-            "activity_level": (30, None),
-        }
-
-        for key, (min_val, max_val) in THRESHOLDS.items():
-            value = data.get(key)
-
-            if min_val is not None and value < min_val:
-                Alert.objects.create(
-                    user=self.user,
-                    block=self.block,
-                    alert_type=f"{key.capitalize()} Alert",
-                    message=f"{key.capitalize()} too low: {value}",
-                )
-
-            if max_val is not None and value > max_val:
-                Alert.objects.create(
-                    user=self.user,
-                    block=self.block,
-                    alert_type=f"{key.capitalize()} Alert",
-                    message=f"{key.capitalize()} too high: {value}",
-                )
-
-def start_simulator_for_block(block: FlockBlock, interval=3):
-    block_key = str(block.id)
-    
-    if block_key in running_simulators and running_simulators[block_key].thread.is_alive():
+        for alert_type, message in threshold_alerts(data):
+            self._create_alert(alert_type, message)
+
+
+class LazyBlockSimulator(BlockSimulatorThread):
+    """
+    A "virtually running" simulator: no thread and no writes while nobody
+    looks at the block.
+
+    When a view reads the block it calls ``catch_up()``, which synthesizes
+    the readings that a BlockSimulatorThread would have written since the
+    last one (one per ``interval`` of simulated time) and stores them with a
+    few bulk INSERTs. The RNG is seeded from the block and the start of the
+    gap, so the same gap always produces the same series. Pages that poll
+    (live simulation) keep catching up by a reading or two per poll, which
+    looks the same as live ticking.
+
+    Gaps longer than ``LAZY_SIMULATION_MAX_GAP`` seconds are shortened to
+    their most recent part. Threshold alerts are raised at most once per
+    alert type per catch-up, at the first offending reading; anomaly alerts
+    are written with the readings.
+    """
+
+    def __init__(self, block: FlockBlock, interval=3, phase=0.0):
+        # ``phase`` is irrelevant: readings are only written on catch-up
+        super().__init__(block, interval)
+        self._lock = threading.Lock()
+        self._last_timestamp = None
+
+    def start(self):
+        if self.started_at is None:
+            logger.info("Starting lazy block simulator for block=%s", self.block.id)
+            self.started_at = timezone.now()
+            self.checkpoint()
+            _ensure_heartbeat()
+
+    def _next_seed(self):
+        # Each catch-up seeds its own RNG from the gap it fills
+        return None
+
+    def is_alive(self):
+        return self.started_at is not None and not self._stop.is_set()
+
+    def reconfigure(self, block):
+        # The gap up to the edit is simulated with the old settings
+        self.catch_up()
+        with self._lock:
+            super().reconfigure(block)
+
+    def _resume(self):
+        """Continue from the newest stored reading, or from ``started_at``."""
+        latest = SensorData.objects.filter(block=self.block).order_by('-timestamp').values(
+            'timestamp', *STATE_FIELDS,
+        ).first()
+        if latest is not None:
+            self.core.load_state(latest)
+        if latest is not None and latest['timestamp'] >= self.started_at:
+            self._last_timestamp = latest['timestamp']
+        else:
+            # First synthesized reading lands on started_at, as a thread's first tick would
+            self._last_timestamp = self.started_at - timedelta(seconds=self.interval)
+
+    def catch_up(self, now=None, final=False):
+        """
+        Write the readings missing between the last one and ``now``.
+        Returns the number of readings written. ``final`` is the last
+        catch-up of a simulator that was just stopped.
+        """
+        if self.started_at is None or (self._stop.is_set() and not final):
+            return 0
+
+        with self._lock:
+            now = now or timezone.now()
+            if self._last_timestamp is None:
+                self._resume()
+
+            step = timedelta(seconds=self.interval)
+            steps = int((now - self._last_timestamp) / step)
+            if steps <= 0:
+                return 0
+
+            max_steps = max(1, int(getattr(settings, "LAZY_SIMULATION_MAX_GAP", 86400) // self.interval))
+            start = self._last_timestamp
+            if steps > max_steps:
+                start += step * (steps - max_steps)
+                steps = max_steps
+
+            started = time.perf_counter()
+            self.core.rng = random.Random(f"{self.block.id}:{start.timestamp()}")
+            readings = []
+            alerts = {}
+            anomalies = []
+            params = anomaly.detection_params()
+            for n in range(1, steps + 1):
+                data = self.core.generate_data()
+                timestamp = start + step * n
+                readings.append(SensorData(user=self.user, block=self.block, timestamp=timestamp, **data))
+                for alert_type, message in threshold_alerts(data):
+                    alerts.setdefault(alert_type, Alert(
+                        user=self.user, block=self.block, timestamp=timestamp,
+                        alert_type=alert_type, message=message,
+                    ))
+                anomalies.extend(anomaly.detect(self.block, timestamp, data, params))
+
+            try:
+                with transaction.atomic():
+                    SensorData.objects.bulk_create(readings, batch_size=CATCH_UP_BATCH_SIZE)
+                    Alert.objects.bulk_create([*alerts.values(), *anomalies])
+                    notifications.enqueue([*alerts.values(), *anomalies])
+            except Exception:
+                logger.exception("Catch-up failed for block %s", self.block.id)
+                self.error_count += 1
+                return 0
+
+            # Committed: whatever fails from here on must not make the next
+            # catch-up write the same gap again
+            self._last_timestamp = start + step * steps
+            self.tick_count += steps
+            self.last_tick_at = now
+
+            published = []
+            for reading in readings:
+                values = {field: getattr(reading, field) for field in STATE_FIELDS}
+                online_stats.record_reading(self.block.id, reading.timestamp, values)
+                sketches.record_reading(self.block.id, reading.timestamp, values)
+                published.append((self.block.id, self.user.id, reading.timestamp, values))
+            event_log.publish_readings(published)
+            event_log.publish_alerts([*alerts.values(), *anomalies])
+            metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="catch_up")
+            metrics.READINGS_WRITTEN.inc(steps, source="catch_up")
+            for alert_type in alerts:
+                metrics.ALERTS_RAISED.inc(alert_type=alert_type)
+            if anomalies:
+                metrics.ALERTS_RAISED.inc(len(anomalies), alert_type=anomaly.ANOMALY_ALERT_TYPE)
+
+            try:
+                deleted = SensorData.cleanup_old_data(self.user, days=30)
+            except Exception:
+                logger.exception("Retention cleanup failed for block %s", self.block.id)
+                self.error_count += 1
+            else:
+                if deleted:
+                    metrics.RETENTION_ROWS_DELETED.inc(deleted)
+
+            if self._checkpoint_due():
+                self.checkpoint()
+            return steps
+
+
+_heartbeat_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def refresh_lazy_checkpoints():
+    """
+    Mark the checkpoints of this process's lazy simulators as fresh. They
+    are only saved on catch-up, so without this an idle one would look
+    orphaned to the supervisor of a worker on another host.
+    """
+    ids = [sim.block.id for sim in running_simulators.values() if isinstance(sim, LazyBlockSimulator) and sim.is_alive()]
+    if not ids:
+        return 0
+    return SimulatorCheckpoint.objects.filter(block_id__in=ids, owner=process_owner(), running=True).update(
+        updated_at=timezone.now(),
+    )
+
+
+def _heartbeat():
+    try:
+        while True:
+            time.sleep(checkpoint_interval())
+            try:
+                refresh_lazy_checkpoints()
+            except Exception:
+                logger.exception("Refreshing lazy simulator checkpoints failed")
+    finally:
+        connection.close()
+
+
+def _ensure_heartbeat():
+    global _heartbeat_thread
+    with _heartbeat_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, daemon=True, name="Sim-Heartbeat")
+            _heartbeat_thread.start()
+
+
+def lazy_simulation_enabled():
+    return getattr(settings, "SIMULATION_MODE", "threads") == "lazy"
+
+def _start(block, interval, lazy, checkpoint=None, phase=0.0):
+    """Start ``block`` through the registry; returns ``(simulator, started)``."""
+    if lazy is None:
+        lazy = lazy_simulation_enabled()
+
+    def create():
+        sim = (LazyBlockSimulator if lazy else BlockSimulatorThread)(block, interval, phase=phase)
+        if checkpoint is not None:
+            sim.restore(checkpoint)
+        return sim
+
+    sim, started = running_simulators.start(block.id, create)
+    if started:
+        logger.info(f"Started simulator for block {block.name} (ID: {block.id})")
+    else:
         logger.info(f"Simulator already running for block {block.name}")
-        return running_simulators[block_key]
+    return sim, started
+
+def start_simulator_for_block(block: FlockBlock, interval=3, lazy=None, checkpoint=None):
+    """
+    Start simulating ``block``: with a thread, or lazily (see
+    LazyBlockSimulator) when ``lazy`` is true or SIMULATION_MODE is "lazy".
+    A SimulatorCheckpoint given as ``checkpoint`` is restored first.
+    Returns the running simulator (an existing one if there was one).
+    """
+    return _start(block, interval, lazy, checkpoint)[0]
 
-    sim = BlockSimulatorThread(block, interval)
-    running_simulators[block_key] = sim
-    sim.start()
-    logger.info(f"Started simulator for block {block.name} (ID: {block.id})")
-    return sim
+def _stopped(sims):
+    """Finish stopping ``sims`` removed from the registry."""
+    for sim in sims:
+        if isinstance(sim, LazyBlockSimulator):
+            # Fill the gap up to the moment it was stopped
+            sim.catch_up(final=True)
+    # Not restored on the next startup
+    SimulatorCheckpoint.objects.filter(block_id__in=[sim.block.id for sim in sims]).update(running=False)
 
 def stop_simulator_for_block(block: FlockBlock):
-    block_key = str(block.id)
-    
-    if block_key in running_simulators:
-        sim = running_simulators[block_key]
-        sim.stop()
-        del running_simulators[block_key]
-        logger.info(f"Stopped simulator for block {block.name}")
-        return True
-    else:
+    sim = running_simulators.stop(block.id)
+    if sim is None:
         logger.info(f"No running simulator found for block {block.name}")
         return False
+    _stopped([sim])
+    logger.info(f"Stopped simulator for block {block.name}")
+    return True
+
+def start_simulators(blocks, interval=3, lazy=None, spread=None):
+    """
+    Start the simulators of ``blocks`` together, their first ticks spread
+    evenly over ``spread`` seconds (default: one ``interval``) so that they
+    don't write in lockstep. Returns the ids of the blocks started (blocks
+    already running are left as they are).
+    """
+    blocks = list(blocks)
+    if spread is None:
+        spread = interval
+    started = []
+    for n, block in enumerate(blocks):
+        try:
+            if _start(block, interval, lazy, phase=spread * n / len(blocks))[1]:
+                started.append(block.id)
+        except Exception:
+            logger.exception("Failed to start simulator for block %s", block.id)
+    return started
+
+def stop_simulators(block_ids):
+    """Stop the simulators of ``block_ids``; returns the ids of those that were running."""
+    sims = [sim for sim in (running_simulators.stop(block_id) for block_id in block_ids) if sim is not None]
+    if sims:
+        _stopped(sims)
+        logger.info("Stopped %d simulators", len(sims))
+    return [sim.block.id for sim in sims]
+
+def start_user_simulators(user, interval=3, lazy=None, spread=None):
+    """start_simulators() for all blocks of ``user``."""
+    return start_simulators(FlockBlock.objects.filter(user=user).select_related('user'), interval, lazy, spread)
+
+def stop_user_simulators(user):
+    """stop_simulators() for all running blocks of ``user``."""
+    return stop_simulators(sim.block.id for sim in running_simulators.values() if sim.block.user_id == user.pk)
+
+def reconfigure_simulator_for_block(block: FlockBlock):
+    """Apply an edited ``block`` to its running simulator, if any."""
+    sim = running_simulators.get(str(block.id))
+    if sim is None:
+        return False
+    sim.reconfigure(block)
+    logger.info("Reconfigured simulator for block %s", block.id)
+    return True
+
+def discard_simulator_for_block(block_id):
+    """
+    Stop the simulator of a deleted block at once: no final catch-up and
+    no checkpoint, as there is nothing left to write them for.
+    """
+    if running_simulators.stop(block_id) is None:
+        return False
+    logger.info("Discarded simulator of deleted block %s", block_id)
+    return True
 
 def is_running(block: FlockBlock):
-    block_key = str(block.id)
-    return block_key in running_simulators and running_simulators[block_key].thread.is_alive()
\ No newline at end of file
+    return running_simulators.is_running(block.id)
+
+def catch_up(block_id, user=None):
+    """
+    Bring a lazily simulated block up to date before it is read. Returns the
+    number of readings written; no-op (and no queries) for other blocks.
+    """
+    sim = running_simulators.get(str(block_id))
+    if not isinstance(sim, LazyBlockSimulator):
+        return 0
+    if user is not None and sim.block.user_id != user.pk:
+        return 0
+    return sim.catch_up()
+
+def catch_up_user(user):
+    """catch_up() every lazily simulated block of ``user``."""
+    return sum(
+        sim.catch_up() for sim in running_simulators.values()
+        if isinstance(sim, LazyBlockSimulator) and sim.block.user_id == user.pk
+    )
\ No newline at end of file
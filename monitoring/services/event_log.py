@@ -0,0 +1,359 @@
+# monitoring/services/event_log.py
+"""
+Append-only, segmented log of readings and alerts.
+
+Everything the simulators and the ingest paths write to SensorData and
+Alert is also appended here as an event (a JSON object with a "type" of
+"reading" or "alert") under a monotonically increasing offset. Consumers
+read the log sequentially from an offset they remember instead of polling
+the database:
+
+    for offset, event in event_log.subscribe(from_offset=last + 1):
+        ...
+
+Layout: ``EVENT_LOG_DIR`` holds segment files named after the offset of
+their first event. Each record is a frame
+
+    offset (8 bytes) | length (4) | crc32 (4) | payload (JSON, ``length`` bytes)
+
+A new segment starts when the active one reaches
+``EVENT_LOG_SEGMENT_BYTES``; whole sealed segments are deleted once the log
+is larger than ``EVENT_LOG_RETENTION_BYTES`` or they are older than
+``EVENT_LOG_RETENTION_HOURS``. Retention runs when the log is opened, on
+every roll and every ``EVENT_LOG_RETENTION_INTERVAL`` seconds, so a log
+that stopped growing still ages out. A torn frame at the end of the active
+segment (a crash mid-write) is cut off when the log is opened.
+
+Appends take an exclusive ``flock`` on the directory's lock file and pick
+up frames other processes appended meanwhile, so the web server and the
+ingest listener can share one log. Appending never raises into the write
+path; failures are logged.
+"""
+import bisect
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+logger = logging.getLogger("monitoring.event_log")
+
+FRAME_HEADER = struct.Struct(">QII")
+SEGMENT_SUFFIX = ".log"
+
+# Frames between two entries of a segment's in-memory seek index
+INDEX_EVERY = 1024
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _segment_name(base_offset):
+    return f"{base_offset:020d}{SEGMENT_SUFFIX}"
+
+
+def _read_frames(fh, position):
+    """
+    Yield ``(offset, payload, position_after)`` from ``position`` up to the
+    first incomplete or corrupt frame.
+    """
+    fh.seek(position)
+    while True:
+        header = fh.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+        offset, length, crc = FRAME_HEADER.unpack(header)
+        payload = fh.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        position += FRAME_HEADER.size + length
+        yield offset, payload, position
+
+
+class EventLog:
+    def __init__(self, directory=None, segment_bytes=None, retention_bytes=None, retention_hours=None):
+        self.directory = Path(directory or _setting("EVENT_LOG_DIR", Path(settings.BASE_DIR) / "eventlog"))
+        self.segment_bytes = segment_bytes or _setting("EVENT_LOG_SEGMENT_BYTES", 64 * 1024 * 1024)
+        self.retention_bytes = retention_bytes or _setting("EVENT_LOG_RETENTION_BYTES", 1024 * 1024 * 1024)
+        self.retention_hours = retention_hours or _setting("EVENT_LOG_RETENTION_HOURS", 24 * 7)
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._opened = False
+        self._fh = None
+        self._lock_fh = None
+        self._base = None       # first offset of the active segment
+        self._position = 0      # end of the last complete frame in it
+        self._next_offset = 0
+        self._index_lock = threading.Lock()
+        self._indexes = {}      # segment base -> ([offsets], [positions], bytes scanned)
+        self._retention_thread = None
+
+    # -----------------------------
+    # Segments
+    # -----------------------------
+    def segments(self):
+        """Base offsets of the segments on disk, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            int(path.name[:-len(SEGMENT_SUFFIX)])
+            for path in self.directory.iterdir()
+            if path.name.endswith(SEGMENT_SUFFIX) and path.name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _path(self, base):
+        return self.directory / _segment_name(base)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        if self._lock_fh is None:
+            self._lock_fh = open(self.directory / "LOCK", "a")
+        fcntl.flock(self._lock_fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+
+    def _open_active(self, base, position):
+        if self._fh is not None:
+            self._fh.close()
+        self._fh = open(self._path(base), "r+b" if self._path(base).exists() else "w+b")
+        self._base = base
+        self._position = position
+
+    def _sync_tail(self):
+        """Catch up with frames appended by other processes (or recover on open)."""
+        size = os.fstat(self._fh.fileno()).st_size if self._fh is not None else None
+        # Only a full segment can have been rolled over by another process
+        if size is None or size >= self.segment_bytes:
+            segments = self.segments()
+            if not segments:
+                self._open_active(0, 0)
+                self._next_offset = 0
+                self._opened = True
+                return
+            if self._base != segments[-1]:
+                self._open_active(segments[-1], 0)
+                size = os.fstat(self._fh.fileno()).st_size
+        if size == self._position and self._opened:
+            return
+        next_offset = self._base if self._position == 0 else self._next_offset
+        for offset, _, position in _read_frames(self._fh, self._position):
+            next_offset = offset + 1
+            self._position = position
+        self._next_offset = next_offset
+        if self._position < size:
+            logger.warning("Truncating %d bytes of a torn frame in %s", size - self._position, self._path(self._base))
+            self._fh.truncate(self._position)
+        self._opened = True
+
+    def _sync(self):
+        """``_sync_tail``, plus retention and its timer when the log is opened."""
+        opening = not self._opened
+        self._sync_tail()
+        if opening:
+            self._enforce_retention()
+            if self._retention_thread is None:
+                self._retention_thread = threading.Thread(
+                    target=self._retention_loop, daemon=True, name="EventLog-Retention",
+                )
+                self._retention_thread.start()
+
+    def _roll(self):
+        self._open_active(self._next_offset, 0)
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        segments = self.segments()
+        sizes = {base: self._path(base).stat().st_size for base in segments}
+        total = sum(sizes.values())
+        cutoff = time.time() - self.retention_hours * 3600
+        deleted = 0
+        for base in segments[:-1]:
+            path = self._path(base)
+            if total <= self.retention_bytes and path.stat().st_mtime >= cutoff:
+                break
+            path.unlink(missing_ok=True)
+            with self._index_lock:
+                self._indexes.pop(base, None)
+            total -= sizes[base]
+            deleted += 1
+        return deleted
+
+    def enforce_retention(self):
+        """Delete the sealed segments past the retention limits; returns how many."""
+        with self._lock:
+            if not self.directory.is_dir():
+                return 0
+            with self._file_lock():
+                return self._enforce_retention()
+
+    def _retention_loop(self):
+        while True:
+            time.sleep(_setting("EVENT_LOG_RETENTION_INTERVAL", 300.0))
+            try:
+                self.enforce_retention()
+            except Exception:
+                logger.exception("Event log retention failed")
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def append_many(self, events):
+        """Append events (JSON-serializable dicts); returns the offset of the first."""
+        payloads = [json.dumps(event, separators=(",", ":")).encode() for event in events]
+        if not payloads:
+            return None
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                self._sync()
+                if self._position >= self.segment_bytes:
+                    self._roll()
+                first = self._next_offset
+                frames = bytearray()
+                for payload in payloads:
+                    frames += FRAME_HEADER.pack(self._next_offset, len(payload), zlib.crc32(payload))
+                    frames += payload
+                    self._next_offset += 1
+                self._fh.seek(self._position)
+                self._fh.write(frames)
+                self._fh.flush()
+                if _setting("EVENT_LOG_FSYNC", False):
+                    os.fsync(self._fh.fileno())
+                self._position += len(frames)
+            self._appended.notify_all()
+        return first
+
+    def append(self, event):
+        return self.append_many([event])
+
+    @property
+    def next_offset(self):
+        """Offset the next appended event will get (as far as this process knows)."""
+        with self._lock:
+            if self.directory.is_dir():
+                with self._file_lock():
+                    self._sync()
+            return self._next_offset
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def _index(self, base):
+        """Sparse offset -> position index of a segment, extended as it grows."""
+        with self._index_lock:
+            offsets, positions, scanned = self._indexes.get(base, ([], [], 0))
+            with open(self._path(base), "rb") as fh:
+                position = scanned
+                for offset, _, after in _read_frames(fh, scanned):
+                    if (offset - base) % INDEX_EVERY == 0:
+                        offsets.append(offset)
+                        positions.append(position)
+                    position = after
+            self._indexes[base] = (offsets, positions, position)
+            return list(offsets), list(positions)
+
+    def read(self, from_offset, limit=1000):
+        """
+        Up to ``limit`` ``(offset, event)`` pairs starting at ``from_offset``
+        (or at the oldest retained event, if that one was deleted).
+        """
+        segments = self.segments()
+        if not segments:
+            return []
+        index = max(0, bisect.bisect_right(segments, from_offset) - 1)
+        events = []
+        for base in segments[index:]:
+            try:
+                offsets, positions = self._index(base)
+                seek = bisect.bisect_right(offsets, from_offset) - 1
+                position = positions[seek] if seek >= 0 else 0
+                with open(self._path(base), "rb") as fh:
+                    for offset, payload, _ in _read_frames(fh, position):
+                        if offset < from_offset:
+                            continue
+                        events.append((offset, json.loads(payload)))
+                        if len(events) >= limit:
+                            return events
+            except FileNotFoundError:
+                # Deleted by retention while reading; continue with the next one
+                continue
+        return events
+
+    def subscribe(self, from_offset=None, poll_interval=0.5, stop=None):
+        """
+        Yield ``(offset, event)`` forever, starting at ``from_offset`` (the
+        current end of the log when None). Waits for new events in between;
+        ``stop`` (a threading.Event) ends the iteration.
+        """
+        offset = self.next_offset if from_offset is None else from_offset
+        while stop is None or not stop.is_set():
+            events = self.read(offset)
+            for event_offset, event in events:
+                yield event_offset, event
+                offset = event_offset + 1
+            if not events:
+                # Woken early by appends from this process; others are polled
+                with self._appended:
+                    self._appended.wait(poll_interval)
+
+
+event_log = EventLog()
+
+
+def enabled():
+    return _setting("EVENT_LOG_ENABLED", True)
+
+
+def reading_event(block_id, user_id, timestamp, data):
+    return {"type": "reading", "block": block_id, "user": user_id, "ts": timestamp.timestamp(), **data}
+
+
+def alert_event(alert):
+    return {
+        "type": "alert",
+        "id": alert.pk,
+        "block": alert.block_id,
+        "user": alert.user_id,
+        "ts": alert.timestamp.timestamp(),
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+    }
+
+
+def publish(events):
+    """Append events if the log is enabled; never raises."""
+    if not events or not enabled():
+        return
+    try:
+        event_log.append_many(events)
+    except Exception:
+        logger.exception("Failed to append %d events to the event log", len(events))
+
+
+def publish_readings(readings):
+    """Append ``(block_id, user_id, timestamp, data)`` readings."""
+    if enabled():
+        publish([reading_event(*reading) for reading in readings])
+
+
+def publish_alerts(alerts):
+    """Append saved Alert instances."""
+    if enabled():
+        publish([alert_event(alert) for alert in alerts])
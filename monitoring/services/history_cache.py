@@ -0,0 +1,227 @@
+# monitoring/services/history_cache.py
+"""
+Incremental cache of the history_detail series per block and range.
+
+An entry holds the readings of one (block, range) window already encoded
+for the columnar payload (see history_codec.py), in chunks of
+``CHUNK_ROWS`` rows whose JSON text is kept once produced. On a repeat
+request the window is moved instead of rebuilt:
+
+- rows older than the new range start are dropped from the head
+  (whole chunks, plus a trim of the first remaining one);
+- only readings newer than the entry's high-water mark are fetched and
+  appended to the tail.
+
+So a refresh costs one small query plus re-serializing at most the first
+and last chunk; the payload is assembled by joining the cached chunk text.
+Running sums per metric give the averages without another pass.
+
+Entries are evicted least recently used first when there are more than
+``HISTORY_CACHE_MAX_ENTRIES`` of them or more than
+``HISTORY_CACHE_MAX_ROWS`` rows in total. Writers that may insert readings
+older than the newest one (e.g. bulk ingest) call ``invalidate``, but that
+only reaches the cache of their own process: the line-protocol listener and
+the other web workers keep their entries. So every entry is also rebuilt
+from the database once it is ``HISTORY_CACHE_TTL`` seconds old, which bounds
+how long a late reading written elsewhere can be missing from the chart.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from monitoring.models import SensorData
+from .history_codec import COLUMNAR_VERSION, HISTORY_METRICS, scale_value
+
+# Rows per chunk of cached JSON text
+CHUNK_ROWS = 2048
+
+PRECISION = 1
+SCALE = 10 ** PRECISION
+
+
+class _Chunk:
+    __slots__ = ("timestamps", "columns", "_dt_json", "_column_json")
+
+    def __init__(self):
+        self.timestamps = []
+        self.columns = [[] for _ in HISTORY_METRICS]
+        self._dt_json = None
+        self._column_json = None
+
+    def touch(self):
+        self._dt_json = self._column_json = None
+
+    def dt_json(self):
+        """Deltas between this chunk's rows, i.e. for rows 1..n-1."""
+        if self._dt_json is None:
+            ts = self.timestamps
+            self._dt_json = ",".join(str(b - a) for a, b in zip(ts, ts[1:]))
+        return self._dt_json
+
+    def column_json(self, index):
+        if self._column_json is None:
+            # Values are ints, or None for the ones that were not finite
+            self._column_json = [",".join(map(str, column)).replace("None", "null") for column in self.columns]
+        return self._column_json[index]
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = time.monotonic()
+        self.chunks = []
+        self.rows = 0
+        self.sums = [0] * len(HISTORY_METRICS)
+        self.counts = [0] * len(HISTORY_METRICS)  # values in the sums (not null)
+        self.high_water = None       # timestamp of the newest row
+        self.high_water_ids = set()  # ids of the rows at that timestamp
+
+    def append(self, rows):
+        """Append ``(id, timestamp, *values)`` rows, oldest first."""
+        for row_id, timestamp, *values in rows:
+            chunk = self.chunks[-1] if self.chunks and len(self.chunks[-1].timestamps) < CHUNK_ROWS else None
+            if chunk is None:
+                chunk = _Chunk()
+                self.chunks.append(chunk)
+            chunk.timestamps.append(int(timestamp.timestamp()))
+            for i, (column, value) in enumerate(zip(chunk.columns, values)):
+                scaled = scale_value(value, SCALE)
+                column.append(scaled)
+                if scaled is not None:
+                    self.sums[i] += scaled
+                    self.counts[i] += 1
+            chunk.touch()
+            self.rows += 1
+
+            if timestamp != self.high_water:
+                self.high_water = timestamp
+                self.high_water_ids = set()
+            self.high_water_ids.add(row_id)
+
+    def drop_before(self, start):
+        cutoff = int(start.timestamp())
+        while self.chunks and self.chunks[0].timestamps[-1] < cutoff:
+            self._forget(self.chunks.pop(0), None)
+        if self.chunks and self.chunks[0].timestamps[0] < cutoff:
+            chunk = self.chunks[0]
+            keep = next(i for i, ts in enumerate(chunk.timestamps) if ts >= cutoff)
+            self._forget(chunk, keep)
+            chunk.timestamps = chunk.timestamps[keep:]
+            chunk.columns = [column[keep:] for column in chunk.columns]
+            chunk.touch()
+
+    def _forget(self, chunk, keep):
+        dropped = len(chunk.timestamps) if keep is None else keep
+        for i, column in enumerate(chunk.columns):
+            values = [value for value in column[:dropped] if value is not None]
+            self.sums[i] -= sum(values)
+            self.counts[i] -= len(values)
+        self.rows -= dropped
+
+    def payload_json(self):
+        """
+        The columnar payload as JSON text, equal to
+        ``json.dumps(encode_columnar(...), separators=(",", ":"))``.
+        """
+        dt_parts = []
+        previous = None
+        for chunk in self.chunks:
+            first = chunk.timestamps[0]
+            part = str(0 if previous is None else first - previous)
+            tail = chunk.dt_json()
+            dt_parts.append(f"{part},{tail}" if tail else part)
+            previous = chunk.timestamps[-1]
+
+        series = ",".join(
+            f'"{metric}":[' + ",".join(chunk.column_json(i) for chunk in self.chunks) + "]"
+            for i, metric in enumerate(HISTORY_METRICS)
+        )
+        base = self.chunks[0].timestamps[0] if self.chunks else 0
+        return f'{{"v":{COLUMNAR_VERSION},"base":{base},"dt":[{",".join(dt_parts)}],"scale":{SCALE},"series":{{{series}}}}}'
+
+    def averages(self):
+        return [total / count / SCALE if count else 0 for total, count in zip(self.sums, self.counts)]
+
+
+class HistoryCache:
+    def __init__(self, max_entries=None, max_rows=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._max_rows = max_rows
+
+    @property
+    def max_entries(self):
+        return self._max_entries or getattr(settings, "HISTORY_CACHE_MAX_ENTRIES", 256)
+
+    @property
+    def max_rows(self):
+        return self._max_rows or getattr(settings, "HISTORY_CACHE_MAX_ROWS", 1_000_000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "HISTORY_CACHE_TTL", 300.0)
+
+    def _fetch(self, block_id, start, end, entry):
+        rows = SensorData.objects.filter(block_id=block_id, timestamp__lte=end)
+        if entry.high_water is None:
+            rows = rows.filter(timestamp__gte=start)
+        else:
+            rows = rows.filter(timestamp__gte=entry.high_water).exclude(id__in=entry.high_water_ids)
+        return rows.order_by('timestamp', 'id').values_list('id', 'timestamp', *HISTORY_METRICS)
+
+    def get(self, block_id, key, start, end):
+        """
+        Bring the (block_id, key) window up to [start, end] and return
+        ``(payload_json, row_count, averages)``.
+        """
+        cache_key = (block_id, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None or time.monotonic() - entry.created > self.ttl:
+                entry = self._entries[cache_key] = _Entry()
+            self._entries.move_to_end(cache_key)
+
+        with entry.lock:
+            entry.append(self._fetch(block_id, start, end, entry))
+            entry.drop_before(start)
+            result = entry.payload_json(), entry.rows, entry.averages()
+
+        self._evict(cache_key)
+        return result
+
+    def _evict(self, current):
+        with self._lock:
+            total = sum(entry.rows for entry in self._entries.values())
+            while self._entries and (len(self._entries) > self.max_entries or total > self.max_rows):
+                key, entry = next(iter(self._entries.items()))
+                if key == current and len(self._entries) == 1:
+                    # Too big to keep even on its own
+                    del self._entries[key]
+                    break
+                if key == current:
+                    self._entries.move_to_end(key)
+                    continue
+                del self._entries[key]
+                total -= entry.rows
+
+    def invalidate(self, block_id, since=None):
+        """
+        Forget the cached windows of ``block_id``; with ``since``, only those
+        that already extend past that timestamp and so would miss a reading
+        written at it.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == block_id]:
+                high_water = self._entries[key].high_water
+                if since is None or (high_water is not None and high_water > since):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,98 @@
+# monitoring/services/history_codec.py
+"""
+Compact columnar encoding for sensor history payloads.
+
+Instead of a list of row dicts (which repeats every key name and a full ISO
+timestamp per reading) the payload holds one array per metric, a base epoch
+and integer second deltas between consecutive readings. Metric values are
+stored as integers at a fixed decimal precision (``null`` for NaN and
+infinite values, which JSON cannot hold):
+
+    {
+        "v": 1,
+        "base": 1760000000,      # epoch seconds of the first reading
+        "dt": [0, 3, 3, 4, ...], # seconds since the previous reading
+        "scale": 10,             # divide metric values by this
+        "series": {"temperature": [301, 302, ...], ...}
+    }
+
+``static/js/history_codec.js`` decodes the same format in the browser.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+COLUMNAR_VERSION = 1
+
+HISTORY_METRICS = (
+    "temperature",
+    "humidity",
+    "ammonia",
+    "feed_level",
+    "water_level",
+    "activity_level",
+)
+
+
+def scale_value(value, scale):
+    """``value`` as an integer at ``scale``: 0 when missing, None when not finite."""
+    value = value or 0
+    return round(value * scale) if math.isfinite(value) else None
+
+
+def encode_columnar(rows, metrics=HISTORY_METRICS, precision=1):
+    """
+    Encode chronologically ordered readings into the columnar format.
+
+    Args:
+        rows: iterable of ``(timestamp, value1, value2, ...)`` tuples, with the
+            values in the same order as ``metrics`` (e.g. from ``values_list``).
+        metrics: metric names matching the value positions in each row.
+        precision: number of decimal places kept for metric values.
+
+    Returns:
+        dict: the columnar payload described in the module docstring.
+    """
+    scale = 10 ** precision
+    columns = [[] for _ in metrics]
+    deltas = []
+    base = previous = None
+
+    for row in rows:
+        ts = int(row[0].timestamp())
+        if base is None:
+            base = previous = ts
+        deltas.append(ts - previous)
+        previous = ts
+
+        for column, value in zip(columns, row[1:]):
+            column.append(scale_value(value, scale))
+
+    return {
+        "v": COLUMNAR_VERSION,
+        "base": base or 0,
+        "dt": deltas,
+        "scale": scale,
+        "series": dict(zip(metrics, columns)),
+    }
+
+
+def decode_columnar(payload):
+    """
+    Expand a columnar payload back into a list of row dicts.
+
+    Mirrors the browser decoder; timestamps come back as aware UTC datetimes.
+    """
+    scale = payload["scale"]
+    series = payload["series"]
+    rows = []
+    ts = payload["base"]
+
+    for index, delta in enumerate(payload["dt"]):
+        ts += delta
+        row = {"timestamp": datetime.fromtimestamp(ts, tz=dt_timezone.utc)}
+        for metric, values in series.items():
+            value = values[index]
+            row[metric] = None if value is None else value / scale
+        rows.append(row)
+
+    return rows
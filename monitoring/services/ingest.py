@@ -0,0 +1,333 @@
+# monitoring/services/ingest.py
+"""
+Batch ingest of readings from real sensor gateways.
+
+A batch is a list of items, one reading each:
+
+    {"block": 12, "ts": "2026-10-19T08:00:03Z", "temperature": 30.1,
+     "humidity": 61.0, "ammonia": 12.3, "feed_level": 74.2,
+     "water_level": 80.5, "activity_level": 66.0, "key": "gw1-000173"}
+
+``ts`` is an ISO 8601 string or epoch seconds (server time when missing);
+``key`` is an optional idempotency key. Items are checked in one pass of
+plain Python (no DRF serializers), against the blocks the user owns, with
+one query for the whole batch, and get a status each: "created", "duplicate" or "rejected" (with the reasons).
+
+Duplicates are readings whose (block, timestamp) is already stored or
+appears earlier in the batch, and readings whose key was seen recently in
+this process (``INGEST_KEY_WINDOW`` keys), which covers retried readings
+that carry no timestamp of their own.
+
+``write_readings`` is the shared write path (also used by the line
+protocol listener): one bulk INSERT per batch plus the same threshold
+rules as the simulator, at most one alert per block and alert type per
+batch, anomaly detection, statistics, sketches and the event log.
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData, Alert
+from . import anomaly, event_log, metrics, notifications, online_stats, sketches
+from .block_simulator import threshold_alerts
+from .history_cache import history_cache
+from .history_codec import HISTORY_METRICS
+
+# Accepted range of each sensor value
+VALUE_RANGES = {
+    "temperature": (-40.0, 80.0),
+    "humidity": (0.0, 100.0),
+    "ammonia": (0.0, 1000.0),
+    "feed_level": (0.0, 100.0),
+    "water_level": (0.0, 100.0),
+    "activity_level": (0.0, 100.0),
+}
+
+# Readings per INSERT
+INGEST_BATCH_SIZE = 1000
+
+class IngestError(ValueError):
+    """The request body as a whole cannot be read as a batch."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_batch(body, content_type=""):
+    """
+    Items of a JSON array (or {"readings": [...]}) or NDJSON body. Lines of
+    NDJSON that are not a JSON object come back as IngestError items, so the
+    rest of the batch is still ingested.
+    """
+    try:
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+    except UnicodeDecodeError:
+        raise IngestError("Body is not UTF-8")
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                items.append(IngestError(f"Invalid JSON: {exc}"))
+    else:
+        try:
+            items = json.loads(text)
+        except ValueError as exc:
+            raise IngestError(f"Invalid JSON: {exc}")
+        if isinstance(items, dict):
+            items = items.get("readings")
+        if not isinstance(items, list):
+            raise IngestError("Expected a JSON array of readings or {\"readings\": [...]}")
+
+    if not items:
+        raise IngestError("No readings")
+    max_batch = _setting("INGEST_MAX_BATCH", 50000)
+    if len(items) > max_batch:
+        raise IngestError(f"At most {max_batch} readings per batch")
+    return items
+
+
+def _parse_timestamp(value, now):
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+    raise ValueError
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class _RecentKeys:
+    """Bounded set of the (block_id, key) pairs ingested last."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+    def __contains__(self, item):
+        with self._lock:
+            return item in self._keys
+
+    def add_all(self, items):
+        limit = _setting("INGEST_KEY_WINDOW", 100_000)
+        with self._lock:
+            for item in items:
+                self._keys[item] = None
+                self._keys.move_to_end(item)
+            while len(self._keys) > limit:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_keys = _RecentKeys()
+
+
+def validate_batch(user, items, now=None):
+    """
+    Check ``items`` against the user's blocks.
+
+    Returns ``(statuses, accepted)``: a status dict per item (None for the
+    accepted ones) and ``(index, block, timestamp, data, key)`` tuples.
+    """
+    now = now or timezone.now()
+    max_skew = timedelta(seconds=_setting("INGEST_MAX_CLOCK_SKEW", 300))
+    oldest = now - timedelta(days=_setting("INGEST_MAX_AGE_DAYS", 30))
+
+    block_ids = set()
+    for item in items:
+        if isinstance(item, dict):
+            block_id = item.get("block", item.get("block_id"))
+            if isinstance(block_id, int) and not isinstance(block_id, bool):
+                block_ids.add(block_id)
+    blocks = {block.id: block for block in FlockBlock.objects.filter(user=user, id__in=block_ids).only('id', 'user_id')}
+
+    statuses = [None] * len(items)
+    accepted = []
+    for index, item in enumerate(items):
+        if isinstance(item, IngestError):
+            statuses[index] = {"index": index, "status": "rejected", "errors": [str(item)]}
+            continue
+        if not isinstance(item, dict):
+            statuses[index] = {"index": index, "status": "rejected", "errors": ["Expected an object"]}
+            continue
+
+        errors = []
+        block_id = item.get("block", item.get("block_id"))
+        block = blocks.get(block_id) if isinstance(block_id, int) else None
+        if block is None:
+            errors.append("Unknown block")
+
+        try:
+            timestamp = _parse_timestamp(item.get("ts", item.get("timestamp")), now)
+        except (ValueError, OverflowError, OSError):
+            errors.append("Invalid timestamp")
+        else:
+            if timestamp > now + max_skew:
+                errors.append("Timestamp is in the future")
+            elif timestamp < oldest:
+                errors.append("Timestamp is older than the retention period")
+
+        data = {}
+        for metric in HISTORY_METRICS:
+            value = _number(item.get(metric))
+            low, high = VALUE_RANGES[metric]
+            if value is None:
+                errors.append(f"{metric}: a number is required")
+            elif not low <= value <= high:
+                errors.append(f"{metric}: must be between {low:g} and {high:g}")
+            else:
+                data[metric] = value
+
+        key = item.get("key")
+        if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 100):
+            errors.append("key: must be a string of at most 100 characters")
+
+        if errors:
+            statuses[index] = {"index": index, "status": "rejected", "errors": errors}
+        else:
+            accepted.append((index, block, timestamp, data, key))
+    return statuses, accepted
+
+
+def _stored_timestamps(accepted):
+    """(block_id, timestamp) pairs of ``accepted`` that are already stored."""
+    spans = {}
+    for _, block, timestamp, _, _ in accepted:
+        first, last = spans.get(block.id, (timestamp, timestamp))
+        spans[block.id] = (min(first, timestamp), max(last, timestamp))
+
+    # One range scan per block on the (block, timestamp) index; comparing in
+    # Python is cheaper than binding every timestamp of the batch
+    stored = set()
+    for block_id, (first, last) in spans.items():
+        stored.update(SensorData.objects.filter(
+            block_id=block_id, timestamp__gte=first, timestamp__lte=last,
+        ).values_list('block_id', 'timestamp'))
+    return stored
+
+
+def dedupe(accepted, statuses):
+    """Mark duplicates in ``statuses``; returns the readings to write."""
+    stored = _stored_timestamps(accepted)
+    seen = set()
+    seen_keys = set()
+    fresh = []
+    for index, block, timestamp, data, key in accepted:
+        identity = (block.id, timestamp)
+        keyed = (block.id, key) if key is not None else None
+        if identity in stored or identity in seen or (keyed is not None and (keyed in seen_keys or keyed in recent_keys)):
+            statuses[index] = {"index": index, "status": "duplicate"}
+            continue
+        seen.add(identity)
+        if keyed is not None:
+            seen_keys.add(keyed)
+        fresh.append((index, block, timestamp, data, key))
+    return fresh
+
+
+def write_readings(readings, source="ingest"):
+    """
+    Store ``(block, timestamp, data)`` readings and run the write-path rules
+    on them. Returns the number of alerts raised.
+    """
+    if not readings:
+        return 0
+    # Anomaly detection expects each block's readings in time order
+    readings = sorted(readings, key=lambda reading: reading[1])
+
+    started = time.perf_counter()
+    rows = []
+    alerts = {}
+    anomalies = []
+    params = anomaly.detection_params()
+    for block, timestamp, data in readings:
+        rows.append(SensorData(user_id=block.user_id, block_id=block.id, timestamp=timestamp, **data))
+        for alert_type, message in threshold_alerts(data):
+            alerts.setdefault((block.id, alert_type), Alert(
+                user_id=block.user_id, block_id=block.id, timestamp=timestamp,
+                alert_type=alert_type, message=message,
+            ))
+        anomalies.extend(anomaly.detect(block, timestamp, data, params))
+
+    with transaction.atomic():
+        SensorData.objects.bulk_create(rows, batch_size=INGEST_BATCH_SIZE)
+        Alert.objects.bulk_create([*alerts.values(), *anomalies], batch_size=INGEST_BATCH_SIZE)
+        notifications.enqueue([*alerts.values(), *anomalies])
+    event_log.publish_readings((block.id, block.user_id, timestamp, data) for block, timestamp, data in readings)
+    event_log.publish_alerts([*alerts.values(), *anomalies])
+    metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation=source)
+    metrics.READINGS_WRITTEN.inc(len(rows), source=source)
+    for _, alert_type in alerts:
+        metrics.ALERTS_RAISED.inc(alert_type=alert_type)
+    if anomalies:
+        metrics.ALERTS_RAISED.inc(len(anomalies), alert_type=anomaly.ANOMALY_ALERT_TYPE)
+
+    for user_id in {block.user_id for block, _, _ in readings}:
+        deleted = SensorData.cleanup_old_data(user_id, days=30)
+        if deleted:
+            metrics.RETENTION_ROWS_DELETED.inc(deleted)
+
+    for block, timestamp, data in readings:
+        online_stats.record_reading(block.id, timestamp, data)
+        sketches.record_reading(block.id, timestamp, data)
+    # Gateways may deliver readings older than what a cached window holds
+    oldest = {}
+    for block, timestamp, _ in reversed(readings):
+        oldest[block.id] = timestamp
+    for block_id, timestamp in oldest.items():
+        history_cache.invalidate(block_id, since=timestamp)
+    return len(alerts) + len(anomalies)
+
+
+def ingest(user, items):
+    """
+    Validate, dedupe and store a parsed batch for ``user``.
+
+    Returns:
+        dict: {"created", "duplicates", "rejected", "alerts", "items"} where
+        ``items`` holds a {"index", "status"[, "errors"]} dict per item.
+    """
+    statuses, accepted = validate_batch(user, items)
+    fresh = dedupe(accepted, statuses)
+
+    alerts = write_readings([(block, timestamp, data) for _, block, timestamp, data, _ in fresh])
+    recent_keys.add_all((block.id, key) for _, block, _, _, key in fresh if key is not None)
+    for index, *_ in fresh:
+        statuses[index] = {"index": index, "status": "created"}
+
+    counts = {"created": 0, "duplicate": 0, "rejected": 0}
+    for status in statuses:
+        counts[status["status"]] += 1
+    return {
+        "created": counts["created"],
+        "duplicates": counts["duplicate"],
+        "rejected": counts["rejected"],
+        "alerts": alerts,
+        "items": statuses,
+    }
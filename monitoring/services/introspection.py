@@ -0,0 +1,142 @@
+# monitoring/services/introspection.py
+"""
+On-demand runtime introspection for block simulator threads.
+
+- ``simulator_report``: state, tick timings and error counts for every
+  simulator in ``running_simulators``, plus memory attributed to simulator
+  code through ``tracemalloc`` when tracing is on.
+- ``sample_simulator_stacks``: time-boxed sampling profiler over the
+  simulator threads, returning collapsed stacks (``frame;frame;frame count``)
+  that flamegraph.pl / speedscope read directly.
+"""
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from .block_simulator import LazyBlockSimulator, running_simulators
+
+# Source files whose allocations count as "simulator memory"
+SIMULATOR_SOURCES = ("block_simulator.py", "simulator_core.py")
+
+MAX_PROFILE_SECONDS = 30.0
+MIN_PROFILE_INTERVAL = 0.001
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def _simulators():
+    return running_simulators.items()
+
+
+def start_memory_tracing(frames=10):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_memory_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def simulator_memory(top=10):
+    """
+    Memory currently allocated from simulator source files, from a
+    tracemalloc snapshot. Returns None when tracemalloc is not tracing.
+    """
+    if not tracemalloc.is_tracing():
+        return None
+
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(True, f"*{os.sep}{name}") for name in SIMULATOR_SOURCES
+    ])
+    stats = snapshot.statistics("lineno")
+    return {
+        "total_bytes": sum(stat.size for stat in stats),
+        "top_sites": [{
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "blocks": stat.count,
+        } for stat in stats[:top]],
+    }
+
+
+def simulator_report():
+    """State and tick statistics for every registered simulator."""
+    simulators = []
+    for block_key, sim in _simulators():
+        durations = sorted(sim.tick_durations)
+        simulators.append({
+            "block_id": int(block_key),
+            "block_name": sim.block.name,
+            "mode": "lazy" if isinstance(sim, LazyBlockSimulator) else "thread",
+            "alive": sim.is_alive(),
+            "thread": {
+                "name": sim.thread.name,
+                "ident": sim.thread.ident,
+                "alive": sim.thread.is_alive(),
+                "stopping": sim._stop.is_set(),
+            },
+            "interval": sim.interval,
+            "started_at": sim.started_at,
+            "last_tick_at": sim.last_tick_at,
+            "ticks": sim.tick_count,
+            "errors": sim.error_count,
+            "tick_avg_ms": sum(durations) / len(durations) * 1000 if durations else None,
+            "tick_p99_ms": _percentile(durations, 0.99) * 1000 if durations else None,
+        })
+
+    return {
+        "simulators": simulators,
+        "threads_total": threading.active_count(),
+        "tracemalloc": tracemalloc.is_tracing(),
+        "memory": simulator_memory(),
+    }
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_simulator_stacks(seconds=5.0, interval=0.005):
+    """
+    Sample the stacks of all simulator threads for ``seconds`` (capped at
+    MAX_PROFILE_SECONDS) every ``interval`` seconds (at least
+    MIN_PROFILE_INTERVAL, at most the whole run).
+
+    Returns:
+        str: collapsed stacks, one ``thread;outer;...;inner count`` per line.
+
+    Raises:
+        ValueError: ``seconds`` or ``interval`` is not a finite number.
+    """
+    if not (math.isfinite(seconds) and math.isfinite(interval)):
+        raise ValueError("seconds and interval must be finite")
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    interval = min(max(interval, MIN_PROFILE_INTERVAL), max(seconds, MIN_PROFILE_INTERVAL))
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        threads = {sim.thread.ident: sim.thread.name for _, sim in _simulators() if sim.thread.ident}
+        frames = sys._current_frames()
+        for ident, name in threads.items():
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                samples[";".join([name] + stack[::-1])] += 1
+        del frames
+        time.sleep(interval)
+
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
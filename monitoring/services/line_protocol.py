@@ -0,0 +1,324 @@
+# monitoring/services/line_protocol.py
+"""
+Line-protocol ingest over UDP and TCP for gateways on the farm LAN.
+
+One reading per line, fields separated by whitespace:
+
+    <block_id> <ts> <temperature> <humidity> <ammonia> <feed> <water> <activity>
+
+``ts`` is epoch seconds, or ``-`` for the time of arrival. A UDP datagram
+may carry several lines; a TCP connection is a stream of lines.
+
+Lines are parsed on the event loop straight from the received bytes and
+queued as small tuples. A ``BatchWriter`` thread drains the queue into
+batches of up to ``LINE_INGEST_BATCH_SIZE`` readings or
+``LINE_INGEST_FLUSH_INTERVAL`` seconds and stores them through the bulk
+ingest write path (alerts, anomalies, statistics included), so the event
+loop never waits on the database.
+
+Only known gateways may write: ``LINE_INGEST_GATEWAYS`` maps a source
+address to the username whose blocks it reports, e.g.
+``{"192.168.1.20": "farmer"}``. Lines from other addresses are counted as
+``unauthorized``, lines for blocks of another user as ``forbidden``.
+
+There is no acknowledgement: what cannot be used is counted in
+``IngestStats`` and dropped. ``late`` readings are older than
+``LINE_INGEST_MAX_LATENESS`` seconds, ``dropped`` ones arrived while the
+queue was full and ``write_errors`` could not be stored.
+"""
+import asyncio
+import logging
+import math
+import queue
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+
+from django.contrib.auth.models import User
+
+from flock.models import FlockBlock
+from . import ingest
+from .history_codec import HISTORY_METRICS
+
+logger = logging.getLogger("monitoring.line_protocol")
+
+FIELD_COUNT = 2 + len(HISTORY_METRICS)
+
+# parse_line result for a reading older than the allowed lateness
+LATE = "late"
+
+# Seconds a block id that does not exist is remembered as unknown
+UNKNOWN_BLOCK_TTL = 60.0
+
+# Longest TCP line kept in the buffer before the connection is dropped
+MAX_LINE_BYTES = 4096
+
+_RANGES = tuple(ingest.VALUE_RANGES[metric] for metric in HISTORY_METRICS)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class IngestStats:
+    """Counters of what happened to the received lines."""
+    FIELDS = (
+        "received", "queued", "written", "malformed", "late", "dropped",
+        "unauthorized", "unknown_block", "forbidden", "write_errors", "batches",
+    )
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def snapshot(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def gateway_users(gateways):
+    """
+    ``{address: user id}`` for a ``{address: username}`` mapping (default:
+    LINE_INGEST_GATEWAYS). Raises ValueError for unknown usernames.
+    """
+    if gateways is None:
+        gateways = _setting("LINE_INGEST_GATEWAYS", {})
+    ids = dict(User.objects.filter(username__in=set(gateways.values())).values_list("username", "id"))
+    unknown = sorted(set(gateways.values()) - set(ids))
+    if unknown:
+        raise ValueError(f"Unknown gateway users: {', '.join(unknown)}")
+    return {address: ids[username] for address, username in gateways.items()}
+
+
+def parse_line(line, now, max_lateness, max_skew):
+    """
+    ``(block_id, epoch, values)`` for one line, LATE for a reading older
+    than ``max_lateness`` seconds, or None when the line is malformed.
+    """
+    fields = line.split()
+    if len(fields) != FIELD_COUNT:
+        return None
+    try:
+        block_id = int(fields[0])
+        epoch = now if fields[1] == b"-" else float(fields[1])
+        values = tuple(map(float, fields[2:]))
+    except ValueError:
+        return None
+    if not math.isfinite(epoch) or epoch > now + max_skew:
+        return None
+    for value, (low, high) in zip(values, _RANGES):
+        # Also rejects NaN
+        if not low <= value <= high:
+            return None
+    if epoch < now - max_lateness:
+        return LATE
+    return block_id, epoch, values
+
+
+class BatchWriter:
+    """Thread that writes queued readings in time- and size-bounded batches."""
+
+    def __init__(self, stats, batch_size=None, flush_interval=None, max_queue=None):
+        self.stats = stats
+        self.batch_size = batch_size or _setting("LINE_INGEST_BATCH_SIZE", 5000)
+        self.flush_interval = flush_interval or _setting("LINE_INGEST_FLUSH_INTERVAL", 1.0)
+        self.queue = queue.Queue(max_queue or _setting("LINE_INGEST_MAX_QUEUE", 100_000))
+        self._blocks = {}
+        self._unknown = {}   # block_id -> monotonic time it was looked up
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Line-Ingest-Writer")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Write what is queued, then stop."""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def put(self, reading):
+        """
+        Queue a parsed reading with the id of the gateway's user; called
+        from the event loop, never blocks.
+        """
+        try:
+            self.queue.put_nowait(reading)
+        except queue.Full:
+            self.stats.dropped += 1
+        else:
+            self.stats.queued += 1
+
+    def _resolve(self, block_ids):
+        now = time.monotonic()
+        missing = [
+            block_id for block_id in block_ids
+            if block_id not in self._blocks and now - self._unknown.get(block_id, -UNKNOWN_BLOCK_TTL) >= UNKNOWN_BLOCK_TTL
+        ]
+        if missing:
+            found = FlockBlock.objects.filter(id__in=missing).only('id', 'user_id')
+            self._blocks.update((block.id, block) for block in found)
+            for block_id in missing:
+                if block_id not in self._blocks:
+                    self._unknown[block_id] = now
+
+    def flush(self, batch):
+        if not batch:
+            return
+        try:
+            self._resolve({block_id for block_id, _, _, _ in batch})
+        except Exception:
+            logger.exception("Failed to look up the blocks of %d line-protocol readings", len(batch))
+            self.stats.write_errors += len(batch)
+            return
+
+        readings = []
+        for block_id, epoch, values, user_id in batch:
+            block = self._blocks.get(block_id)
+            if block is None:
+                self.stats.unknown_block += 1
+                continue
+            if block.user_id != user_id:
+                self.stats.forbidden += 1
+                continue
+            readings.append((
+                block,
+                datetime.fromtimestamp(epoch, tz=dt_timezone.utc),
+                dict(zip(HISTORY_METRICS, values)),
+            ))
+        if not readings:
+            return
+
+        try:
+            ingest.write_readings(readings, source="line_protocol")
+        except Exception:
+            logger.exception("Failed to write %d line-protocol readings; retrying one by one", len(readings))
+            # Blocks may have been deleted meanwhile
+            self._blocks.clear()
+            for reading in readings:
+                try:
+                    ingest.write_readings([reading], source="line_protocol")
+                except Exception:
+                    self.stats.write_errors += 1
+                else:
+                    self.stats.written += 1
+        else:
+            self.stats.written += len(readings)
+        self.stats.batches += 1
+
+    def _run(self):
+        try:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while not (self._stopping.is_set() and self.queue.empty()):
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    pass
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self.flush(batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+            self.flush(batch)
+        finally:
+            connection.close()
+
+
+class _LineHandler:
+    def __init__(self, writer, stats, gateways):
+        self.writer = writer
+        self.stats = stats
+        self.gateways = gateways
+        self.max_lateness = _setting("LINE_INGEST_MAX_LATENESS", 300.0)
+        self.max_skew = _setting("INGEST_MAX_CLOCK_SKEW", 300)
+
+    def handle(self, lines, address):
+        now = time.time()
+        user_id = self.gateways.get(address[0]) if address else None
+        for line in lines:
+            if not line or line.isspace():
+                continue
+            self.stats.received += 1
+            if user_id is None:
+                self.stats.unauthorized += 1
+                continue
+            reading = parse_line(line, now, self.max_lateness, self.max_skew)
+            if reading is None:
+                self.stats.malformed += 1
+            elif reading is LATE:
+                self.stats.late += 1
+            else:
+                self.writer.put((*reading, user_id))
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        self.handler.handle(data.split(b"\n"), addr)
+
+
+class _StreamProtocol(asyncio.Protocol):
+    def __init__(self, handler):
+        self.handler = handler
+        self.buffer = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info("peername")
+
+    def data_received(self, data):
+        data = self.buffer + data if self.buffer else data
+        lines = data.split(b"\n")
+        self.buffer = lines.pop()
+        if len(self.buffer) > MAX_LINE_BYTES:
+            self.handler.stats.malformed += 1
+            self.transport.close()
+            return
+        self.handler.handle(lines, self.address)
+
+    def eof_received(self):
+        if self.buffer:
+            self.handler.handle([self.buffer], self.address)
+            self.buffer = b""
+
+
+class LineProtocolServer:
+    """
+    UDP and/or TCP listeners feeding one BatchWriter. ``gateways`` maps
+    source addresses to user ids (see ``gateway_users``).
+    """
+
+    def __init__(self, host="127.0.0.1", udp_port=None, tcp_port=None, writer=None, gateways=None):
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.stats = writer.stats if writer is not None else IngestStats()
+        self.writer = writer or BatchWriter(self.stats)
+        self._handler = _LineHandler(self.writer, self.stats, gateways or {})
+        self._transport = None
+        self._server = None
+
+    async def start(self):
+        """Bind the listeners (port 0 picks a free one) and start the writer."""
+        loop = asyncio.get_running_loop()
+        self.writer.start()
+        if self.udp_port is not None:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self._handler), local_addr=(self.host, self.udp_port),
+            )
+            self.udp_port = self._transport.get_extra_info("sockname")[1]
+        if self.tcp_port is not None:
+            self._server = await loop.create_server(lambda: _StreamProtocol(self._handler), self.host, self.tcp_port)
+            self.tcp_port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening, then write what is still queued."""
+        if self._transport is not None:
+            self._transport.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(None, self.writer.stop)
@@ -0,0 +1,398 @@
+# monitoring/services/metrics.py
+"""
+Minimal Prometheus-style metrics (counters, gauges, histograms).
+
+Instrumentation is cheap on hot loops such as ``BlockSimulatorThread.run``:
+every thread updates its own shard (a plain dict held in thread-local
+storage) without taking a lock. Shards are only read and summed when
+``/metrics`` is scraped. Shards of finished threads are folded into a
+retired total, on scrape and every ``PRUNE_EVERY`` new shards, so they do
+not pile up in processes that start a thread per request and are never
+scraped.
+
+Multiple worker processes: when ``METRICS_DIR`` is set, each process writes
+a snapshot of its values to ``METRICS_DIR/<pid>.json`` every
+``METRICS_FLUSH_INTERVAL`` seconds, and a scrape of any worker merges all
+snapshots. Counters and histograms of exited processes are kept (they are
+cumulative): the flush folds their snapshots into ``retired.json`` and
+deletes them. Gauges are only taken from live processes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are not folded
+    fcntl = None
+
+logger = logging.getLogger("monitoring.metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# New shards between two folds of the finished threads' shards
+PRUNE_EVERY = 64
+
+# Snapshot of the counters and histograms of exited processes in METRICS_DIR
+RETIRED_SNAPSHOT = "retired.json"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []   # (thread, dict)
+        self._retired = {}
+        self._prune_at = PRUNE_EVERY
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+                if len(self._shards) >= self._prune_at:
+                    self._prune()
+                    self._prune_at = len(self._shards) + PRUNE_EVERY
+            REGISTRY.ensure_flusher()
+            return values
+
+    def _prune(self):
+        """Fold the shards of finished threads into the retired total (under ``_lock``)."""
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self._merge(self._retired, values.copy())
+        self._shards = live
+
+    def collect(self):
+        """Sum all thread shards. Returns {label values tuple: value}."""
+        with self._lock:
+            self._prune()
+            total = {}
+            self._merge(total, self._retired)
+            for _, values in self._shards:
+                self._merge(total, values.copy())
+        return total
+
+    @staticmethod
+    def _merge(into, values):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(into, values):
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [count per bucket (+Inf last), sum, count]
+            state = shard[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @staticmethod
+    def _merge(into, values):
+        for key, (counts, total, count) in values.items():
+            current = into.get(key)
+            if current is None:
+                into[key] = [list(counts), total, count]
+            else:
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += total
+                current[2] += count
+
+
+class Gauge(_Metric):
+    """Gauge whose value is computed at scrape time by ``func``."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, func):
+        self.func = func
+        super().__init__(name, documentation)
+
+    def collect(self):
+        try:
+            return {(): float(self.func())}
+        except Exception:
+            logger.exception("Gauge %s failed", self.name)
+            return {}
+
+    @staticmethod
+    def _merge(into, values):
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    # -- multi-process snapshots -------------------------------------------
+    @property
+    def directory(self):
+        path = getattr(settings, "METRICS_DIR", None)
+        return Path(path) if path else None
+
+    def ensure_flusher(self):
+        if self._flusher is not None or self.directory is None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="Metrics-Flush")
+                self._flusher.start()
+
+    def _flush_loop(self):
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5.0)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Metrics flush failed")
+
+    def snapshot(self):
+        return {
+            metric.name: [[list(key), value] for key, value in metric.collect().items()]
+            for metric in self.metrics
+        }
+
+    @staticmethod
+    def _write(path, snapshot):
+        tmp = path.parent / f"{path.name}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(snapshot))
+        os.replace(tmp, path)
+
+    def _directory_lock(self, directory, mode):
+        """Open lock file of METRICS_DIR, locked with ``mode`` (None without fcntl)."""
+        if fcntl is None:
+            return None
+        lock = open(directory / "LOCK", "a")
+        fcntl.flock(lock, mode)
+        return lock
+
+    def flush(self):
+        """Write this process's values to METRICS_DIR/<pid>.json and retire exited processes."""
+        directory = self.directory
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        self._write(directory / f"{os.getpid()}.json", self.snapshot())
+        self.retire_exited(directory)
+
+    def retire_exited(self, directory):
+        """
+        Fold the counters and histograms of exited processes into
+        RETIRED_SNAPSHOT and delete their snapshots.
+        """
+        if fcntl is None:
+            return
+        lock = self._directory_lock(directory, fcntl.LOCK_EX)
+        try:
+            exited = [
+                path for path in directory.glob("*.json")
+                if path.stem.isdigit() and not pid_alive(int(path.stem))
+            ]
+            if not exited:
+                return
+            retired_path = directory / RETIRED_SNAPSHOT
+            retired = json.loads(retired_path.read_text()) if retired_path.exists() else {}
+            for path in exited:
+                try:
+                    snapshot = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    snapshot = {}
+                for metric in self.metrics:
+                    if metric.kind == "gauge" or metric.name not in snapshot:
+                        continue
+                    values = {tuple(k): v for k, v in retired.get(metric.name, [])}
+                    metric._merge(values, {tuple(k): v for k, v in snapshot[metric.name]})
+                    retired[metric.name] = [[list(k), v] for k, v in values.items()]
+            self._write(retired_path, retired)
+            for path in exited:
+                path.unlink(missing_ok=True)
+        finally:
+            lock.close()
+
+    def _other_processes(self):
+        directory = self.directory
+        if directory is None or not directory.exists():
+            return []
+        lock = self._directory_lock(directory, fcntl.LOCK_SH if fcntl else None)
+        try:
+            snapshots = []
+            for path in directory.glob("*.json"):
+                if path.name == RETIRED_SNAPSHOT:
+                    alive = False
+                elif path.stem.isdigit() and int(path.stem) != os.getpid():
+                    alive = pid_alive(int(path.stem))
+                else:
+                    continue
+                try:
+                    snapshots.append((alive, json.loads(path.read_text())))
+                except (OSError, ValueError):
+                    continue
+            return snapshots
+        finally:
+            if lock is not None:
+                lock.close()
+
+    # -- exposition ----------------------------------------------------------
+    def render(self):
+        """Text exposition format (version 0.0.4) merged across processes."""
+        others = self._other_processes()
+        lines = []
+        for metric in self.metrics:
+            values = metric.collect()
+            for alive, snapshot in others:
+                if metric.kind == "gauge" and not alive:
+                    continue
+                metric._merge(values, {tuple(k): v for k, v in snapshot.get(metric.name, [])})
+
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(values.items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "histogram":
+                    lines.extend(_render_histogram(metric, labels, value))
+                else:
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_start_time(pid):
+    """
+    Start time of ``pid`` in clock ticks since boot, which tells a reused pid
+    from the process that had it before; None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The fields after the ")" closing the command name start at field 3
+    return int(stat.rpartition(b")")[2].split()[19])
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(metric, labels, state):
+    counts, total, count = state
+    cumulative = 0
+    for bound, bucket_count in zip(metric.buckets + (float("inf"),), counts):
+        cumulative += bucket_count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        yield f"{metric.name}_bucket{_labels(labels + [('le', le)])} {cumulative}"
+    yield f"{metric.name}_sum{_labels(labels)} {_number(total)}"
+    yield f"{metric.name}_count{_labels(labels)} {count}"
+
+
+REGISTRY = Registry()
+
+
+def _running_simulators():
+    from monitoring.services.block_simulator import running_simulators
+    return sum(1 for sim in running_simulators.values() if sim.is_alive())
+
+
+# -----------------------------
+# Application metrics
+# -----------------------------
+SIMULATORS_RUNNING = Gauge(
+    "poultry_simulators_running", "Block simulators currently running.", _running_simulators,
+)
+TICK_DURATION = Histogram(
+    "poultry_simulator_tick_seconds", "Time spent in one simulator tick.",
+)
+TICK_LAG = Histogram(
+    "poultry_simulator_tick_lag_seconds", "How late a simulator tick started compared to its schedule.",
+)
+READINGS_WRITTEN = Counter(
+    "poultry_readings_written_total", "Sensor readings written.", ["source"],
+)
+ALERTS_RAISED = Counter(
+    "poultry_alerts_raised_total", "Alerts raised.", ["alert_type"],
+)
+DB_WRITE_DURATION = Histogram(
+    "poultry_db_write_seconds", "Latency of database writes on the ingest path.", ["operation"],
+)
+RETENTION_ROWS_DELETED = Counter(
+    "poultry_retention_rows_deleted_total", "Sensor readings deleted by retention cleanup.",
+)
+REQUEST_DURATION = Histogram(
+    "poultry_http_request_seconds", "Request latency per view.", ["view"],
+)
+NOTIFICATIONS_DELIVERED = Counter(
+    "poultry_notifications_delivered_total", "Alert notification messages delivered.", ["channel"],
+)
+NOTIFICATIONS_FAILED = Counter(
+    "poultry_notifications_failed_total", "Failed alert notification delivery attempts.", ["channel"],
+)
@@ -0,0 +1,405 @@
+# monitoring/services/notifications.py
+"""
+Alert notifications through a transactional outbox.
+
+Whoever inserts alerts calls ``enqueue(alerts)`` inside the same
+transaction, which adds one AlertNotification row per alert and configured
+channel: a notification exists exactly when its alert was committed, and
+no network call happens on the write path (the simulator tick only pays
+for one more INSERT).
+
+A ``NotificationDispatcher`` delivers the outbox in the background:
+
+- Due rows are claimed with an UPDATE conditioned on their status and
+  ``next_attempt_at``, so several dispatchers (web workers, the
+  ``dispatch_notifications`` command) can share one outbox.
+- The claimed rows of a user are coalesced into one message per channel,
+  and a user gets at most one message per channel every
+  ``ALERT_NOTIFY_MIN_INTERVAL`` seconds; alerts raised in between wait and
+  are sent together in the next one. Each channel also sends at most
+  ``ALERT_NOTIFY_MAX_PER_SECOND`` messages per second (per process).
+- Failed deliveries are retried with exponential backoff and jitter, and
+  given up after ``ALERT_DISPATCH_MAX_ATTEMPTS`` attempts.
+- Finished rows (sent, failed, skipped) are deleted after
+  ``ALERT_NOTIFICATION_RETENTION_DAYS`` days.
+
+Channels are configured like Django's CACHES:
+
+    ALERT_NOTIFICATION_CHANNELS = {
+        "email": {"BACKEND": "monitoring.services.notifications.EmailChannel"},
+        "webhook": {"BACKEND": "monitoring.services.notifications.WebhookChannel",
+                    "URL": "http://127.0.0.1:9000/alerts"},
+    }
+
+A channel class takes ``(name, options)`` and implements ``address(user)``
+(None when the user cannot be reached on it) and ``send(user, alerts)``,
+which raises on failure.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from monitoring.models import Alert, AlertNotification
+from . import metrics
+
+logger = logging.getLogger("monitoring.notifications")
+
+# Seconds a claimed row is held before another dispatcher may retry it
+CLAIM_LEASE = 300
+
+# Seconds between two prunes of finished outbox rows by a dispatcher loop
+PRUNE_INTERVAL = 3600
+
+# Fields that tell an inserted alert apart when bulk_create left its pk unset
+ALERT_IDENTITY = ("block_id", "timestamp", "alert_type", "message")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting("ALERT_NOTIFICATIONS_ENABLED", True)
+
+
+def channel_names():
+    return list(_setting("ALERT_NOTIFICATION_CHANNELS", {}))
+
+
+def render_message(user, alerts):
+    """Subject and body of one message covering ``alerts`` (oldest first)."""
+    alerts = sorted(alerts, key=lambda alert: alert.timestamp)
+    if len(alerts) == 1:
+        subject = f"[Poultry Monitoring] {alerts[0].alert_type} in {alerts[0].block.name}"
+    else:
+        blocks = sorted({alert.block.name for alert in alerts})
+        subject = f"[Poultry Monitoring] {len(alerts)} new alerts in {', '.join(blocks)}"
+    lines = [f"Hello {user.get_username()},", "", "New alerts on your farm:", ""]
+    for alert in alerts:
+        local = timezone.localtime(alert.timestamp)
+        lines.append(f"- {local:%Y-%m-%d %H:%M:%S} {alert.block.name}: {alert.message}")
+    return subject, "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Channels
+# -----------------------------
+class EmailChannel:
+    """
+    Mail through a Django email backend: ``EMAIL_BACKEND`` (default: the
+    project's) plus backend options such as ``FILE_PATH`` for the file
+    backend. ``FROM_EMAIL`` defaults to DEFAULT_FROM_EMAIL.
+    """
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+
+    def connection(self):
+        kwargs = {}
+        if self.options.get("FILE_PATH"):
+            kwargs["file_path"] = str(self.options["FILE_PATH"])
+        return get_connection(self.options.get("EMAIL_BACKEND"), fail_silently=False, **kwargs)
+
+    def address(self, user):
+        return user.email or None
+
+    def send(self, user, alerts):
+        subject, body = render_message(user, alerts)
+        from_email = self.options.get("FROM_EMAIL", settings.DEFAULT_FROM_EMAIL)
+        EmailMessage(subject, body, from_email, [user.email], connection=self.connection()).send()
+
+
+class WebhookChannel:
+    """POSTs a JSON digest to ``URL``; any non-2xx answer is a failure."""
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+
+    def address(self, user):
+        return self.options["URL"]
+
+    def payload(self, user, alerts):
+        return {
+            "user": user.get_username(),
+            "alerts": [
+                {
+                    "id": alert.pk,
+                    "block": alert.block_id,
+                    "block_name": alert.block.name,
+                    "timestamp": alert.timestamp.isoformat(),
+                    "alert_type": alert.alert_type,
+                    "message": alert.message,
+                }
+                for alert in sorted(alerts, key=lambda alert: alert.timestamp)
+            ],
+        }
+
+    def send(self, user, alerts):
+        request = urllib.request.Request(
+            self.options["URL"],
+            data=json.dumps(self.payload(user, alerts)).encode(),
+            headers={"Content-Type": "application/json", **self.options.get("HEADERS", {})},
+            method="POST",
+        )
+        # urlopen raises HTTPError for 4xx/5xx answers
+        with urllib.request.urlopen(request, timeout=self.options.get("TIMEOUT", 5)) as response:
+            response.read()
+
+
+# -----------------------------
+# Outbox
+# -----------------------------
+def _find_primary_keys(alerts):
+    """
+    Set the primary keys of just inserted ``alerts`` that bulk_create left
+    unset (it only sets them on backends that return them, not on MySQL).
+    Identical alerts are matched by insertion order: the ones inserted last
+    have the highest ids.
+    """
+    wanted = defaultdict(list)
+    for alert in alerts:
+        wanted[tuple(getattr(alert, field) for field in ALERT_IDENTITY)].append(alert)
+    timestamps = [alert.timestamp for alert in alerts]
+    stored = defaultdict(list)
+    rows = Alert.objects.filter(
+        block_id__in={alert.block_id for alert in alerts},
+        timestamp__gte=min(timestamps), timestamp__lte=max(timestamps),
+    ).order_by("id").values_list("id", *ALERT_IDENTITY)
+    for pk, *identity in rows:
+        stored[tuple(identity)].append(pk)
+    for identity, group in wanted.items():
+        ids = stored.get(identity, [])
+        if len(ids) < len(group):
+            continue
+        for alert, pk in zip(group, ids[-len(group):]):
+            alert.pk = pk
+            alert._state.adding = False
+
+
+def enqueue(alerts):
+    """
+    Add outbox rows for saved ``alerts``; call it inside the transaction
+    that inserted them. Returns the number of rows added.
+    """
+    if not enabled():
+        return 0
+    names = channel_names()
+    if not names or not alerts:
+        return 0
+    unsaved = [alert for alert in alerts if alert.pk is None]
+    if unsaved:
+        _find_primary_keys(unsaved)
+    saved = [alert for alert in alerts if alert.pk is not None]
+    if len(saved) < len(alerts):
+        logger.warning("Not notifying %d alerts that were not found after insert", len(alerts) - len(saved))
+    rows = [
+        AlertNotification(alert=alert, user_id=alert.user_id, channel=name)
+        for alert in saved
+        for name in names
+    ]
+    AlertNotification.objects.bulk_create(rows)
+    transaction.on_commit(dispatcher.ensure_started)
+    return len(rows)
+
+
+def prune(days=None):
+    """Delete sent, failed and skipped outbox rows older than ``days``; returns how many."""
+    if days is None:
+        days = _setting("ALERT_NOTIFICATION_RETENTION_DAYS", 30)
+    deleted, _ = AlertNotification.objects.filter(
+        status__in=[AlertNotification.SENT, AlertNotification.FAILED, AlertNotification.SKIPPED],
+        created_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+class _TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class NotificationDispatcher:
+    """Delivers the outbox; ``dispatch_once`` does one pass, ``start`` loops in a thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._channels = None
+        self._buckets = {}
+        self._last_prune = 0.0
+
+    def channels(self):
+        if self._channels is None:
+            configured = _setting("ALERT_NOTIFICATION_CHANNELS", {})
+            self._channels = {
+                name: import_string(options["BACKEND"])(name, options)
+                for name, options in configured.items()
+            }
+        return self._channels
+
+    def reset(self):
+        """Forget the channel instances and rate limits (after settings changes)."""
+        with self._lock:
+            self._channels = None
+            self._buckets = {}
+
+    def _rate_limited(self, channel):
+        rate = _setting("ALERT_NOTIFY_MAX_PER_SECOND", 10)
+        bucket = self._buckets.setdefault(channel, _TokenBucket(rate))
+        return not bucket.take()
+
+    @staticmethod
+    def backoff(attempt):
+        """Seconds before retry ``attempt`` (1-based), with jitter."""
+        base = _setting("ALERT_DISPATCH_RETRY_BASE", 5.0)
+        cap = _setting("ALERT_DISPATCH_RETRY_MAX", 900.0)
+        return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def _claim(self, now):
+        batch = _setting("ALERT_DISPATCH_BATCH", 500)
+        due = AlertNotification.objects.filter(status=AlertNotification.PENDING, next_attempt_at__lte=now)
+        ids = list(due.order_by("next_attempt_at").values_list("id", flat=True)[:batch])
+        if not ids:
+            return []
+        claim = uuid.uuid4().hex
+        due.filter(pk__in=ids).update(claim=claim, next_attempt_at=now + timedelta(seconds=CLAIM_LEASE))
+        return list(AlertNotification.objects.filter(claim=claim).select_related("alert__block", "user"))
+
+    def dispatch_once(self, now=None):
+        """
+        Deliver the due outbox rows; returns counts of messages sent,
+        alerts they covered, failed and skipped rows and deferred rows.
+        """
+        now = now or timezone.now()
+        counts = {"messages": 0, "alerts": 0, "failed": 0, "skipped": 0, "deferred": 0}
+        rows = self._claim(now)
+        if not rows:
+            return counts
+
+        groups = defaultdict(list)
+        for row in rows:
+            groups[(row.user_id, row.channel)].append(row)
+        last_sent = {
+            (entry["user_id"], entry["channel"]): entry["last"]
+            for entry in AlertNotification.objects
+            .filter(user_id__in={row.user_id for row in rows}, status=AlertNotification.SENT)
+            .values("user_id", "channel")
+            .annotate(last=Max("sent_at"))
+        }
+        min_interval = timedelta(seconds=_setting("ALERT_NOTIFY_MIN_INTERVAL", 60))
+        channels = self.channels()
+
+        for (user_id, name), group in groups.items():
+            ids = [row.pk for row in group]
+            outbox = AlertNotification.objects.filter(pk__in=ids)
+            channel = channels.get(name)
+            user = group[0].user
+            if channel is None or not channel.address(user):
+                reason = "channel not configured" if channel is None else "no address for user"
+                outbox.update(status=AlertNotification.SKIPPED, claim="", last_error=reason)
+                counts["skipped"] += len(ids)
+                continue
+
+            # Too soon for this user, or the channel is busy: the rows wait
+            # and are coalesced with whatever arrives meanwhile
+            last = last_sent.get((user_id, name))
+            if last is not None and last + min_interval > now:
+                outbox.update(claim="", next_attempt_at=last + min_interval)
+                counts["deferred"] += len(ids)
+                continue
+            if self._rate_limited(name):
+                outbox.update(claim="", next_attempt_at=now + timedelta(seconds=1))
+                counts["deferred"] += len(ids)
+                continue
+
+            try:
+                channel.send(user, [row.alert for row in group])
+            except Exception as exc:
+                metrics.NOTIFICATIONS_FAILED.inc(channel=name)
+                attempt = max(row.attempts for row in group) + 1
+                error = f"{type(exc).__name__}: {exc}"
+                if attempt >= _setting("ALERT_DISPATCH_MAX_ATTEMPTS", 8):
+                    logger.warning("Giving up on %d %s notifications for user %s: %s", len(ids), name, user_id, error)
+                    outbox.update(status=AlertNotification.FAILED, claim="", attempts=F("attempts") + 1, last_error=error)
+                    counts["failed"] += len(ids)
+                else:
+                    logger.info("Delivery of %d %s notifications for user %s failed: %s", len(ids), name, user_id, error)
+                    outbox.update(
+                        claim="", attempts=F("attempts") + 1, last_error=error,
+                        next_attempt_at=now + timedelta(seconds=self.backoff(attempt)),
+                    )
+                continue
+
+            outbox.update(
+                status=AlertNotification.SENT, claim="", attempts=F("attempts") + 1,
+                last_error="", sent_at=timezone.now(),
+            )
+            metrics.NOTIFICATIONS_DELIVERED.inc(channel=name)
+            counts["messages"] += 1
+            counts["alerts"] += len(ids)
+        return counts
+
+    def run(self, interval=None, stop=None):
+        """
+        Dispatch every ``interval`` seconds until ``stop`` (a threading.Event)
+        is set, and prune finished rows every PRUNE_INTERVAL seconds.
+        """
+        stop = stop or self._stop
+        interval = interval or _setting("ALERT_DISPATCH_INTERVAL", 2.0)
+        try:
+            while not stop.wait(interval):
+                try:
+                    self.dispatch_once()
+                except Exception:
+                    logger.exception("Notification dispatch failed")
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    self._last_prune = time.monotonic()
+                    try:
+                        prune()
+                    except Exception:
+                        logger.exception("Notification outbox prune failed")
+        finally:
+            connection.close()
+
+    def ensure_started(self):
+        """Start the in-process dispatcher thread (unless ALERT_DISPATCH_IN_PROCESS is off)."""
+        if not _setting("ALERT_DISPATCH_IN_PROCESS", True):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, daemon=True, name="Notification-Dispatcher")
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+dispatcher = NotificationDispatcher()
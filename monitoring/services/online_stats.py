@@ -0,0 +1,184 @@
+# monitoring/services/online_stats.py
+"""
+Streaming statistics per block, updated in O(1) per reading.
+
+Every reading written by a simulator (thread or lazy catch-up) is fed to
+``record_reading``. For each sensor value the block keeps an EWMA, a
+Welford mean and variance and the running min / max; feed and water levels
+also get a least-squares trend over the last ``ONLINE_STATS_TREND_WINDOW``
+readings, from which the time until they run out is estimated.
+
+Views read the numbers with ``block_stats_snapshot`` without querying
+SensorData. The statistics live in the process that runs the block's
+simulator and cover the readings it has written since it started.
+"""
+import math
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from .history_codec import HISTORY_METRICS
+
+# Sensor values that get a trend and a time-to-empty estimate
+TREND_METRICS = ("feed_level", "water_level")
+
+# Rebuild the trend sums from the window this often, so float error from
+# adding and removing points does not accumulate
+TREND_RESYNC_EVERY = 1000
+
+
+class RunningStats:
+    """EWMA, Welford mean/variance, min and max of one value."""
+    __slots__ = ("alpha", "count", "mean", "_m2", "ewma", "min", "max", "last")
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.ewma = None
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "last": self.last,
+            "mean": self.mean if self.count else None,
+            "variance": self.variance,
+            "stddev": math.sqrt(self.variance),
+            "ewma": self.ewma,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class LinearTrend:
+    """
+    Least-squares line through the last ``window`` (hours, value) points,
+    kept as running sums so each update is O(1).
+    """
+
+    def __init__(self, window):
+        self.points = deque(maxlen=window)
+        self._origin = None
+        self._updates = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def _add(self, x, y, sign):
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.sxy += sign * x * y
+
+    def update(self, timestamp, value):
+        if self._origin is None:
+            self._origin = timestamp
+        x = (timestamp - self._origin).total_seconds() / 3600.0
+
+        if len(self.points) == self.points.maxlen:
+            self._add(*self.points[0], -1)
+        self.points.append((x, value))
+        self._add(x, value, 1)
+
+        self._updates += 1
+        if self._updates % TREND_RESYNC_EVERY == 0:
+            self._reset_sums()
+            for px, py in self.points:
+                self._add(px, py, 1)
+
+    @property
+    def slope(self):
+        """Change per hour, or None with fewer than two distinct timestamps."""
+        n = len(self.points)
+        denominator = n * self.sxx - self.sx * self.sx
+        if n < 2 or denominator <= 1e-12:
+            return None
+        return (n * self.sxy - self.sx * self.sy) / denominator
+
+    def hours_until_zero(self):
+        """Hours until the fitted line reaches 0 from the latest value, or None if not falling."""
+        slope = self.slope
+        if slope is None or slope >= 0 or not self.points:
+            return None
+        return max(0.0, self.points[-1][1] / -slope)
+
+
+class BlockStats:
+    def __init__(self, alpha, trend_window):
+        self._lock = threading.Lock()
+        self.updated_at = None
+        self.metrics = {metric: RunningStats(alpha) for metric in HISTORY_METRICS}
+        self.trends = {metric: LinearTrend(trend_window) for metric in TREND_METRICS}
+
+    def update(self, timestamp, data):
+        with self._lock:
+            for metric, stats in self.metrics.items():
+                value = data.get(metric)
+                if value is not None:
+                    stats.update(value)
+            for metric, trend in self.trends.items():
+                value = data.get(metric)
+                if value is not None:
+                    trend.update(timestamp, value)
+            self.updated_at = timestamp
+
+    def as_dict(self):
+        with self._lock:
+            metrics = {metric: stats.as_dict() for metric, stats in self.metrics.items()}
+            for metric, trend in self.trends.items():
+                metrics[metric]["trend_per_hour"] = trend.slope
+                metrics[metric]["hours_until_empty"] = trend.hours_until_zero()
+            return {"updated_at": self.updated_at, "metrics": metrics}
+
+
+_lock = threading.Lock()
+_blocks = {}
+
+
+def _block(block_id):
+    stats = _blocks.get(block_id)
+    if stats is None:
+        with _lock:
+            stats = _blocks.get(block_id)
+            if stats is None:
+                stats = _blocks[block_id] = BlockStats(
+                    alpha=getattr(settings, "ONLINE_STATS_EWMA_ALPHA", 0.1),
+                    trend_window=getattr(settings, "ONLINE_STATS_TREND_WINDOW", 100),
+                )
+    return stats
+
+
+def record_reading(block_id, timestamp, data):
+    """Fold one reading (a dict of sensor values) into the block's statistics."""
+    _block(int(block_id)).update(timestamp, data)
+
+
+def block_stats_snapshot(block_id):
+    """Current statistics of a block, or None if no reading was recorded in this process."""
+    stats = _blocks.get(int(block_id))
+    return stats.as_dict() if stats is not None else None
+
+
+def forget_block(block_id):
+    with _lock:
+        _blocks.pop(int(block_id), None)
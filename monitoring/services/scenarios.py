@@ -0,0 +1,159 @@
+# monitoring/services/scenarios.py
+"""
+Monte Carlo scenario runner over SensorSimulatorCore.
+
+Answers questions such as "how often does a 2,000-bird broiler house cross
+the ammonia threshold within 7 days?" by running many independent
+trajectories for every combination of flock size, breed and age group, and
+keeping only summary statistics per combination: for every event, the
+probability that it happens within the horizon and the time until it
+first does.
+
+Events are one per bound in ALERT_THRESHOLDS (``ammonia_high``,
+``feed_level_low``, ...) plus ``feed_empty`` and ``water_empty``. A
+trajectory stops being stepped once all of its events have happened.
+
+Nothing touches the database. Trajectories are stepped in batches
+(SensorSimulatorBatch) and the batches are spread over a process pool.
+Every trajectory has its own RNG seeded from the run seed, the flock and
+its index, so results do not depend on the number of workers or the chunk
+size.
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from types import SimpleNamespace
+
+from .simulator_core import ALERT_THRESHOLDS, SensorSimulatorBatch
+
+# (event name, sensor field, "low" / "high" / "empty", bound)
+EVENTS = tuple(
+    [(f"{field}_low", field, "low", low) for field, (low, high) in ALERT_THRESHOLDS.items() if low is not None]
+    + [(f"{field}_high", field, "high", high) for field, (low, high) in ALERT_THRESHOLDS.items() if high is not None]
+    + [("feed_empty", "feed_level", "empty", 0.0), ("water_empty", "water_level", "empty", 0.0)]
+)
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def scenario_grid(birds, breeds, age_groups):
+    """All (number_of_birds, breed, age_group) combinations."""
+    return [
+        {"number_of_birds": n, "breed": breed, "age_group": age_group}
+        for n, breed, age_group in product(birds, breeds, age_groups)
+    ]
+
+
+def _trajectory_rng(seed, scenario, index):
+    return random.Random(
+        f"{seed}:{scenario['number_of_birds']}:{scenario['breed']}:{scenario['age_group']}:{index}"
+    )
+
+
+def run_chunk(scenario, start, count, steps, seed=0):
+    """
+    Run trajectories ``start`` .. ``start + count - 1`` of ``scenario`` for
+    at most ``steps`` readings.
+
+    Returns:
+        dict: {event name: [step of first occurrence for every trajectory
+        where it happened]}
+    """
+    flock = SimpleNamespace(**scenario)
+    batch = SensorSimulatorBatch(flock, [_trajectory_rng(seed, scenario, start + i) for i in range(count)])
+    state = {field: getattr(batch, field) for field in {field for _, field, _, _ in EVENTS}}
+    pending = {i: list(EVENTS) for i in range(count)}
+    hits = {name: [] for name, _, _, _ in EVENTS}
+
+    for step in range(1, steps + 1):
+        if not pending:
+            break
+        active = list(pending)
+        batch.step(active)
+        for i in active:
+            remaining = []
+            for event in pending[i]:
+                name, field, side, bound = event
+                value = state[field][i]
+                if side == "low":
+                    happened = value < bound
+                elif side == "high":
+                    happened = value > bound
+                else:
+                    happened = value <= bound
+                if happened:
+                    hits[name].append(step)
+                else:
+                    remaining.append(event)
+            if remaining:
+                pending[i] = remaining
+            else:
+                del pending[i]
+    return hits
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(scenario, hits, trajectories, steps, interval):
+    """Summary statistics for one scenario from merged ``run_chunk`` results."""
+    to_hours = interval / 3600.0
+    events = {}
+    for name, _, _, _ in EVENTS:
+        times = sorted(hits[name])
+        events[name] = {
+            "probability": len(times) / trajectories if trajectories else 0.0,
+            "mean_hours": sum(times) / len(times) * to_hours if times else None,
+            "median_hours": _percentile(times, 0.5) * to_hours if times else None,
+            "p90_hours": _percentile(times, 0.9) * to_hours if times else None,
+        }
+    return {
+        **scenario,
+        "trajectories": trajectories,
+        "horizon_hours": steps * to_hours,
+        "events": events,
+    }
+
+
+def run_scenarios(scenarios, trajectories=1000, days=7.0, interval=3.0, workers=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, seed=0):
+    """
+    Run ``trajectories`` trajectories of every scenario (see scenario_grid)
+    over ``days`` days of readings taken every ``interval`` seconds.
+
+    ``workers`` processes are used (default: CPU count); ``workers=1`` runs
+    everything in this process. Returns one summary dict per scenario.
+    """
+    steps = int(days * 86400 / interval)
+    workers = workers or os.cpu_count() or 1
+    tasks = [
+        (index, scenario, start, min(chunk_size, trajectories - start))
+        for index, scenario in enumerate(scenarios)
+        for start in range(0, trajectories, chunk_size)
+    ]
+    merged = [{name: [] for name, _, _, _ in EVENTS} for _ in scenarios]
+
+    def merge(index, hits):
+        for name, times in hits.items():
+            merged[index][name].extend(times)
+
+    if workers == 1:
+        for index, scenario, start, count in tasks:
+            merge(index, run_chunk(scenario, start, count, steps, seed))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks) or 1)) as pool:
+            futures = [
+                (index, pool.submit(run_chunk, scenario, start, count, steps, seed))
+                for index, scenario, start, count in tasks
+            ]
+            for index, future in futures:
+                merge(index, future.result())
+
+    return [
+        summarize(scenario, merged[index], trajectories, steps, interval)
+        for index, scenario in enumerate(scenarios)
+    ]
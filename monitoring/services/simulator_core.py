@@ -2,9 +2,24 @@
 import random
 import math
 
+# Sensor values carried from one reading to the next
+STATE_FIELDS = ('temperature', 'humidity', 'feed_level', 'water_level', 'ammonia', 'activity_level')
+
+# (min, max) per reading field; values outside raise an Alert
+ALERT_THRESHOLDS = {
+    "temperature": (28, 34),
+    "humidity": (None, 85),
+    "ammonia": (None, 25),
+    "feed_level": (20, None),
+    "water_level": (20, None),
+    "activity_level": (30, None),
+}
+
 class SensorSimulatorCore:
-    def __init__(self, initial_settings=None, flock=None):
+    def __init__(self, initial_settings=None, flock=None, rng=None):
         self.flock = flock
+        # Source of randomness; pass a seeded random.Random for reproducible runs
+        self.rng = rng or random
         
         # Handle None initial_settings
         if initial_settings is None:
@@ -37,8 +52,25 @@ class SensorSimulatorCore:
         if 'humidity' in adjustment:
             self.humidity = adjustment['humidity']
 
+    def reconfigure(self, flock):
+        """
+        Simulate ``flock`` from now on (e.g. its edited block), keeping the
+        current sensor values. A new breed moves temperature and humidity
+        to that breed's baseline.
+        """
+        breed_changed = getattr(self.flock, 'breed', None) != getattr(flock, 'breed', None)
+        self.flock = flock
+        if self.flock and breed_changed:
+            self._apply_breed_adjustments()
+
+    def load_state(self, values):
+        """Continue from earlier sensor values (e.g. the last stored reading)."""
+        for field in STATE_FIELDS:
+            if values.get(field) is not None:
+                setattr(self, field, float(values[field]))
+
     def _fluctuate(self, value, min_val, max_val, step=0.5):
-        value += random.uniform(-step, step)
+        value += self.rng.uniform(-step, step)
         return max(min(value, max_val), min_val)
 
     def generate_data(self):
@@ -61,11 +93,11 @@ class SensorSimulatorCore:
         # Feed & water decrease over time depending on birds and activity
         feed_decrease = (0.05 + 0.02 * (self.activity_level / 100.0)) * consumption_factor
         water_decrease = (0.06 + 0.02 * (self.activity_level / 100.0)) * consumption_factor
-        self.feed_level = max(0.0, self.feed_level - random.uniform(feed_decrease * 0.5, feed_decrease * 1.5))
-        self.water_level = max(0.0, self.water_level - random.uniform(water_decrease * 0.5, water_decrease * 1.5))
+        self.feed_level = max(0.0, self.feed_level - self.rng.uniform(feed_decrease * 0.5, feed_decrease * 1.5))
+        self.water_level = max(0.0, self.water_level - self.rng.uniform(water_decrease * 0.5, water_decrease * 1.5))
 
         # Ammonia increases as feed/water drop and humidity rises
-        ammonia_delta = ( (100 - self.feed_level)/500.0 + (self.humidity - 60)/200.0 ) + random.uniform(-0.2, 0.6)
+        ammonia_delta = ( (100 - self.feed_level)/500.0 + (self.humidity - 60)/200.0 ) + self.rng.uniform(-0.2, 0.6)
         self.ammonia = max(0.0, min(100.0, self.ammonia + ammonia_delta))
 
         # Activity level responds to temperature (too hot -> lower activity) and age/breed
@@ -73,7 +105,7 @@ class SensorSimulatorCore:
         temp_penalty = 0
         if self.temperature > 34:
             temp_penalty = (self.temperature - 34) * 2.5  # larger penalty for high temp
-        self.activity_level = max(5.0, min(100.0, self.activity_level + random.uniform(-4, 4) + (base_activity - self.activity_level)*0.02 - temp_penalty*0.2))
+        self.activity_level = max(5.0, min(100.0, self.activity_level + self.rng.uniform(-4, 4) + (base_activity - self.activity_level)*0.02 - temp_penalty*0.2))
 
         data = {
             "temperature": round(self.temperature, 1),
@@ -83,4 +115,71 @@ class SensorSimulatorCore:
             "ammonia": round(self.ammonia, 1),
             "activity_level": round(self.activity_level, 1),
         }
-        return data
\ No newline at end of file
+        return data
+
+
+class SensorSimulatorBatch:
+    """
+    Many independent SensorSimulatorCore trajectories of one flock, stepped
+    together (used by the scenario runner).
+
+    State is held as one list per sensor value and the per-flock constants
+    are computed once, which is much cheaper than calling generate_data on
+    a core per trajectory. ``step`` applies the same update as
+    generate_data, drawing the same numbers in the same order from each
+    trajectory's RNG, so trajectory ``i`` reproduces a SensorSimulatorCore
+    built with ``rngs[i]`` (without the rounding of the returned reading).
+    Keep the two in sync.
+    """
+
+    def __init__(self, flock, rngs, initial_settings=None):
+        core = SensorSimulatorCore(initial_settings, flock=flock)
+        self.flock = flock
+        self.size = len(rngs)
+        self._random = [rng.random for rng in rngs]
+        for field in STATE_FIELDS:
+            setattr(self, field, [getattr(core, field)] * self.size)
+
+    def step(self, indices=None):
+        """Advance the trajectories in ``indices`` (default: all) by one reading."""
+        birds = getattr(self.flock, 'number_of_birds', 10)
+        breed = getattr(self.flock, 'breed', 'broiler')
+        age_group = getattr(self.flock, 'age_group', 'adult')
+
+        consumption_factor = 1 + (birds / 50.0)
+        temp_step = 0.15 + (0.05 if age_group == 'adult' else 0.02)
+        hum_step = 0.4
+        base_activity = 60 + (10 if breed in ['kuroiler', 'local'] else 0)
+
+        temperature, humidity = self.temperature, self.humidity
+        feed_level, water_level = self.feed_level, self.water_level
+        ammonia, activity_level = self.ammonia, self.activity_level
+        randoms = self._random
+
+        for i in (range(self.size) if indices is None else indices):
+            rand = randoms[i]
+
+            # Same expressions as random.uniform(a, b): a + (b - a) * random()
+            temp = temperature[i] + (-temp_step + (temp_step - -temp_step) * rand())
+            temp = max(min(temp, 40), 24)
+            temperature[i] = temp
+
+            hum = humidity[i] + (-hum_step + (hum_step - -hum_step) * rand())
+            hum = max(min(hum, 90), 45)
+            humidity[i] = hum
+
+            activity = activity_level[i]
+            feed_decrease = (0.05 + 0.02 * (activity / 100.0)) * consumption_factor
+            water_decrease = (0.06 + 0.02 * (activity / 100.0)) * consumption_factor
+            low, high = feed_decrease * 0.5, feed_decrease * 1.5
+            feed = max(0.0, feed_level[i] - (low + (high - low) * rand()))
+            feed_level[i] = feed
+            low, high = water_decrease * 0.5, water_decrease * 1.5
+            water_level[i] = max(0.0, water_level[i] - (low + (high - low) * rand()))
+
+            ammonia_delta = ((100 - feed) / 500.0 + (hum - 60) / 200.0) + (-0.2 + (0.6 - -0.2) * rand())
+            ammonia[i] = max(0.0, min(100.0, ammonia[i] + ammonia_delta))
+
+            temp_penalty = (temp - 34) * 2.5 if temp > 34 else 0
+            activity_level[i] = max(5.0, min(100.0, activity + (-4 + (4 - -4) * rand())
+                                             + (base_activity - activity) * 0.02 - temp_penalty * 0.2))
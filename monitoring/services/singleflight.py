@@ -0,0 +1,135 @@
+# monitoring/services/singleflight.py
+"""
+Single-flight request coalescing for hot read paths.
+
+When many tabs or users poll the same block at the same moment, identical
+requests share one in-flight computation: the first caller (the leader)
+runs it, concurrent callers with the same key wait for its result, and the
+result is then reused for a short TTL. Database load follows the number of
+distinct questions instead of the number of viewers.
+
+Results are shared between callers and must be treated as read-only.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, ttl=1.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}   # (event loop id, key) -> Future
+        self._results = OrderedDict()
+
+    def do(self, key, func):
+        """
+        Return ``func()`` for ``key``, sharing the call with concurrent
+        callers and reusing a result computed less than ``ttl`` seconds ago.
+        Exceptions raised by the leader are re-raised in every waiter.
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl > 0:
+                    self._store(key, call.value)
+            call.event.set()
+
+        return call.value
+
+    async def ado(self, key, func):
+        """
+        ``do`` for coroutines: ``await func()`` once per key among the
+        callers on the same event loop. Shares the TTL cache with ``do``,
+        so both must produce the same value for a key.
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        future = self._async_calls.get(call_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._async_calls[call_key] = loop.create_future()
+        try:
+            value = await func()
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                # Retrieved by the waiters, if any
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if self.ttl > 0:
+                with self._lock:
+                    self._store(key, value)
+        finally:
+            del self._async_calls[call_key]
+        return value
+
+    def forget(self, key):
+        """Drop any cached result for ``key``."""
+        with self._lock:
+            self._results.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        self._results[key] = (now + self.ttl, value)
+        self._results.move_to_end(key)
+
+        # Drop expired entries from the head, then enforce the size bound
+        while self._results:
+            oldest_key, (expires, _) = next(iter(self._results.items()))
+            if expires > now and len(self._results) <= self.max_entries:
+                break
+            del self._results[oldest_key]
+
+
+# Shared coalescer for the read endpoints (monitoring.views)
+read_coalescer = SingleFlight(ttl=getattr(settings, "READ_COALESCE_TTL", 1.0))
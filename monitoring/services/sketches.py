@@ -0,0 +1,265 @@
+# monitoring/services/sketches.py
+"""
+Mergeable quantile sketches per block, sensor value and time bucket.
+
+Readings are folded into a DDSketch per (block, metric, bucket) as they
+are written. A DDSketch keeps counts in logarithmic bins, so any quantile
+it returns is within ``SKETCH_RELATIVE_ACCURACY`` (1% by default) of the
+true value, and two sketches merge by adding their bin counts.
+
+New values collect in memory and a background thread upserts them into
+SensorSketch rows every ``SKETCH_FLUSH_INTERVAL`` seconds. ``percentiles``
+merges the rows covering a range (plus what is not flushed yet) and
+answers p50/p95/p99 without reading SensorData. Ranges are widened to
+whole buckets of ``SKETCH_BUCKET_SECONDS``.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from monitoring.models import SensorSketch
+from . import metrics
+
+logger = logging.getLogger("monitoring.sketches")
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Blocks per SELECT when a flush looks up existing rows
+FLUSH_CHUNK_SIZE = 500
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sketch_metrics():
+    return tuple(_setting("SKETCH_METRICS", ("temperature", "ammonia")))
+
+
+class DDSketch:
+    """DDSketch for non-negative values with a given relative accuracy."""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.count = 0
+        self.zero_count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        if value <= 0:
+            self.zero_count += weight
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + weight
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, count, zero_count, min_value, max_value, bins):
+        """Add another sketch's state (bins may have str keys, as stored in JSON)."""
+        for index, n in bins.items():
+            index = int(index)
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.count += count
+        self.zero_count += zero_count
+        if min_value is not None:
+            self.min = min_value if self.min is None else min(self.min, min_value)
+        if max_value is not None:
+            self.max = max_value if self.max is None else max(self.max, max_value)
+
+    def merge_sketch(self, other):
+        self.merge(other.count, other.zero_count, other.min, other.max, other.bins)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(0.0, self.min)
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+def bucket_start(timestamp, bucket_seconds=None):
+    bucket_seconds = bucket_seconds or _setting("SKETCH_BUCKET_SECONDS", 300)
+    epoch = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=dt_timezone.utc)
+
+
+class SketchStore:
+    """In-memory sketches not yet written to SensorSketch, and the thread that writes them."""
+
+    def __init__(self, autoflush=True):
+        self._lock = threading.Lock()
+        self._pending = {}   # (block_id, metric, bucket_start) -> DDSketch
+        self._thread = None
+        self._autoflush = autoflush
+        self._last_cleanup = 0.0
+
+    def record(self, block_id, timestamp, data):
+        """Fold one reading (a dict of sensor values) into the current buckets."""
+        bucket = bucket_start(timestamp)
+        accuracy = _setting("SKETCH_RELATIVE_ACCURACY", 0.01)
+        with self._lock:
+            for metric in sketch_metrics():
+                value = data.get(metric)
+                if value is None:
+                    continue
+                key = (block_id, metric, bucket)
+                sketch = self._pending.get(key)
+                if sketch is None:
+                    sketch = self._pending[key] = DDSketch(accuracy)
+                sketch.add(value)
+            if self._autoflush and self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="Sketch-Flush")
+                self._thread.start()
+
+    def pending_for(self, block_id, start, end):
+        """Copies of unflushed sketches of ``block_id`` with buckets in [start, end]."""
+        with self._lock:
+            found = []
+            for (pending_block, metric, bucket), sketch in self._pending.items():
+                if pending_block == block_id and start <= bucket <= end:
+                    copy = DDSketch(sketch.relative_accuracy)
+                    copy.merge_sketch(sketch)
+                    found.append((metric, copy))
+            return found
+
+    def forget_block(self, block_id):
+        """Drop unflushed sketches of a deleted block (their INSERT would fail the flush)."""
+        with self._lock:
+            self._pending = {key: sketch for key, sketch in self._pending.items() if key[0] != block_id}
+
+    def forget_range(self, block_id, start, end):
+        """Drop unflushed sketches of ``block_id`` with buckets in [start, end) (they are being rebuilt)."""
+        with self._lock:
+            self._pending = {
+                key: sketch for key, sketch in self._pending.items()
+                if not (key[0] == block_id and start <= key[2] < end)
+            }
+
+    def flush(self):
+        """Upsert all pending sketches; returns how many buckets were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                existing = {}
+                block_ids = sorted({block_id for block_id, _, _ in pending})
+                buckets = {bucket for _, _, bucket in pending}
+                for i in range(0, len(block_ids), FLUSH_CHUNK_SIZE):
+                    rows = SensorSketch.objects.select_for_update().filter(
+                        block_id__in=block_ids[i:i + FLUSH_CHUNK_SIZE], bucket_start__in=buckets,
+                    )
+                    existing.update({(row.block_id, row.metric, row.bucket_start): row for row in rows})
+
+                to_create, to_update = [], []
+                for key, sketch in pending.items():
+                    # Merge into a copy: on failure ``pending`` is queued again as it was
+                    combined = DDSketch(sketch.relative_accuracy)
+                    combined.merge_sketch(sketch)
+                    row = existing.get(key)
+                    if row is None:
+                        block_id, metric, bucket = key
+                        row = SensorSketch(block_id=block_id, metric=metric, bucket_start=bucket)
+                        to_create.append(row)
+                    else:
+                        combined.merge(row.count, row.zero_count, row.min_value, row.max_value, row.bins)
+                        to_update.append(row)
+                    row.count = combined.count
+                    row.zero_count = combined.zero_count
+                    row.min_value = combined.min
+                    row.max_value = combined.max
+                    row.bins = {str(index): n for index, n in combined.bins.items()}
+                SensorSketch.objects.bulk_create(to_create)
+                SensorSketch.objects.bulk_update(
+                    to_update, ['count', 'zero_count', 'min_value', 'max_value', 'bins'],
+                )
+        except Exception:
+            logger.exception("Failed to write %d sketches; keeping them for the next flush", len(pending))
+            with self._lock:
+                for key, sketch in pending.items():
+                    current = self._pending.get(key)
+                    if current is not None:
+                        sketch.merge_sketch(current)
+                    self._pending[key] = sketch
+            return 0
+
+        metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started, operation="sketches")
+        return len(pending)
+
+    def cleanup(self, days=30):
+        """Delete sketches older than the SensorData retention."""
+        SensorSketch.objects.filter(bucket_start__lt=timezone.now() - timedelta(days=days)).delete()
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(_setting("SKETCH_FLUSH_INTERVAL", 10.0))
+                self.flush()
+                if time.monotonic() - self._last_cleanup > 3600:
+                    self._last_cleanup = time.monotonic()
+                    try:
+                        self.cleanup()
+                    except Exception:
+                        logger.exception("Sketch cleanup failed")
+        finally:
+            connection.close()
+
+
+sketch_store = SketchStore()
+
+
+def record_reading(block_id, timestamp, data):
+    sketch_store.record(int(block_id), timestamp, data)
+
+
+def percentiles(block_id, start, end, metric_names=None, quantiles=DEFAULT_QUANTILES):
+    """
+    Quantiles of each metric of ``block_id`` between ``start`` and ``end``
+    (widened to whole buckets), from the stored and pending sketches.
+
+    Returns:
+        dict: {metric: {"count", "min", "max", "p50", ...}} with None
+        quantiles for metrics without data in the range.
+    """
+    metric_names = tuple(metric_names or sketch_metrics())
+    first_bucket = bucket_start(start)
+    accuracy = _setting("SKETCH_RELATIVE_ACCURACY", 0.01)
+    merged = {metric: DDSketch(accuracy) for metric in metric_names}
+
+    rows = SensorSketch.objects.filter(
+        block_id=block_id, metric__in=metric_names, bucket_start__gte=first_bucket, bucket_start__lte=end,
+    ).values_list('metric', 'count', 'zero_count', 'min_value', 'max_value', 'bins')
+    for metric, *state in rows:
+        merged[metric].merge(*state)
+    for metric, sketch in sketch_store.pending_for(int(block_id), first_bucket, end):
+        if metric in merged:
+            merged[metric].merge_sketch(sketch)
+
+    result = {}
+    for metric, sketch in merged.items():
+        summary = {"count": sketch.count, "min": sketch.min, "max": sketch.max}
+        for q in quantiles:
+            summary[f"p{q * 100:g}"] = sketch.quantile(q)
+        result[metric] = summary
+    return result
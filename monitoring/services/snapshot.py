@@ -0,0 +1,58 @@
+# monitoring/services/snapshot.py
+"""
+Whole-farm snapshot: latest reading, running state and open-alert count for
+every block of a user in a fixed number of queries, however many blocks the
+farm has.
+"""
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData
+from monitoring.serializers import FastSensorDataSerializer
+from monitoring.services.block_simulator import is_running
+
+
+def build_farm_snapshot(user, block_ids=None):
+    """
+    Build the snapshot for ``user``'s blocks (optionally only ``block_ids``).
+
+    Runs two queries: one for the blocks annotated with their newest reading
+    id and open-alert count, one for those readings. Running state comes
+    from the in-process simulator registry.
+
+    Returns:
+        list[dict]: one entry per block, ordered by block id.
+    """
+    newest_reading = (
+        SensorData.objects.filter(block=OuterRef('pk'))
+        .order_by('-timestamp')
+        .values('id')[:1]
+    )
+    blocks = (
+        FlockBlock.objects.filter(user=user)
+        .annotate(
+            latest_reading_id=Subquery(newest_reading),
+            open_alerts=Count('alerts', filter=Q(alerts__resolved=False)),
+        )
+        .order_by('id')
+    )
+    if block_ids is not None:
+        blocks = blocks.filter(id__in=block_ids)
+    blocks = list(blocks)
+
+    reading_ids = [b.latest_reading_id for b in blocks if b.latest_reading_id]
+    readings = {}
+    if reading_ids:
+        for item in FastSensorDataSerializer(SensorData.objects.filter(id__in=reading_ids)).data:
+            readings[item['block']] = item
+
+    return [{
+        'block_id': block.id,
+        'block_name': block.name,
+        'number_of_birds': block.number_of_birds,
+        'breed': block.breed,
+        'age_group': block.age_group,
+        'is_running': is_running(block),
+        'open_alerts': block.open_alerts,
+        'latest_data': readings.get(block.id),
+    } for block in blocks]
@@ -0,0 +1,126 @@
+# monitoring/services/supervisor.py
+"""
+Warm restart of block simulators.
+
+Running simulators save a SimulatorCheckpoint when they start and every
+``SIMULATOR_CHECKPOINT_INTERVAL`` seconds after that; stopping a simulator
+marks its checkpoint as not running. At startup ``MonitoringConfig.ready``
+starts a supervisor thread that restores every checkpoint still marked as
+running, with its saved values, RNG seed, interval and mode. Only processes
+that serve requests should do that, so it is switched on explicitly with
+the ``SIMULATOR_RESTORE_ON_STARTUP`` setting (from the environment variable
+of the same name, see settings.py).
+
+Restores are staggered: after ``SIMULATOR_RESTORE_DELAY`` seconds the
+simulators are started one by one, evenly spread over
+``SIMULATOR_RESTORE_SPREAD`` seconds, so their first writes (and all later
+ticks) do not land at the same moment.
+
+With several worker processes, each checkpoint is claimed by exactly one of
+them: a checkpoint is only claimable when its owner process is gone, and the
+claim is an UPDATE conditioned on the owner and ``updated_at`` read before.
+Owners are ``host:pid:nonce`` (see ``process_owner``). An owner on this
+host is gone when its pid is, or when that pid now belongs to a process
+started at another time than the nonce says; one on another host when it
+has not refreshed the checkpoint for three checkpoint intervals (threads
+checkpoint every interval, lazy simulators are refreshed by a heartbeat).
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from monitoring.models import SimulatorCheckpoint
+from .block_simulator import checkpoint_interval, is_running, process_owner, start_simulator_for_block
+from .metrics import pid_alive, process_start_time
+
+logger = logging.getLogger("monitoring.supervisor")
+
+def should_restore_on_startup():
+    """
+    Whether this process restores the checkpointed simulators: only when
+    ``SIMULATOR_RESTORE_ON_STARTUP`` is set, which the server processes do
+    and management commands, tests and scripts do not.
+    """
+    return bool(getattr(settings, "SIMULATOR_RESTORE_ON_STARTUP", False))
+
+
+def _owner_gone(owner, now, updated_at):
+    if not owner:
+        return True
+    host, pid, nonce = (owner.split(":") + [""])[:3]
+    if host == process_owner().split(":")[0] and pid.isdigit():
+        # On this host the pid tells for sure, however old the checkpoint,
+        # unless it was reused by a process started later
+        if not pid_alive(int(pid)):
+            return True
+        started = process_start_time(int(pid))
+        return bool(nonce) and started is not None and str(started) != nonce
+    # Owners on other hosts refresh their checkpoints every interval
+    return updated_at < now - timedelta(seconds=3 * checkpoint_interval())
+
+
+def claim_checkpoints():
+    """Claim the running checkpoints whose owner is gone; returns them."""
+    now = timezone.now()
+    me = process_owner()
+    claimed = []
+    for checkpoint in SimulatorCheckpoint.objects.filter(running=True).select_related("block__user"):
+        if checkpoint.owner == me or not _owner_gone(checkpoint.owner, now, checkpoint.updated_at):
+            continue
+        won = SimulatorCheckpoint.objects.filter(
+            pk=checkpoint.pk, owner=checkpoint.owner, updated_at=checkpoint.updated_at,
+        ).update(owner=me, updated_at=now)
+        if won:
+            claimed.append(checkpoint)
+    return claimed
+
+
+def restore_simulators(spread=None):
+    """
+    Claim and restart checkpointed simulators, spreading the starts over
+    ``spread`` seconds. Returns the number of simulators started.
+    """
+    checkpoints = claim_checkpoints()
+    if not checkpoints:
+        return 0
+    if spread is None:
+        spread = getattr(settings, "SIMULATOR_RESTORE_SPREAD", 3.0)
+
+    logger.info("Restoring %d simulators over %.1fs", len(checkpoints), spread)
+    gap = spread / len(checkpoints)
+    started = 0
+    for checkpoint in checkpoints:
+        if not is_running(checkpoint.block):
+            try:
+                start_simulator_for_block(
+                    checkpoint.block, interval=checkpoint.interval, lazy=checkpoint.lazy, checkpoint=checkpoint,
+                )
+                started += 1
+            except Exception:
+                logger.exception("Failed to restore simulator for block %s", checkpoint.block_id)
+        time.sleep(gap)
+    return started
+
+
+def _run(delay):
+    time.sleep(delay)
+    try:
+        restore_simulators()
+    except Exception:
+        logger.exception("Simulator restore failed")
+    finally:
+        connection.close()
+
+
+def start_supervisor(delay=None):
+    """Restore checkpointed simulators from a background thread after ``delay`` seconds."""
+    if delay is None:
+        delay = getattr(settings, "SIMULATOR_RESTORE_DELAY", 2.0)
+    thread = threading.Thread(target=_run, args=(delay,), daemon=True, name="Sim-Supervisor")
+    thread.start()
+    return thread
@@ -0,0 +1,41 @@
+# monitoring/signals.py
+"""
+Keep running simulators in step with their FlockBlock.
+
+Editing a block reconfigures its simulator in place (number of birds,
+breed and age group take effect on the next reading); deleting a block
+stops its simulator at once and drops the block's in-memory state, so no
+thread keeps ticking into failed INSERTs. Both run after the transaction
+commits. Connected in MonitoringConfig.ready.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from flock.models import FlockBlock
+from monitoring.services import anomaly, online_stats
+from monitoring.services.block_simulator import discard_simulator_for_block, reconfigure_simulator_for_block
+from monitoring.services.history_cache import history_cache
+from monitoring.services.sketches import sketch_store
+
+
+@receiver(post_save, sender=FlockBlock)
+def reconfigure_block_simulator(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    transaction.on_commit(lambda: reconfigure_simulator_for_block(instance))
+
+
+def forget_block(block_id):
+    discard_simulator_for_block(block_id)
+    online_stats.forget_block(block_id)
+    anomaly.detector.forget(block_id)
+    anomaly.alert_batcher.forget_block(block_id)
+    sketch_store.forget_block(block_id)
+    history_cache.invalidate(block_id)
+
+
+@receiver(post_delete, sender=FlockBlock)
+def stop_block_simulator(sender, instance, **kwargs):
+    block_id = instance.pk
+    transaction.on_commit(lambda: forget_block(block_id))
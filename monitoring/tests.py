@@ -1,3 +1,1648 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import json
+import math
+import random
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from flock.models import FlockBlock
+from monitoring.management.commands import loadtest
+from monitoring.models import Alert, AlertNotification, SensorData
+from monitoring.serializers import AlertSerializer, FastAlertSerializer, FastSensorDataSerializer, SensorDataSerializer
+from monitoring.services import anomaly, introspection, metrics, notifications, online_stats, sketches
+from monitoring.services.anomaly import AlertBatcher
+from monitoring.services.block_simulator import SimulatorRegistry, is_running, running_simulators, start_simulator_for_block
+from monitoring.services.event_log import EventLog, SEGMENT_SUFFIX
+from monitoring.services.history_cache import HistoryCache
+from monitoring.services.history_codec import HISTORY_METRICS, decode_columnar, encode_columnar
+from monitoring.services.ingest import recent_keys
+from monitoring.services.line_protocol import BatchWriter, IngestStats, LineProtocolServer
+from monitoring.services.scenarios import EVENTS, run_chunk, run_scenarios, scenario_grid
+from monitoring.services.simulator_core import STATE_FIELDS, SensorSimulatorBatch, SensorSimulatorCore
+from monitoring import async_views
+from poultry_monitoring.middleware import RequestProfilingMiddleware, profiling_summary, reset_profiling_summary
+from poultry_monitoring.testing import QueryBudgetMixin, seed_farm
+
+# Session and user lookups plus FlockSetupMiddleware's has-blocks check
+PAGE_BASE_QUERIES = 3
+# Session and user lookups (the middleware skips /api/)
+API_BASE_QUERIES = 2
+
+
+class MonitoringPageQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts must not grow with the number of blocks or readings."""
+
+    def test_live_simulation(self):
+        # block, latest reading, open alerts
+        self.assertBudgetForAllFarmSizes(PAGE_BASE_QUERIES + 3, lambda farm: f"/m/live/{farm[-1].id}/")
+
+    def test_history_blocks(self):
+        self.assertBudgetForAllFarmSizes(PAGE_BASE_QUERIES + 1, lambda farm: "/m/history/")
+
+    def test_history_detail(self):
+        # block, readings in range, percentile sketches
+        self.assertBudgetForAllFarmSizes(PAGE_BASE_QUERIES + 3, lambda farm: f"/m/history/{farm[-1].id}/")
+
+    def test_export_history_csv(self):
+        self.assertBudgetForAllFarmSizes(
+            PAGE_BASE_QUERIES + 2, lambda farm: f"/m/history/{farm[-1].id}/export/csv/",
+        )
+
+    def test_export_history_pdf(self):
+        self.assertBudgetForAllFarmSizes(
+            PAGE_BASE_QUERIES + 2, lambda farm: f"/m/history/{farm[-1].id}/export/pdf/",
+        )
+
+
+class MonitoringApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts must not grow with the number of blocks or readings."""
+
+    def test_latest_data(self):
+        # ETag validator, latest reading
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 2, lambda farm: "/api/data/latest/")
+
+    def test_latest_data_not_modified(self):
+        user, farm = seed_farm("etag", 3)
+        self.client.force_login(user)
+        etag = self.client.get("/api/data/latest/")["ETag"]
+        self.assertQueryBudget(API_BASE_QUERIES + 1, "/api/data/latest/", status=304, HTTP_IF_NONE_MATCH=etag)
+
+    def test_data_history(self):
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 1, lambda farm: "/api/data/history/")
+
+    def test_data_history_columnar(self):
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 1, lambda farm: "/api/data/history/?format=columnar")
+
+    def test_alerts(self):
+        # ETag validator, alerts
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 2, lambda farm: "/api/alerts/")
+
+    def test_simulation_status(self):
+        # ETag validator, block
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 2, lambda farm: f"/api/sim/status/{farm[-1].id}/")
+
+    def test_farm_snapshot(self):
+        # blocks with annotations, latest readings
+        self.assertBudgetForAllFarmSizes(API_BASE_QUERIES + 2, lambda farm: "/api/blocks/snapshot/")
+
+
+class ConditionalPollTests(QueryBudgetMixin, TestCase):
+    """ETags of the polled endpoints and the coalesced bodies sent with them."""
+
+    def add_reading(self, block, temperature):
+        return SensorData.objects.create(
+            user=block.user, block=block, temperature=temperature, humidity=60.0, ammonia=10.0,
+            feed_level=80.0, water_level=80.0, activity_level=70.0,
+        )
+
+    def test_new_etag_comes_with_new_body(self):
+        user, farm = seed_farm("poll", 1)
+        self.client.force_login(user)
+        first = self.client.get("/api/data/latest/")
+        reading = self.add_reading(farm[0], 31.5)
+        # Within the coalescer's TTL: the body must not be the cached one
+        second = self.client.get("/api/data/latest/")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(second.json()["id"], reading.id)
+        self.assertEqual(self.client.get("/api/data/latest/", HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 304)
+
+    def test_simulation_status_body_follows_etag(self):
+        from monitoring.services.block_simulator import running_simulators, start_simulator_for_block, stop_simulator_for_block
+
+        user, farm = seed_farm("status", 1)
+        self.client.force_login(user)
+        start_simulator_for_block(farm[0], lazy=True)
+        self.addCleanup(stop_simulator_for_block, farm[0])
+        url = f"/api/sim/status/{farm[0].id}/"
+        first = self.client.get(url)
+        # Stop catch-up from writing so that only our reading is new
+        running_simulators.get(farm[0].id).catch_up = lambda *args, **kwargs: 0
+        reading = self.add_reading(farm[0], 32.5)
+        second = self.client.get(url)
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(second.json()["latest_data"]["id"], reading.id)
+
+    def assertNotModified(self, url, etag):
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_latest_data_etag_is_per_block(self):
+        user, farm = seed_farm("perblock", 2)
+        self.client.force_login(user)
+        url = f"/api/data/latest/?block_id={farm[0].id}"
+        etag = self.client.get(url)["ETag"]
+        self.add_reading(farm[1], 33.0)
+        self.assertNotModified(url, etag)
+        self.add_reading(farm[0], 33.0)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_alerts_etag_follows_open_alerts(self):
+        user, farm = seed_farm("alerted", 1, alerts=3)
+        self.client.force_login(user)
+        first = self.client.get("/api/alerts/")
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+        self.assertNotModified("/api/alerts/", first["ETag"])
+
+        Alert.objects.filter(pk=Alert.objects.earliest("id").pk).update(resolved=True)
+        second = self.client.get("/api/alerts/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()), 2)
+        Alert.objects.create(user=user, block=farm[0], alert_type="Temperature Alert", message="Temperature too high: 36")
+        self.assertNotEqual(self.client.get("/api/alerts/")["ETag"], second["ETag"])
+
+    def test_simulation_status_etag_follows_block_and_running_state(self):
+        from monitoring.services.block_simulator import start_simulator_for_block, stop_simulator_for_block
+
+        user, farm = seed_farm("statusetag", 1)
+        self.client.force_login(user)
+        url = f"/api/sim/status/{farm[0].id}/"
+        stopped = self.client.get(url)["ETag"]
+        # Readings of a stopped block are not part of the status
+        self.add_reading(farm[0], 30.0)
+        self.assertNotModified(url, stopped)
+
+        FlockBlock.objects.filter(pk=farm[0].pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        renamed = self.client.get(url)["ETag"]
+        self.assertNotEqual(renamed, stopped)
+        start_simulator_for_block(farm[0], lazy=True)
+        self.addCleanup(stop_simulator_for_block, farm[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=renamed)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["is_running"])
+        self.assertEqual(self.client.get("/api/sim/status/99999/").status_code, 404)
+
+
+class SimulatorCheckpointTests(TestCase):
+    """Checkpoint ownership between worker processes, and stopping."""
+
+    def checkpoint(self, block, owner, age):
+        from monitoring.models import SimulatorCheckpoint
+
+        SimulatorCheckpoint.objects.create(block=block, running=True, lazy=True, owner=owner)
+        # updated_at is auto_now: backdate it with an UPDATE
+        SimulatorCheckpoint.objects.filter(block=block).update(updated_at=timezone.now() - age)
+
+    def test_claims_only_orphaned_checkpoints(self):
+        from monitoring.services.block_simulator import process_owner
+        from monitoring.services.supervisor import claim_checkpoints
+
+        host = process_owner().split(":")[0]
+        parent = os.getppid()
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        user, farm = seed_farm("owners", 5, readings=0, alerts=0)
+        stale = timedelta(days=1)
+        # Idle lazy simulator of a live worker on this host: stale but not orphaned
+        self.checkpoint(farm[0], f"{host}:{parent}:{metrics.process_start_time(parent)}", stale)
+        self.checkpoint(farm[1], f"{host}:{dead.pid}:1", timedelta(0))
+        self.checkpoint(farm[2], "elsewhere:1:1", stale)
+        self.checkpoint(farm[3], "elsewhere:2:1", timedelta(0))
+        # Written by an earlier process whose pid the live one reused
+        self.checkpoint(farm[4], f"{host}:{parent}:1", timedelta(0))
+        claimed = {checkpoint.block_id for checkpoint in claim_checkpoints()}
+        self.assertEqual(claimed, {farm[1].id, farm[2].id, farm[4].id})
+
+    def test_restore_on_startup_follows_the_setting(self):
+        from monitoring.services.supervisor import should_restore_on_startup
+
+        with override_settings(SIMULATOR_RESTORE_ON_STARTUP=True):
+            self.assertTrue(should_restore_on_startup())
+        with override_settings(SIMULATOR_RESTORE_ON_STARTUP=False):
+            self.assertFalse(should_restore_on_startup())
+
+    def test_no_checkpoint_after_stop(self):
+        from monitoring.models import SimulatorCheckpoint
+        from monitoring.services.block_simulator import LazyBlockSimulator
+
+        user, farm = seed_farm("stopped", 1, readings=0, alerts=0)
+        sim = LazyBlockSimulator(farm[0])
+        sim.start()
+        sim.stop()
+        SimulatorCheckpoint.objects.filter(block=farm[0]).update(running=False)
+        # A periodic checkpoint racing the stop must not revive the block
+        sim.checkpoint()
+        self.assertFalse(SimulatorCheckpoint.objects.get(block=farm[0]).running)
+
+
+class LineProtocolListenerTests(TransactionTestCase):
+    """UDP and TCP line-protocol ingest over loopback, on ephemeral ports."""
+
+    def line(self, block_id, ts="-"):
+        return f"{block_id} {ts} 30.0 60.0 10.0 80.0 80.0 70.0\n"
+
+    def serve(self, gateways, send):
+        stats = IngestStats()
+        writer = BatchWriter(stats, batch_size=100, flush_interval=0.05)
+        server = LineProtocolServer("127.0.0.1", 0, 0, writer, gateways)
+
+        async def run():
+            await server.start()
+            await asyncio.get_running_loop().run_in_executor(None, send, server)
+            await server.close()
+
+        asyncio.run(run())
+        return stats.snapshot()
+
+    def test_udp_and_tcp(self):
+        user, farm = seed_farm("gateway", 1, readings=0, alerts=0)
+        _, other = seed_farm("neighbour", 1, readings=0, alerts=0)
+        block = farm[0].id
+
+        def send(server):
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.sendto((self.line(block) + self.line(block, time.time() - 3600)).encode(), ("127.0.0.1", server.udp_port))
+            udp.close()
+            with socket.create_connection(("127.0.0.1", server.tcp_port)) as tcp:
+                tcp.sendall((self.line(block) + "garbage\n" + self.line(99999) + self.line(other[0].id)).encode())
+            # Let the event loop receive everything before closing
+            time.sleep(0.3)
+
+        stats = self.serve({"127.0.0.1": user.id}, send)
+        self.assertEqual(stats["received"], 6)
+        self.assertEqual(stats["written"], 2)
+        self.assertEqual(stats["late"], 1)
+        self.assertEqual(stats["malformed"], 1)
+        self.assertEqual(stats["unknown_block"], 1)
+        self.assertEqual(stats["forbidden"], 1)
+        self.assertEqual(SensorData.objects.filter(block_id=block).count(), 2)
+        self.assertFalse(SensorData.objects.filter(block=other[0]).exists())
+
+    def test_unknown_gateway(self):
+        user, farm = seed_farm("gateway", 1, readings=0, alerts=0)
+
+        def send(server):
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.sendto(self.line(farm[0].id).encode(), ("127.0.0.1", server.udp_port))
+            udp.close()
+            time.sleep(0.2)
+
+        stats = self.serve({"192.0.2.1": user.id}, send)
+        self.assertEqual(stats["unauthorized"], 1)
+        self.assertEqual(stats["written"], 0)
+
+    def test_failed_batch_is_retried_per_reading(self):
+        user, farm = seed_farm("gateway", 1, readings=0, alerts=0)
+        stats = IngestStats()
+        writer = BatchWriter(stats)
+        # Resolved earlier, deleted since: its INSERT fails the batch
+        writer._blocks[99999] = FlockBlock(id=99999, user_id=user.id)
+        values = (30.0, 60.0, 10.0, 80.0, 80.0, 70.0)
+        now = time.time()
+        writer.flush([(farm[0].id, now, values, user.id), (99999, now, values, user.id), (farm[0].id, now - 1, values, user.id)])
+        self.assertEqual(stats.written, 2)
+        self.assertEqual(stats.write_errors, 1)
+        self.assertEqual(SensorData.objects.filter(block=farm[0]).count(), 2)
+
+
+class MetricsTests(TestCase):
+    """Thread shards and per-process snapshots do not pile up."""
+
+    def counter(self, name):
+        counter = metrics.Counter(name, "Test counter.")
+        self.addCleanup(metrics.REGISTRY.metrics.remove, counter)
+        return counter
+
+    def test_finished_threads_are_pruned_without_scrape(self):
+        counter = self.counter("test_thread_total")
+        for _ in range(3 * metrics.PRUNE_EVERY):
+            thread = threading.Thread(target=counter.inc)
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(counter._shards), metrics.PRUNE_EVERY)
+        self.assertEqual(counter.collect(), {(): 3 * metrics.PRUNE_EVERY})
+
+    def test_exited_process_snapshots_are_retired(self):
+        counter = self.counter("test_process_total")
+        counter.inc(2)
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            snapshot = os.path.join(directory, f"{dead.pid}.json")
+            for _ in range(2):
+                with open(snapshot, "w") as f:
+                    f.write('{"test_process_total": [[[], 5]]}')
+                metrics.REGISTRY.flush()
+                self.assertFalse(os.path.exists(snapshot))
+            self.assertIn(f"{os.getpid()}.json", os.listdir(directory))
+            self.assertIn("test_process_total 12", metrics.REGISTRY.render())
+
+
+class FailingChannel:
+    """Notification channel whose deliveries always fail."""
+
+    def __init__(self, name, options):
+        self.name = name
+
+    def address(self, user):
+        return user.email
+
+    def send(self, user, alerts):
+        raise ConnectionError("gateway down")
+
+
+@override_settings(
+    ALERT_NOTIFICATION_CHANNELS={
+        "email": {
+            "BACKEND": "monitoring.services.notifications.EmailChannel",
+            "EMAIL_BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+        },
+    },
+    ALERT_NOTIFY_MIN_INTERVAL=60,
+    ALERT_NOTIFY_MAX_PER_SECOND=10,
+)
+class NotificationDispatchTests(TestCase):
+    """One dispatcher pass at a time, with the clock passed in."""
+
+    def setUp(self):
+        self.dispatcher = notifications.NotificationDispatcher()
+        self.user, self.farm = seed_farm("notified", 2, readings=0, alerts=0)
+
+    def raise_alerts(self, count, block=None):
+        alerts = Alert.objects.bulk_create([
+            Alert(user=self.user, block=block or self.farm[i % len(self.farm)],
+                  alert_type="Temperature Alert", message=f"Temperature too high: {35 + i}")
+            for i in range(count)
+        ])
+        notifications.enqueue(alerts)
+        return timezone.now()
+
+    def test_claimed_rows_are_not_claimed_again(self):
+        now = self.raise_alerts(2)
+        claimed = self.dispatcher._claim(now)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(notifications.NotificationDispatcher()._claim(now), [])
+        # Until the lease runs out
+        later = now + timedelta(seconds=notifications.CLAIM_LEASE + 1)
+        self.assertEqual(len(notifications.NotificationDispatcher()._claim(later)), 2)
+
+    def test_alerts_of_a_user_are_coalesced(self):
+        now = self.raise_alerts(3)
+        counts = self.dispatcher.dispatch_once(now=now)
+        self.assertEqual(counts["messages"], 1)
+        self.assertEqual(counts["alerts"], 3)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["notified@example.com"])
+        self.assertIn("3 new alerts in Block 1, Block 2", mail.outbox[0].subject)
+        self.assertEqual(AlertNotification.objects.filter(status=AlertNotification.SENT).count(), 3)
+        self.assertEqual(self.dispatcher.dispatch_once(now=now)["messages"], 0)
+
+    def test_min_interval_defers_and_coalesces(self):
+        self.dispatcher.dispatch_once(now=self.raise_alerts(1))
+        sent_at = AlertNotification.objects.get().sent_at
+        now = self.raise_alerts(2)
+        counts = self.dispatcher.dispatch_once(now=now)
+        self.assertEqual(counts["deferred"], 2)
+        self.assertEqual(len(mail.outbox), 1)
+        pending = AlertNotification.objects.filter(status=AlertNotification.PENDING)
+        self.assertEqual({row.next_attempt_at for row in pending}, {sent_at + timedelta(seconds=60)})
+
+        counts = self.dispatcher.dispatch_once(now=sent_at + timedelta(seconds=61))
+        self.assertEqual((counts["messages"], counts["alerts"]), (1, 2))
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(
+        ALERT_NOTIFICATION_CHANNELS={"pager": {"BACKEND": "monitoring.tests.FailingChannel"}},
+        ALERT_DISPATCH_RETRY_BASE=5.0,
+        ALERT_DISPATCH_MAX_ATTEMPTS=2,
+    )
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        now = self.raise_alerts(1)
+        counts = self.dispatcher.dispatch_once(now=now)
+        self.assertEqual(counts["failed"], 0)
+        row = AlertNotification.objects.get()
+        self.assertEqual((row.status, row.attempts, row.claim), (AlertNotification.PENDING, 1, ""))
+        self.assertEqual(row.last_error, "ConnectionError: gateway down")
+        # First retry after 5 s, with jitter in [0.5, 1)
+        self.assertGreaterEqual(row.next_attempt_at, now + timedelta(seconds=2.5))
+        self.assertLessEqual(row.next_attempt_at, now + timedelta(seconds=5))
+        self.assertEqual(self.dispatcher.dispatch_once(now=now + timedelta(seconds=1))["failed"], 0)
+
+        counts = self.dispatcher.dispatch_once(now=now + timedelta(seconds=5))
+        self.assertEqual(counts["failed"], 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (AlertNotification.FAILED, 2))
+
+    def test_enqueue_finds_keys_bulk_create_left_unset(self):
+        timestamp = timezone.now()
+
+        def alert(block, message="Temperature too high: 35"):
+            return Alert(user=self.user, block=block, timestamp=timestamp,
+                         alert_type="Temperature Alert", message=message)
+
+        earlier = Alert.objects.create(user=self.user, block=self.farm[0], timestamp=timestamp,
+                                       alert_type="Temperature Alert", message="Temperature too high: 35")
+        alerts = Alert.objects.bulk_create([alert(self.farm[0]), alert(self.farm[0]), alert(self.farm[1], "Other")])
+        inserted = [a.pk for a in alerts]
+        # As on backends whose bulk_create does not return primary keys
+        for a in alerts:
+            a.pk = None
+        self.assertEqual(notifications.enqueue(alerts), 3)
+        self.assertEqual([a.pk for a in alerts], inserted)
+        self.assertEqual(sorted(AlertNotification.objects.values_list("alert_id", flat=True)), sorted(inserted))
+        self.assertFalse(AlertNotification.objects.filter(alert=earlier).exists())
+
+    def test_prune_keeps_pending_and_recent_rows(self):
+        self.raise_alerts(4)
+        old = timezone.now() - timedelta(days=31)
+        rows = list(AlertNotification.objects.order_by("id"))
+        for row, status in zip(rows, [AlertNotification.SENT, AlertNotification.FAILED, AlertNotification.PENDING]):
+            AlertNotification.objects.filter(pk=row.pk).update(status=status, created_at=old)
+        AlertNotification.objects.filter(pk=rows[3].pk).update(status=AlertNotification.SENT)
+        self.assertEqual(notifications.prune(), 2)
+        self.assertEqual(sorted(AlertNotification.objects.values_list("id", flat=True)), [rows[2].pk, rows[3].pk])
+
+    def test_backoff_is_capped(self):
+        with override_settings(ALERT_DISPATCH_RETRY_BASE=5.0, ALERT_DISPATCH_RETRY_MAX=60.0):
+            delays = [notifications.NotificationDispatcher.backoff(attempt) for attempt in range(1, 10)]
+        self.assertTrue(all(delay <= 60.0 for delay in delays))
+        self.assertGreaterEqual(delays[-1], 30.0)
+
+
+class AlertBatcherTests(TransactionTestCase):
+    """A failed alert batch loses only the alerts the database rejects."""
+
+    def alert(self, user, block):
+        return Alert(user_id=user.id, block=block, alert_type="Anomaly Alert", message="Temperature anomaly")
+
+    def test_rejected_alert_does_not_drop_the_batch(self):
+        user, farm = seed_farm("batched", 1, readings=0, alerts=0)
+        batcher = AlertBatcher()
+        gone = FlockBlock(id=99999, user_id=user.id)
+        batcher._pending = [self.alert(user, farm[0]), self.alert(user, gone), self.alert(user, farm[0])]
+        self.assertEqual(batcher.flush(), 2)
+        self.assertEqual(batcher._pending, [])
+        self.assertEqual(Alert.objects.filter(block=farm[0]).count(), 2)
+
+    def test_unwritable_alerts_are_kept_for_the_next_flush(self):
+        user, farm = seed_farm("batched", 1, readings=0, alerts=0)
+        batcher = AlertBatcher()
+        batcher._pending = [self.alert(user, farm[0]) for _ in range(3)]
+        with mock.patch.object(AlertBatcher, "_write", side_effect=OperationalError("database is locked")):
+            self.assertEqual(batcher.flush(), 0)
+        self.assertEqual(len(batcher._pending), 3)
+        self.assertEqual(batcher.flush(), 3)
+        self.assertEqual(Alert.objects.filter(block=farm[0]).count(), 3)
+
+    def test_requeued_alerts_are_capped(self):
+        user, farm = seed_farm("batched", 1, readings=0, alerts=0)
+        batcher = AlertBatcher()
+        batcher._pending = [self.alert(user, farm[0]) for _ in range(3)]
+        newest = batcher._pending[1:]
+        with mock.patch.object(AlertBatcher, "_write", side_effect=OperationalError("database is locked")), \
+                mock.patch("monitoring.services.anomaly.MAX_REQUEUED_ALERTS", 2):
+            batcher.flush()
+        self.assertEqual(batcher._pending, newest)
+
+    @override_settings(ANOMALY_FLUSH_INTERVAL=0.01)
+    def test_failing_flush_does_not_stop_the_thread(self):
+        user, farm = seed_farm("batched", 1, readings=0, alerts=0)
+        batcher = AlertBatcher()
+        calls = []
+
+        def flush():
+            calls.append(1)
+            raise RuntimeError("event log unavailable")
+
+        with mock.patch.object(batcher, "flush", side_effect=flush), self.assertLogs("monitoring.anomaly", "ERROR"):
+            batcher.add([self.alert(user, farm[0])])
+            time.sleep(0.2)
+            self.assertTrue(batcher._thread.is_alive())
+            self.assertGreater(len(calls), 1)
+            batcher._pending = []
+
+
+class EventLogTests(TestCase):
+    """Offsets, segments and recovery of the event log, in a temporary directory."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def log(self, **kwargs):
+        return EventLog(self.directory, **kwargs)
+
+    def events(self, start, count):
+        return [{"type": "reading", "n": n} for n in range(start, start + count)]
+
+    def test_offsets(self):
+        log = self.log()
+        self.assertEqual(log.append_many(self.events(0, 3)), 0)
+        self.assertEqual(log.append(self.events(3, 1)[0]), 3)
+        self.assertEqual(log.next_offset, 4)
+        self.assertEqual(log.read(2), [(2, {"type": "reading", "n": 2}), (3, {"type": "reading", "n": 3})])
+        self.assertEqual([offset for offset, _ in log.read(0, limit=2)], [0, 1])
+        # Another instance (process) continues the same sequence
+        self.assertEqual(self.log().append(self.events(4, 1)[0]), 4)
+
+    def test_rolling_and_retention(self):
+        log = self.log(segment_bytes=200, retention_bytes=10**6)
+        for n in range(20):
+            log.append(self.events(n, 1)[0])
+        self.assertGreater(len(log.segments()), 3)
+        self.assertEqual([event["n"] for _, event in log.read(0)], list(range(20)))
+
+        small = self.log(segment_bytes=200, retention_bytes=400)
+        small.append(self.events(20, 1)[0])
+        retained = small.segments()
+        self.assertEqual(retained, log.segments()[-len(retained):])
+        self.assertLess(len(retained), 4)
+        # Reading from a deleted offset starts at the oldest retained event
+        self.assertEqual(small.read(0)[0][0], retained[0])
+
+    def test_retention_on_open_and_by_age(self):
+        log = self.log(segment_bytes=200)
+        for n in range(20):
+            log.append(self.events(n, 1)[0])
+        segments = log.segments()
+        old = time.time() - 2 * 3600
+        for base in segments[:2]:
+            os.utime(os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}"), (old, old))
+
+        self.assertEqual(self.log(segment_bytes=200, retention_hours=1).next_offset, 20)
+        self.assertEqual(self.log().segments(), segments[2:])
+        # Later ones age out without any appends
+        old = time.time() - 2 * 3600
+        os.utime(os.path.join(self.directory, f"{segments[2]:020d}{SEGMENT_SUFFIX}"), (old, old))
+        self.assertEqual(self.log(retention_hours=1).enforce_retention(), 1)
+
+    def test_torn_frame_is_cut_off(self):
+        log = self.log()
+        log.append_many(self.events(0, 3))
+        path = os.path.join(self.directory, f"{0:020d}{SEGMENT_SUFFIX}")
+        intact = os.path.getsize(path)
+        with open(path, "ab") as fh:
+            # Header of a frame whose payload never made it to disk
+            fh.write(b"\x00" * 7 + b"\x03" + b"\x00\x00\x01\x00" + b"{\"type")
+
+        recovered = self.log()
+        self.assertEqual(recovered.next_offset, 3)
+        self.assertEqual(os.path.getsize(path), intact)
+        self.assertEqual(recovered.append(self.events(3, 1)[0]), 3)
+        self.assertEqual([event["n"] for _, event in recovered.read(0)], [0, 1, 2, 3])
+
+    def test_subscription_resumes_after_last_offset(self):
+        log = self.log(segment_bytes=200)
+        log.append_many(self.events(0, 5))
+        seen = list(itertools.islice(log.subscribe(from_offset=0), 3))
+        last = seen[-1][0]
+
+        appender = threading.Timer(0.1, log.append_many, [self.events(5, 3)])
+        appender.start()
+        resumed = []
+        for offset, event in self.log(segment_bytes=200).subscribe(from_offset=last + 1, poll_interval=0.05):
+            resumed.append((offset, event["n"]))
+            if len(resumed) == 5:
+                break
+        appender.join()
+        self.assertEqual(resumed, [(n, n) for n in range(3, 8)])
+
+
+class LazyCatchUpTests(TestCase):
+    """Pages and endpoints reading a user's blocks bring lazy simulators up to date first."""
+
+    def setUp(self):
+        from monitoring.services.block_simulator import discard_simulator_for_block, start_simulator_for_block
+
+        self.user, self.farm = seed_farm("lazy", 2, readings=0, alerts=0)
+        for block in self.farm:
+            sim = start_simulator_for_block(block, lazy=True)
+            sim.started_at -= timedelta(seconds=30)
+            self.addCleanup(discard_simulator_for_block, block.id)
+        self.client.force_login(self.user)
+
+    def assertCaughtUp(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for block in self.farm:
+            self.assertGreaterEqual(SensorData.objects.filter(block=block).count(), 10)
+        return response
+
+    def test_dashboard(self):
+        self.assertCaughtUp("/users/dashboard/")
+
+    def test_data_history(self):
+        self.assertEqual(len(self.assertCaughtUp("/api/data/history/").json()), 22)
+
+    def test_farm_snapshot(self):
+        blocks = self.assertCaughtUp("/api/blocks/snapshot/").json()["blocks"]
+        self.assertTrue(all(block["latest_data"] for block in blocks))
+
+    def test_failed_cleanup_does_not_repeat_the_gap(self):
+        from monitoring.services.block_simulator import running_simulators
+
+        sim = running_simulators.get(self.farm[0].id)
+        now = timezone.now()
+        with mock.patch.object(SensorData, "cleanup_old_data", side_effect=OperationalError("database is locked")):
+            written = sim.catch_up(now=now)
+        self.assertGreaterEqual(written, 10)
+        self.assertEqual(sim.catch_up(now=now), 0)
+        self.assertEqual(SensorData.objects.filter(block=self.farm[0]).count(), written)
+
+
+class SketchTests(TestCase):
+    """DDSketch accuracy and merging, and percentiles over stored and pending sketches."""
+
+    def values(self, n, seed):
+        rng = random.Random(seed)
+        return [rng.lognormvariate(3, 1) for _ in range(n)]
+
+    def sketch(self, values, accuracy=0.01):
+        sketch = sketches.DDSketch(accuracy)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def test_quantiles_within_relative_accuracy(self):
+        for accuracy in (0.01, 0.05):
+            values = self.values(5000, seed=accuracy)
+            sketch = self.sketch(values + [0.0] * 10, accuracy)
+            exact = sorted(values + [0.0] * 10)
+            for q in (0.0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0):
+                with self.subTest(accuracy=accuracy, q=q):
+                    expected = exact[int(q * (len(exact) - 1))]
+                    self.assertLessEqual(abs(sketch.quantile(q) - expected), accuracy * expected)
+        self.assertIsNone(sketches.DDSketch().quantile(0.5))
+
+    def test_merge_equals_sketch_of_union(self):
+        first, second = self.values(1000, seed=1), self.values(500, seed=2)
+        merged = self.sketch(first)
+        stored = self.sketch(second)
+        # Stored state has str bin keys (JSON)
+        merged.merge(stored.count, stored.zero_count, stored.min, stored.max,
+                     {str(index): n for index, n in stored.bins.items()})
+        union = self.sketch(first + second)
+        self.assertEqual(merged.bins, union.bins)
+        self.assertEqual((merged.count, merged.min, merged.max), (union.count, union.min, union.max))
+
+    def readings(self, block, start, count):
+        readings = [
+            SensorData(user=block.user, block=block, timestamp=start + timedelta(seconds=3 * n),
+                       temperature=20.0 + n % 15, humidity=60.0, ammonia=5.0 + n % 7,
+                       feed_level=80.0, water_level=80.0, activity_level=70.0)
+            for n in range(count)
+        ]
+        SensorData.objects.bulk_create(readings)
+        return readings
+
+    def record(self, store, readings):
+        for reading in readings:
+            store.record(reading.block_id, reading.timestamp,
+                         {"temperature": reading.temperature, "ammonia": reading.ammonia})
+
+    def test_percentiles_merge_stored_and_pending(self):
+        user, farm = seed_farm("sketched", 1, readings=0, alerts=0)
+        store = sketches.SketchStore(autoflush=False)
+        start = timezone.now() - timedelta(hours=2)
+        readings = self.readings(farm[0], start, 600)
+        with mock.patch.object(sketches, "sketch_store", store):
+            self.record(store, readings[:400])
+            store.flush()
+            self.record(store, readings[400:])
+            result = sketches.percentiles(farm[0].id, start, timezone.now(), ["temperature"])
+        temperature = result["temperature"]
+        self.assertEqual(temperature["count"], 600)
+        self.assertEqual((temperature["min"], temperature["max"]), (20.0, 34.0))
+        exact = sorted(reading.temperature for reading in readings)
+        self.assertAlmostEqual(temperature["p50"], exact[299], delta=0.01 * exact[299])
+
+    def test_rebuild_does_not_count_pending_sketches_twice(self):
+        user, farm = seed_farm("rebuilt", 1, readings=0, alerts=0)
+        store = sketches.SketchStore(autoflush=False)
+        start = timezone.now() - timedelta(hours=2)
+        readings = self.readings(farm[0], start, 300)
+        with mock.patch.object(sketches, "sketch_store", store), \
+                mock.patch("monitoring.management.commands.rebuild_sketches.sketch_store", store):
+            # Written readings whose sketches are not flushed yet
+            self.record(store, readings)
+            call_command("rebuild_sketches", block=farm[0].id, stdout=StringIO())
+            store.flush()
+            result = sketches.percentiles(farm[0].id, start, timezone.now())
+        self.assertEqual(result["temperature"]["count"], 300)
+        self.assertEqual(result["ammonia"]["count"], 300)
+
+
+class HistoryCacheTests(TestCase):
+    """The incrementally moved window matches a payload encoded from scratch."""
+
+    def setUp(self):
+        self.user, farm = seed_farm("historian", 1, readings=0, alerts=0)
+        self.block = farm[0]
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        self.cache = HistoryCache()
+
+    def write(self, first, count, step=3):
+        SensorData.objects.bulk_create([
+            SensorData(user=self.user, block=self.block,
+                       timestamp=self.start + timedelta(seconds=first + step * n),
+                       temperature=20.0 + n % 15, humidity=60.0 + n % 4, ammonia=5.25 + n % 7,
+                       feed_level=80.0, water_level=80.0 - n % 3, activity_level=70.0)
+            for n in range(count)
+        ])
+
+    def expected(self, start, end):
+        rows = list(
+            SensorData.objects.filter(block=self.block, timestamp__gte=start, timestamp__lte=end)
+            .order_by("timestamp", "id").values_list("timestamp", *HISTORY_METRICS)
+        )
+        payload = json.dumps(encode_columnar(rows), separators=(",", ":"))
+        averages = [
+            sum(round(row[i] * 10) for row in rows) / len(rows) / 10 if rows else 0
+            for i in range(1, len(HISTORY_METRICS) + 1)
+        ]
+        return payload, len(rows), averages
+
+    def assertWindow(self, offset, length):
+        start = self.start + timedelta(seconds=offset)
+        end = start + timedelta(seconds=length)
+        payload, rows, averages = self.cache.get(self.block.id, "1h", start, end)
+        expected_payload, expected_rows, expected_averages = self.expected(start, end)
+        self.assertEqual(payload, expected_payload)
+        self.assertEqual(rows, expected_rows)
+        for average, expected in zip(averages, expected_averages):
+            self.assertAlmostEqual(average, expected)
+        return rows
+
+    def test_moving_window_matches_fresh_encoding(self):
+        self.write(0, 200)
+        self.assertEqual(self.assertWindow(0, 600), 200)
+        # New readings come in while the start slides past the oldest ones
+        self.write(600, 100)
+        self.assertEqual(self.assertWindow(150, 900), 250)
+        self.assertEqual(self.assertWindow(400, 900), 166)
+
+    def test_trims_across_chunk_boundaries(self):
+        with mock.patch("monitoring.services.history_cache.CHUNK_ROWS", 16):
+            self.write(0, 100)
+            self.assertWindow(0, 300)
+            # Whole chunks and part of the next one drop out
+            self.assertWindow(100, 300)
+            self.write(300, 40)
+            self.assertWindow(200, 400)
+            self.assertEqual(self.assertWindow(1000, 10), 0)
+
+    def test_invalidate_picks_up_late_readings(self):
+        self.write(0, 50)
+        self.assertWindow(0, 600)
+        self.write(1, 10, step=5)
+        with self.assertRaises(AssertionError):
+            self.assertWindow(0, 600)
+        self.cache.invalidate(self.block.id, since=self.start)
+        self.assertEqual(self.assertWindow(0, 600), 60)
+
+    def test_entries_expire_after_ttl(self):
+        # A late reading written by another process, whose invalidate
+        # never reaches this cache
+        self.write(0, 50)
+        self.assertWindow(0, 600)
+        self.write(1, 10, step=5)
+        with override_settings(HISTORY_CACHE_TTL=0):
+            self.assertEqual(self.assertWindow(0, 600), 60)
+
+
+class SimulatorProfileTests(TestCase):
+    def setUp(self):
+        user, farm = seed_farm("profiler", 1, readings=0, alerts=0)
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+
+    def test_non_finite_parameters_are_rejected(self):
+        for query in ("interval=inf", "interval=nan", "seconds=inf", "seconds=-inf&interval=0.01", "seconds=abc"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/m/sim/introspect/profile/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_interval_clamped_to_the_run(self):
+        with mock.patch.object(introspection.time, "sleep") as sleep:
+            response = self.client.get("/m/sim/introspect/profile/?seconds=0.05&interval=3600")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sleep.call_args.args, (0.05,))
+        with mock.patch.object(introspection.time, "sleep") as sleep:
+            introspection.sample_simulator_stacks(0.01, 0)
+        self.assertEqual(sleep.call_args.args, (introspection.MIN_PROFILE_INTERVAL,))
+
+
+class HistoryCodecTests(TestCase):
+    """The columnar payload decodes back to the readings, at one decimal."""
+
+    def test_round_trip(self):
+        start = timezone.now().replace(microsecond=0)
+        rng = random.Random(7)
+        rows, offset = [], 0
+        for _ in range(50):
+            offset += rng.choice((0, 1, 3, 3, 60))
+            rows.append((start + timedelta(seconds=offset, microseconds=250_000),
+                         *(round(rng.uniform(-10, 100), 3) for _ in HISTORY_METRICS)))
+
+        decoded = decode_columnar(json.loads(json.dumps(encode_columnar(rows))))
+        self.assertEqual(len(decoded), len(rows))
+        for row, original in zip(decoded, rows):
+            self.assertEqual(row["timestamp"], original[0].replace(microsecond=0))
+            for metric, value in zip(HISTORY_METRICS, original[1:]):
+                self.assertEqual(row[metric], round(value * 10) / 10)
+        self.assertEqual(decode_columnar(encode_columnar([])), [])
+
+    def test_non_finite_values_are_null(self):
+        now = timezone.now()
+        rows = [(now, math.nan, math.inf, -math.inf, None, 1.25, 2.0)]
+        payload = encode_columnar(rows)
+        # Strict JSON: no NaN/Infinity literals
+        text = json.dumps(payload, allow_nan=False)
+        self.assertEqual([series[0] for series in payload["series"].values()], [None, None, None, 0, 12, 20])
+        row = decode_columnar(json.loads(text))[0]
+        self.assertEqual([row[metric] for metric in HISTORY_METRICS], [None, None, None, 0, 1.2, 2.0])
+
+    def test_history_cache_writes_null_for_non_finite_readings(self):
+        user, farm = seed_farm("infinite", 1, readings=3, alerts=0)
+        SensorData.objects.filter(block=farm[0]).update(temperature=math.inf)
+        SensorData.objects.filter(pk=SensorData.objects.filter(block=farm[0]).first().pk).update(temperature=31.0)
+        start, end = timezone.now() - timedelta(hours=1), timezone.now()
+        payload, rows, averages = HistoryCache().get(farm[0].id, "1h", start, end)
+        self.assertEqual(payload, json.dumps(encode_columnar(
+            SensorData.objects.filter(block=farm[0]).order_by("timestamp", "id").values_list("timestamp", *HISTORY_METRICS)
+        ), separators=(",", ":")))
+        self.assertEqual(json.loads(payload)["series"]["temperature"].count(None), 2)
+        # Averages are over the finite values only
+        self.assertEqual((rows, averages[0]), (3, 31.0))
+
+
+SERVER_TIMING = re.compile(r'^total;dur=(\d+\.\d), db;dur=(\d+\.\d);desc="(\d+) queries"$')
+
+
+class RequestProfilingMiddlewareTests(TestCase):
+    """Server-Timing, the per-URL summary and cProfile dumps, under WSGI and ASGI."""
+
+    def setUp(self):
+        self.user, self.farm = seed_farm("profiled", 1, readings=3, alerts=0)
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        reset_profiling_summary()
+        self.addCleanup(reset_profiling_summary)
+
+    def profiles(self):
+        return sorted(os.listdir(self.profile_dir.name))
+
+    def test_server_timing_and_summary(self):
+        self.client.force_login(self.user)
+        queries = []
+        for _ in range(3):
+            response = self.client.get("/api/data/latest/")
+            timing = SERVER_TIMING.match(response["Server-Timing"])
+            self.assertIsNotNone(timing, response["Server-Timing"])
+            queries.append(int(timing[3]))
+        self.assertGreater(min(queries), 0)
+
+        summary = profiling_summary()[response.resolver_match.view_name]
+        self.assertEqual(summary["requests"], 3)
+        self.assertAlmostEqual(summary["avg_queries"], sum(queries) / 3)
+        self.assertLessEqual(summary["p50_ms"], summary["max_ms"])
+        self.assertTrue(summary["slowest_statements"])
+        self.assertLessEqual(len(summary["slowest_statements"]), 5)
+
+    def test_profile_dumped_only_for_staff_or_debug(self):
+        with override_settings(PROFILE_DIR=self.profile_dir.name):
+            self.client.force_login(self.user)
+            self.client.get("/api/data/latest/?_profile=1")
+            self.assertEqual(self.profiles(), [])
+
+            with override_settings(DEBUG=True):
+                self.client.get("/api/data/latest/", HTTP_X_PROFILE="1")
+            self.assertEqual(len(self.profiles()), 1)
+
+            self.user.is_staff = True
+            self.user.save()
+            self.client.get("/api/data/latest/?_profile=1")
+            # Not without the parameter
+            self.client.get("/api/data/latest/")
+        self.assertEqual(len(self.profiles()), 2)
+        self.assertTrue(all(name.endswith(".prof") for name in self.profiles()))
+
+    async def test_async_requests_are_recorded(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/api/data/latest/")
+        self.assertEqual(response.status_code, 200)
+        # A sync view under ASGI: its queries are counted too
+        timing = SERVER_TIMING.match(response["Server-Timing"])
+        self.assertIsNotNone(timing, response["Server-Timing"])
+        self.assertGreater(int(timing[3]), 0)
+        self.assertEqual(profiling_summary()[response.resolver_match.view_name]["requests"], 1)
+
+    async def test_async_view_records_wall_time_only(self):
+        async def get_response(request):
+            request.resolver_match = resolve("/api/data/latest/")
+            return HttpResponse("ok")
+
+        middleware = RequestProfilingMiddleware(get_response)
+        match = mock.Mock(func=async_views.latest_data)
+        with mock.patch("poultry_monitoring.middleware.resolve", return_value=match):
+            response = await middleware(AsyncRequestFactory().get("/api/data/latest/"))
+        self.assertRegex(response["Server-Timing"], r"^total;dur=\d+\.\d$")
+        self.assertEqual(profiling_summary()[resolve("/api/data/latest/").view_name]["avg_queries"], 0)
+
+
+class ScenarioTests(TestCase):
+    """SensorSimulatorBatch reproduces SensorSimulatorCore; results do not depend on chunking."""
+
+    def test_batch_matches_core_step_for_step(self):
+        for scenario in scenario_grid((10, 2000), ("broiler", "kuroiler"), ("adult", "chick")):
+            with self.subTest(**scenario):
+                flock = SimpleNamespace(**scenario)
+                seeds = range(4)
+                batch = SensorSimulatorBatch(flock, [random.Random(seed) for seed in seeds])
+                cores = [SensorSimulatorCore(flock=flock, rng=random.Random(seed)) for seed in seeds]
+                for step in range(300):
+                    # Only some trajectories are stepped now and then
+                    active = [0, 2] if step % 7 == 3 else list(seeds)
+                    batch.step(active)
+                    for i in active:
+                        cores[i].generate_data()
+                    for field in STATE_FIELDS:
+                        self.assertEqual(getattr(batch, field), [getattr(core, field) for core in cores],
+                                         f"{field} after step {step}")
+
+    def test_results_do_not_depend_on_chunk_size(self):
+        scenario = scenario_grid((5000,), ("broiler",), ("adult",))[0]
+        whole = run_chunk(scenario, 0, 12, 2000, seed=3)
+        parts = [run_chunk(scenario, start, count, 2000, seed=3) for start, count in ((0, 5), (5, 5), (10, 2))]
+        for name, _, _, _ in EVENTS:
+            self.assertEqual(sorted(whole[name]), sorted(time for part in parts for time in part[name]))
+        self.assertTrue(whole["feed_level_low"])
+
+        summaries = [
+            run_scenarios([scenario], trajectories=12, days=2000 * 3.0 / 86400, workers=1, chunk_size=size, seed=3)
+            for size in (4, 12)
+        ]
+        self.assertEqual(summaries[0], summaries[1])
+        self.assertEqual(summaries[0][0]["events"]["feed_level_low"]["probability"],
+                         len(whole["feed_level_low"]) / 12)
+
+
+class OnlineStatsTests(TestCase):
+    """Streaming statistics agree with the exact ones over the same readings."""
+
+    def test_welford_matches_statistics(self):
+        rng = random.Random(5)
+        cases = {
+            "gaussian": [rng.gauss(30, 2) for _ in range(5000)],
+            # Large offset, tiny spread: the naive sum-of-squares formula loses it all
+            "offset": [1e9 + rng.random() for _ in range(1000)],
+            "single": [42.0],
+        }
+        for name, values in cases.items():
+            with self.subTest(name):
+                stats = online_stats.RunningStats(alpha=0.1)
+                for value in values:
+                    stats.update(value)
+                result = stats.as_dict()
+                self.assertEqual(result["count"], len(values))
+                self.assertAlmostEqual(result["mean"], statistics.fmean(values), delta=1e-12 * abs(values[0]))
+                expected = statistics.variance(values) if len(values) > 1 else 0.0
+                self.assertAlmostEqual(result["variance"], expected, delta=1e-6 * max(expected, 1e-12))
+                self.assertEqual((result["min"], result["max"], result["last"]), (min(values), max(values), values[-1]))
+
+    def test_snapshot_of_recorded_readings(self):
+        block_id = 987654
+        self.addCleanup(online_stats.forget_block, block_id)
+        start = timezone.now()
+        readings = [{"temperature": 30.0 + n % 5, "feed_level": 100.0 - 0.5 * n} for n in range(50)]
+        for n, reading in enumerate(readings):
+            # Every reading is 6 minutes later: feed falls 5 per hour
+            online_stats.record_reading(block_id, start + timedelta(minutes=6 * n), reading)
+
+        snapshot = online_stats.block_stats_snapshot(block_id)
+        temperature = snapshot["metrics"]["temperature"]
+        values = [reading["temperature"] for reading in readings]
+        self.assertAlmostEqual(temperature["mean"], statistics.fmean(values))
+        self.assertAlmostEqual(temperature["stddev"], statistics.stdev(values))
+        feed = snapshot["metrics"]["feed_level"]
+        self.assertAlmostEqual(feed["trend_per_hour"], -5.0)
+        self.assertAlmostEqual(feed["hours_until_empty"], readings[-1]["feed_level"] / 5.0)
+        self.assertEqual(snapshot["metrics"]["humidity"]["count"], 0)
+
+        online_stats.forget_block(block_id)
+        self.assertIsNone(online_stats.block_stats_snapshot(block_id))
+
+
+class BlockSignalTests(TestCase):
+    """Editing or deleting a FlockBlock reaches its simulator and in-memory state."""
+
+    def setUp(self):
+        self.user, farm = seed_farm("signalled", 1, readings=5, alerts=0)
+        self.block = farm[0]
+        self.sim = start_simulator_for_block(self.block, lazy=True)
+        self.addCleanup(running_simulators.stop, self.block.id)
+
+    def test_edit_reconfigures_the_simulator(self):
+        # As the edit view does: a fresh instance, not the simulator's
+        block = FlockBlock.objects.get(pk=self.block.pk)
+        block.breed = "layer"
+        block.number_of_birds = 500
+        with self.captureOnCommitCallbacks(execute=True):
+            block.save()
+        self.assertIs(running_simulators.get(self.block.id), self.sim)
+        self.assertEqual((self.sim.block.breed, self.sim.core.flock.number_of_birds), ("layer", 500))
+        # Moved to the layer baseline
+        self.assertEqual((self.sim.core.temperature, self.sim.core.humidity), (28.0, 60.0))
+
+    def test_delete_stops_the_simulator_and_clears_state(self):
+        block_id = self.block.id
+        store, cache = sketches.SketchStore(autoflush=False), HistoryCache()
+        now = timezone.now()
+        reading = {metric: 50.0 for metric in HISTORY_METRICS}
+        online_stats.record_reading(block_id, now, reading)
+        anomaly.detector.observe(block_id, reading)
+        store.record(block_id, now, reading)
+        cache.get(block_id, "1h", now - timedelta(hours=1), now)
+
+        with mock.patch("monitoring.signals.sketch_store", store), \
+                mock.patch("monitoring.signals.history_cache", cache), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.block.delete()
+
+        self.assertFalse(is_running(SimpleNamespace(id=block_id)))
+        self.assertIsNone(online_stats.block_stats_snapshot(block_id))
+        self.assertNotIn(block_id, anomaly.detector._blocks)
+        self.assertFalse([key for key in store._pending if key[0] == block_id])
+        self.assertFalse([key for key in cache._entries if key[0] == block_id])
+
+
+class FarmSnapshotTests(TestCase):
+    """The snapshot reports each block's newest reading, open alerts and running state."""
+
+    def setUp(self):
+        self.user, self.farm = seed_farm("snapshot", 3, readings=4, alerts=2)
+        seed_farm("neighbour", 1, readings=4, alerts=2)
+        # A newer reading per block, the third block has none at all
+        self.newest = {}
+        for n, block in enumerate(self.farm[:2]):
+            self.newest[block.id] = SensorData.objects.create(
+                user=self.user, block=block, timestamp=timezone.now() + timedelta(seconds=n + 1),
+                temperature=31.5 + n, humidity=61.0, ammonia=12.0,
+                feed_level=75.0, water_level=74.0, activity_level=69.0,
+            )
+        SensorData.objects.filter(block=self.farm[2]).delete()
+        Alert.objects.filter(pk=Alert.objects.filter(block=self.farm[0]).first().pk).update(resolved=True)
+        self.client.force_login(self.user)
+
+    def test_snapshot_content(self):
+        sim = start_simulator_for_block(self.farm[1], lazy=True)
+        self.addCleanup(running_simulators.stop, self.farm[1].id)
+        response = self.client.get("/api/blocks/snapshot/")
+        self.assertEqual(response.status_code, 200)
+        blocks = response.json()["blocks"]
+        self.assertEqual([entry["block_id"] for entry in blocks], [block.id for block in self.farm])
+
+        first, second, third = blocks
+        self.assertEqual(first, {
+            "block_id": self.farm[0].id,
+            "block_name": "Block 1",
+            "number_of_birds": 10,
+            "breed": "broiler",
+            "age_group": "adult",
+            "is_running": False,
+            "open_alerts": 1,
+            "latest_data": json.loads(JSONRenderer().render(SensorDataSerializer(self.newest[self.farm[0].id]).data)),
+        })
+        self.assertTrue(second["is_running"])
+        self.assertEqual(second["open_alerts"], 2)
+        # The view catches lazy simulators up first; the newest reading after that
+        self.assertEqual(second["latest_data"]["id"], SensorData.objects.filter(block=self.farm[1]).latest("timestamp").id)
+        self.assertEqual((third["latest_data"], third["open_alerts"]), (None, 2))
+        self.assertIs(sim, running_simulators.get(self.farm[1].id))
+
+    def test_ids_filter(self):
+        response = self.client.get(f"/api/blocks/snapshot/?ids={self.farm[2].id},{self.farm[0].id}")
+        self.assertEqual([entry["block_id"] for entry in response.json()["blocks"]], [self.farm[0].id, self.farm[2].id])
+        other = FlockBlock.objects.exclude(user=self.user).get()
+        self.assertEqual(self.client.get(f"/api/blocks/snapshot/?ids={other.id}").json()["blocks"], [])
+        self.assertEqual(self.client.get("/api/blocks/snapshot/?ids=1,x").status_code, 400)
+
+
+class AsyncViewParityTests(TestCase):
+    """The async read views answer like the DRF views: same status, JSON and ETag."""
+
+    def setUp(self):
+        self.user, self.farm = seed_farm("parity", 2, readings=5, alerts=3)
+        self.other, other_farm = seed_farm("parity-other", 1, readings=1, alerts=1)
+        self.foreign_block = other_farm[0]
+
+    def responses(self, path, view, user, headers=None, **kwargs):
+        """(DRF view response, async view response) for GET ``path`` as ``user``."""
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+        sync_response = self.client.get(path, headers=headers)
+
+        request = AsyncRequestFactory().get(path, headers=headers)
+
+        async def auser():
+            return user or AnonymousUser()
+        request.auser = auser
+        return sync_response, async_to_sync(view)(request, **kwargs)
+
+    def assertSameResponse(self, path, view, user=None, headers=None, status=200, **kwargs):
+        sync_response, async_response = self.responses(path, view, user, headers, **kwargs)
+        self.assertEqual((sync_response.status_code, async_response.status_code), (status, status), path)
+        if status != 304:
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), path)
+        if status == 200:
+            self.assertEqual(async_response["Content-Type"].split(";")[0], sync_response["Content-Type"].split(";")[0])
+        self.assertEqual(async_response.get("ETag"), sync_response.get("ETag"), path)
+        return sync_response
+
+    def cases(self):
+        block = self.farm[0]
+        return [
+            ("/api/data/latest/", async_views.latest_data, {}),
+            (f"/api/data/latest/?block_id={block.id}", async_views.latest_data, {}),
+            ("/api/data/history/", async_views.data_history, {}),
+            (f"/api/data/history/?block={block.id}", async_views.data_history, {}),
+            (f"/api/data/history/?block={block.id}&format=columnar", async_views.data_history, {}),
+            ("/api/alerts/", async_views.alerts, {}),
+            (f"/api/sim/status/{block.id}/", async_views.simulation_status, {"block_id": block.id}),
+        ]
+
+    def test_same_json(self):
+        for path, view, kwargs in self.cases():
+            with self.subTest(path=path):
+                self.assertSameResponse(path, view, self.user, **kwargs)
+
+    def test_same_not_modified(self):
+        revalidated = []
+        for path, view, kwargs in self.cases():
+            etag = self.assertSameResponse(path, view, self.user, **kwargs).get("ETag")
+            if etag is None:
+                # data_history has no validator
+                continue
+            with self.subTest(path=path):
+                self.assertSameResponse(path, view, self.user, {"If-None-Match": etag}, status=304, **kwargs)
+            revalidated.append(view)
+        self.assertEqual(len(revalidated), 4)
+
+    def test_same_errors(self):
+        foreign = self.foreign_block.id
+        for path, view, user, status, kwargs in [
+            ("/api/data/latest/?block_id=abc", async_views.latest_data, self.user, 400, {}),
+            ("/api/data/history/?block=abc", async_views.data_history, self.user, 400, {}),
+            (f"/api/sim/status/{foreign}/", async_views.simulation_status, self.user, 404, {"block_id": foreign}),
+        ] + [(path, view, None, 403, kwargs) for path, view, kwargs in self.cases()]:
+            with self.subTest(path=path, status=status):
+                self.assertSameResponse(path, view, user, status=status, **kwargs)
+
+
+class MetricDetectorTests(TestCase):
+    """Spikes and sustained shifts fire; warmup and cooldown keep the detector quiet."""
+
+    PARAMS = dict(alpha=0.05, z_threshold=5.0, slack=1.0, cusum_threshold=12.0, warmup=30, cooldown=20)
+
+    def feed(self, detector, changes, **params):
+        """Feed a walk with the given changes; returns [(index, result)] of the anomalies."""
+        params = dict(self.PARAMS, **params)
+        value = detector.last
+        if value is None:
+            value = 50.0
+            detector.update(value, **params)
+        found = []
+        for index, change in enumerate(changes):
+            value += change
+            result = detector.update(value, **params)
+            if result is not None:
+                found.append((index, result))
+        return found
+
+    def noise(self, n, seed=1, drift=0.0):
+        rng = random.Random(seed)
+        return [drift + rng.gauss(0, 0.2) for _ in range(n)]
+
+    def test_quiet_on_noise(self):
+        self.assertEqual(self.feed(anomaly.MetricDetector(), self.noise(2000)), [])
+
+    def test_spike_fires(self):
+        detector = anomaly.MetricDetector()
+        self.feed(detector, self.noise(100))
+        found = self.feed(detector, [8.0] + self.noise(5, seed=2))
+        self.assertEqual(len(found), 1)
+        index, (kind, z) = found[0]
+        self.assertEqual((index, kind), (0, "spike"))
+        self.assertGreater(z, self.PARAMS["z_threshold"])
+
+    def test_sustained_shift_fires_cusum(self):
+        zigzag = [-0.2, 0.2]
+        for drift, expected in ((0.75, "shift up"), (-0.75, "shift down")):
+            with self.subTest(drift=drift):
+                detector = anomaly.MetricDetector()
+                self.feed(detector, zigzag * 50, cusum_threshold=8.0)
+                # The mean change moves by less than a spike and stays there
+                found = self.feed(detector, [drift + change for change in zigzag * 15], cusum_threshold=8.0)
+                self.assertTrue(found)
+                index, (kind, z) = found[0]
+                self.assertEqual(kind, expected)
+                self.assertLess(abs(z), self.PARAMS["z_threshold"])
+
+    def test_nothing_fires_during_warmup(self):
+        detector = anomaly.MetricDetector()
+        changes = self.noise(self.PARAMS["warmup"] - 5)
+        changes[10] = 8.0
+        self.assertEqual(self.feed(detector, changes), [])
+
+    def test_cooldown_keeps_it_quiet(self):
+        detector = anomaly.MetricDetector()
+        self.feed(detector, self.noise(100))
+        cooldown = self.PARAMS["cooldown"]
+        changes = self.noise(cooldown + 10, seed=5)
+        changes[0] = 8.0
+        # A second spike inside the cooldown, a third after it
+        changes[cooldown // 2] = -8.0
+        changes[cooldown + 5] = 8.0
+        found = self.feed(detector, changes)
+        self.assertEqual([(index, kind) for index, (kind, _) in found], [(0, "spike"), (cooldown + 5, "spike")])
+
+
+class LoadtestCommandTests(TransactionTestCase):
+    """Argument checks, poller setup failures and what counts as a successful request."""
+
+    def run_loadtest(self, **options):
+        report = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        report.close()
+        self.addCleanup(os.unlink, report.name)
+        stdout, stderr = StringIO(), StringIO()
+        options = {"users": 1, "blocks_per_user": 1, "pollers": 2, "duration": 0.2, "interval": 0.1,
+                   "no_simulators": True, "json_path": report.name, **options}
+        try:
+            call_command("loadtest", stdout=stdout, stderr=stderr, **options)
+        finally:
+            self.stderr = stderr.getvalue()
+        with open(report.name) as f:
+            return json.load(f)
+
+    def test_invalid_arguments(self):
+        for options in ({"users": 0}, {"blocks_per_user": 0}, {"pollers": 0}, {"duration": 0},
+                        {"duration": math.inf}, {"interval": -1}, {"think": -0.5}, {"seed_rows": -1}):
+            with self.subTest(**options), self.assertRaises(CommandError):
+                call_command("loadtest", stdout=StringIO(), **options)
+        self.assertFalse(FlockBlock.objects.exists())
+
+    def test_only_2xx_and_304_count_as_ok(self):
+        statuses = {"dashboard": 302, "latest_data": 304, "history_detail": 500}
+
+        def get(transport, url):
+            name = next(name for name, pattern, _ in loadtest.ENDPOINTS if url.startswith(pattern.split("{")[0]))
+            return statuses.get(name, 200)
+
+        with mock.patch.object(loadtest._ClientTransport, "get", get):
+            report = self.run_loadtest()
+        endpoints = report["endpoints"]
+        self.assertTrue(endpoints["dashboard"]["requests"] and endpoints["latest_data"]["requests"])
+        for name, row in endpoints.items():
+            if row["requests"]:
+                expected = 0.0 if statuses.get(name, 200) in (200, 304) else 1.0
+                self.assertEqual(row["error_rate"], expected, name)
+        self.assertEqual(report["poller_setup_failures"], 0)
+        # Synthetic users are removed afterwards
+        self.assertFalse(FlockBlock.objects.exists())
+
+    def test_poller_setup_failures_are_reported(self):
+        real_init = loadtest._ClientTransport.__init__
+        calls = itertools.count()
+
+        def init(transport, user, host):
+            if next(calls) == 0:
+                raise ConnectionRefusedError("no server")
+            real_init(transport, user, host)
+
+        with mock.patch.object(loadtest._ClientTransport, "__init__", init), \
+                mock.patch.object(loadtest._ClientTransport, "get", return_value=200):
+            report = self.run_loadtest()
+        self.assertEqual(report["poller_setup_failures"], 1)
+        self.assertIn("1 of 2 pollers could not start", self.stderr)
+        self.assertIn("ConnectionRefusedError: no server", self.stderr)
+        self.assertGreater(report["total_requests"], 0)
+
+        with mock.patch.object(loadtest._ClientTransport, "__init__", side_effect=RuntimeError("broken")), \
+                self.assertRaisesMessage(CommandError, "No poller could start"):
+            self.run_loadtest()
+        self.assertIn("2 of 2 pollers could not start", self.stderr)
+
+
+class DataHistoryParameterTests(TestCase):
+    """?block= of data_history must be a block id."""
+
+    def setUp(self):
+        self.user, self.farm = seed_farm("history", 2, readings=5, alerts=0)
+        self.client.force_login(self.user)
+
+    def test_block_filter(self):
+        response = self.client.get(f"/api/data/history/?block={self.farm[0].id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row["block"] for row in response.json()}, {self.farm[0].id})
+
+    def test_invalid_block_is_rejected(self):
+        for block in ("abc", "1.5", "1;2"):
+            with self.subTest(block=block):
+                response = self.client.get(f"/api/data/history/?block={block}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "block must be a block id"})
+
+    async def test_invalid_block_is_rejected_by_async_view(self):
+        from monitoring import async_views
+
+        request = AsyncRequestFactory().get("/api/data/history/", {"block": "abc"})
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        response = await async_views.data_history(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertJSONEqual(response.content, {"error": "block must be a block id"})
+
+
+class LatestDataParameterTests(TestCase):
+    """?block_id= of latest_data must be a block id, before validators and catch-up see it."""
+
+    def setUp(self):
+        self.user, self.farm = seed_farm("latest", 2, readings=3, alerts=0)
+        self.client.force_login(self.user)
+
+    def test_block_filter(self):
+        response = self.client.get(f"/api/data/latest/?block_id={self.farm[0].id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["block"], self.farm[0].id)
+
+    def test_invalid_block_id_is_rejected(self):
+        with mock.patch("monitoring.views.catch_up") as catch_up:
+            response = self.client.get("/api/data/latest/?block_id=abc")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "block_id must be a block id"})
+        catch_up.assert_not_called()
+
+    async def test_invalid_block_id_is_rejected_by_async_view(self):
+        from monitoring import async_views
+
+        request = AsyncRequestFactory().get("/api/data/latest/", {"block_id": "abc"})
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        response = await async_views.latest_data(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertJSONEqual(response.content, {"error": "block_id must be a block id"})
+
+
+class IngestApiTests(TestCase):
+    """POST /api/ingest/readings/: per-item statuses, duplicates and idempotency keys."""
+
+    url = "/api/ingest/readings/"
+
+    def setUp(self):
+        recent_keys.clear()
+        self.user, self.farm = seed_farm("ingesting", 2, readings=0, alerts=0)
+        self.client.force_login(self.user)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def reading(self, block, seconds_ago=0, **values):
+        item = {
+            "block": block.id, "ts": (self.now - timedelta(seconds=seconds_ago)).isoformat(),
+            "temperature": 30.0, "humidity": 60.0, "ammonia": 10.0,
+            "feed_level": 80.0, "water_level": 80.0, "activity_level": 70.0,
+        }
+        item.update(values)
+        return item
+
+    def post(self, items, content_type="application/json"):
+        if isinstance(items, str):
+            body = items
+        elif "ndjson" in content_type:
+            body = "\n".join(json.dumps(item) for item in items)
+        else:
+            body = json.dumps(items)
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def test_batch_is_created(self):
+        response = self.post([self.reading(self.farm[0], 6), self.reading(self.farm[0], 3), self.reading(self.farm[1])])
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result["created"], result["duplicates"], result["rejected"]), (3, 0, 0))
+        self.assertEqual([item["status"] for item in result["items"]], ["created"] * 3)
+        self.assertEqual(SensorData.objects.filter(block=self.farm[0]).count(), 2)
+        self.assertEqual(SensorData.objects.get(block=self.farm[1]).timestamp, self.now)
+
+    def test_duplicates_in_batch_and_stored(self):
+        first = self.post([self.reading(self.farm[0]), self.reading(self.farm[0])]).json()
+        self.assertEqual((first["created"], first["duplicates"]), (1, 1))
+        self.assertEqual(first["items"][1], {"index": 1, "status": "duplicate"})
+        again = self.post([self.reading(self.farm[0]), self.reading(self.farm[1])]).json()
+        self.assertEqual((again["created"], again["duplicates"]), (1, 1))
+        self.assertEqual(SensorData.objects.count(), 2)
+
+    def test_idempotency_key(self):
+        retried = self.reading(self.farm[0], key="gw1-000173")
+        del retried["ts"]
+        self.assertEqual(self.post([retried]).json()["created"], 1)
+        # A retry without a timestamp gets a new server time: only the key tells
+        self.assertEqual(self.post([retried]).json()["duplicates"], 1)
+        # Keys are per block
+        self.assertEqual(self.post([{**retried, "block": self.farm[1].id}]).json()["created"], 1)
+        self.assertEqual(SensorData.objects.count(), 2)
+
+    def test_partial_success(self):
+        other, other_farm = seed_farm("neighbour", 1, readings=0, alerts=0)
+        response = self.post([
+            self.reading(self.farm[0]),
+            self.reading(other_farm[0]),
+            self.reading(self.farm[0], 3, humidity=120.0),
+            self.reading(self.farm[0], ts="yesterday"),
+            self.reading(self.farm[0], -3600),
+            self.reading(self.farm[0], 3, temperature="hot", key="k" * 101),
+            5,
+        ])
+        self.assertEqual(response.status_code, 207)
+        result = response.json()
+        self.assertEqual((result["created"], result["rejected"]), (1, 6))
+        errors = {item["index"]: item.get("errors") for item in result["items"]}
+        self.assertIsNone(errors[0])
+        self.assertEqual(errors[1], ["Unknown block"])
+        self.assertEqual(errors[2], ["humidity: must be between 0 and 100"])
+        self.assertEqual(errors[3], ["Invalid timestamp"])
+        self.assertEqual(errors[4], ["Timestamp is in the future"])
+        self.assertEqual(errors[5], ["temperature: a number is required", "key: must be a string of at most 100 characters"])
+        self.assertEqual(errors[6], ["Expected an object"])
+        self.assertEqual(SensorData.objects.count(), 1)
+        self.assertFalse(SensorData.objects.filter(block=other_farm[0]).exists())
+
+    def test_ndjson_with_unreadable_line(self):
+        body = json.dumps(self.reading(self.farm[0])) + "\n{not json\n\n" + json.dumps(self.reading(self.farm[1]))
+        response = self.post(body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 207)
+        result = response.json()
+        self.assertEqual((result["created"], result["rejected"]), (2, 1))
+        self.assertTrue(result["items"][1]["errors"][0].startswith("Invalid JSON"))
+
+    def test_unreadable_batches_are_rejected(self):
+        for body in ("not json", "[]", '{"gateway": 1}', "5"):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        with override_settings(INGEST_MAX_BATCH=2):
+            response = self.post([self.reading(self.farm[0], n) for n in range(3)])
+        self.assertEqual(response.json(), {"error": "At most 2 readings per batch"})
+        with override_settings(INGEST_MAX_BODY_BYTES=100):
+            self.assertEqual(self.post([self.reading(self.farm[0])]).status_code, 413)
+        self.assertFalse(SensorData.objects.exists())
+        self.client.logout()
+        self.assertEqual(self.post([self.reading(self.farm[0])]).status_code, 403)
+
+
+class FastSerializerTests(TestCase):
+    """The fast serializers render exactly what the ModelSerializers render."""
+
+    def test_same_json_as_model_serializers(self):
+        user, farm = seed_farm("serialized", 2, readings=3, alerts=2)
+        Alert.objects.create(
+            user=user, block=farm[0], alert_type="Custom Alert", resolved=True,
+            message='Quote " backslash \\ new\nline, ünïcode ✓, line\u2028and paragraph\u2029separators',
+        )
+        SensorData.objects.filter(pk=SensorData.objects.earliest("id").pk).update(temperature=30.25, humidity=0)
+        readings = SensorData.objects.order_by("-timestamp")
+        alerts = Alert.objects.order_by("-timestamp")
+        cases = (
+            (FastSensorDataSerializer, SensorDataSerializer, readings),
+            (FastAlertSerializer, AlertSerializer, alerts),
+        )
+        for fast, model, queryset in cases:
+            with self.subTest(serializer=fast.__name__):
+                expected = JSONRenderer().render(model(queryset, many=True).data)
+                self.assertEqual(fast(queryset).json().encode(), expected)
+                self.assertEqual(fast(queryset).data, json.loads(expected))
+
+    def test_non_finite_floats_are_null(self):
+        row = (1, timezone.now(), math.nan, math.inf, -math.inf, 80.0, 80.0, 70.0, 1, 1)
+        serializer = FastSensorDataSerializer(SensorData.objects.none())
+        with mock.patch.object(serializer, "rows", return_value=[row]):
+            # parse_constant rejects NaN / Infinity literals
+            parsed = json.loads(serializer.json(), parse_constant=lambda name: self.fail(f"{name} in JSON"))
+            data = serializer.data
+        for item in (parsed[0], data[0]):
+            self.assertEqual((item["temperature"], item["humidity"], item["ammonia"]), (None, None, None))
+            self.assertEqual(item["feed_level"], 80.0)
+
+
+class _FakeSimulator:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.started = False
+        self.stops = 0
+
+    def start(self):
+        # Long enough for concurrent starts to find it still starting
+        time.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("cannot start")
+        self.started = True
+
+    def stop(self):
+        self.stops += 1
+
+    def is_alive(self):
+        return self.started and not self.stops
+
+
+class SimulatorRegistryTests(TestCase):
+    """Concurrent starts and stops through SimulatorRegistry."""
+
+    def concurrently(self, func, threads=8):
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+
+        def run(n):
+            barrier.wait()
+            results[n] = func()
+
+        workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_start_once(self):
+        registry = SimulatorRegistry()
+        sim, started = registry.start(1, _FakeSimulator)
+        self.assertTrue(started)
+        self.assertTrue(sim.started)
+        self.assertEqual(registry.start("1", _FakeSimulator), (sim, False))
+        self.assertIs(registry.get(1), sim)
+        self.assertTrue(registry.is_running(1))
+        self.assertEqual(registry.keys(), ["1"])
+
+    def test_concurrent_starts_give_one_simulator(self):
+        registry = SimulatorRegistry()
+        results = self.concurrently(lambda: registry.start(7, _FakeSimulator))
+        self.assertEqual(sum(started for _, started in results), 1)
+        self.assertEqual(len({id(sim) for sim, _ in results}), 1)
+        self.assertEqual(len(registry), 1)
+
+    def test_concurrent_stops_stop_once(self):
+        registry = SimulatorRegistry()
+        sim, _ = registry.start(3, _FakeSimulator)
+        results = self.concurrently(lambda: registry.stop(3))
+        self.assertEqual([result for result in results if result is not None], [sim])
+        self.assertEqual(sim.stops, 1)
+        self.assertNotIn(3, registry)
+        self.assertIsNone(registry.stop(3))
+
+    def test_failed_start_is_discarded(self):
+        registry = SimulatorRegistry()
+        with self.assertRaises(RuntimeError):
+            registry.start(4, lambda: _FakeSimulator(fail=True))
+        self.assertNotIn(4, registry)
+        self.assertTrue(registry.start(4, _FakeSimulator)[1])
+
+    def test_dead_simulator_is_replaced(self):
+        registry = SimulatorRegistry()
+        dead, _ = registry.start(5, _FakeSimulator)
+        dead.started = False
+        sim, started = registry.start(5, _FakeSimulator)
+        self.assertTrue(started)
+        self.assertIsNot(sim, dead)
+        # Only the entry's own thread may discard it
+        registry.discard(5, dead)
+        self.assertIs(registry.get(5), sim)
+
+    def test_bulk_start_and_stop(self):
+        from monitoring.models import SimulatorCheckpoint
+        from monitoring.services.block_simulator import running_simulators, start_simulators, stop_simulators
+
+        user, farm = seed_farm("bulk", 3, readings=0, alerts=0)
+        ids = [block.id for block in farm]
+        self.addCleanup(stop_simulators, ids)
+        self.assertEqual(start_simulators(farm, lazy=True), ids)
+        self.assertEqual(start_simulators(farm, lazy=True), [])
+        self.assertTrue(all(running_simulators.is_running(block_id) for block_id in ids))
+        self.assertEqual(stop_simulators(ids[:2]), ids[:2])
+        self.assertEqual(stop_simulators(ids[:2]), [])
+        self.assertEqual(
+            dict(SimulatorCheckpoint.objects.values_list("block_id", "running")),
+            {ids[0]: False, ids[1]: False, ids[2]: True},
+        )
@@ -1,13 +1,23 @@
 # monitoring/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# The polled read endpoints, as DRF views or as native async views (ASGI)
+read_views = async_views if getattr(settings, 'ASYNC_READ_API', False) else views
 
 urlpatterns = [
     # API endpoints
-    path('data/latest/', views.latest_data, name='latest-data'),
-    path('data/history/', views.data_history, name='data-history'),
-    path('alerts/', views.alerts, name='alerts'),
-    path('sim/status/<int:block_id>/', views.simulation_status, name='simulation_status'),
+    path('data/latest/', read_views.latest_data, name='latest-data'),
+    path('data/history/', read_views.data_history, name='data-history'),
+    path('alerts/', read_views.alerts, name='alerts'),
+    path('sim/status/<int:block_id>/', read_views.simulation_status, name='simulation_status'),
+    path('blocks/snapshot/', views.farm_snapshot, name='farm-snapshot'),
+    path('blocks/<int:block_id>/stats/', views.block_stats, name='block-stats'),
+    path('blocks/<int:block_id>/percentiles/', views.block_percentiles, name='block-percentiles'),
+    path('ingest/readings/', views.ingest_readings, name='ingest-readings'),
+    path('sim/introspect/', views.simulator_introspection, name='simulator_introspection'),
+    path('sim/introspect/profile/', views.simulator_profile, name='simulator_profile'),
     
     # Live simulation page
     path("live/<int:block_id>/", views.live_simulation, name="live"),
@@ -19,6 +29,8 @@ urlpatterns = [
     # Original simulation controls (redirects to referrer)
     path("sim/start/<int:block_id>/", views.start_block_sim, name="start_sim"),
     path("sim/stop/<int:block_id>/", views.stop_block_sim, name="stop_sim"),
+    path("sim/start-all/", views.start_all_sims, name="start_all_sims"),
+    path("sim/stop-all/", views.stop_all_sims, name="stop_all_sims"),
     
     # History views
     path("history/", views.history_blocks, name="history_blocks"),
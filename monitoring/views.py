@@ -1,30 +1,85 @@
 # monitoring/views.py
 
-import json
 import logging
 from datetime import timedelta
+from functools import wraps
 
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from flock.models import FlockBlock
 from monitoring.models import SensorData, Alert
-from monitoring.serializers import SensorDataSerializer, AlertSerializer
+from monitoring.serializers import (
+    SensorDataSerializer,
+    FastSensorDataSerializer,
+    FastAlertSerializer,
+)
+from monitoring.renderers import ColumnarJSONRenderer
+from monitoring.etags import revalidate, latest_data_etag, alerts_etag, simulation_status_etag
+from monitoring.services.history_codec import HISTORY_METRICS, encode_columnar
+from monitoring.services.snapshot import build_farm_snapshot
+from monitoring.services.singleflight import read_coalescer
+from monitoring.services.online_stats import block_stats_snapshot
+from monitoring.services.sketches import percentiles as sketch_percentiles
+from monitoring.services.history_cache import history_cache
+from monitoring.services import ingest, introspection
 from monitoring.services.block_simulator import (
     start_simulator_for_block,
     stop_simulator_for_block,
+    start_simulators,
+    stop_simulators,
     is_running,
+    catch_up,
+    catch_up_user,
 )
 
 logger = logging.getLogger("monitoring.views")
 
 
+def _block_id_param(view):
+    """
+    Parse the optional ``?block_id=`` into ``request.block_id`` (None when
+    absent) and answer 400 when it is not a block id. Place it above
+    ``@_catches_up`` and ``@revalidate``, which read ``request.block_id``.
+    """
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        block_id = request.GET.get('block_id')
+        try:
+            request.block_id = int(block_id) if block_id else None
+        except ValueError:
+            return Response({'error': 'block_id must be a block id'}, status=400)
+        return view(request, *args, **kwargs)
+    return inner
+
+
+def _catches_up(view):
+    """
+    Bring lazily simulated blocks up to date before ``view`` (and its ETag
+    validator) reads them: the ``block_id`` URL kwarg or the parsed
+    ``?block_id=`` (see ``_block_id_param``), else all of the user's
+    blocks. Place it above ``@revalidate``.
+    """
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        block_id = kwargs.get('block_id') or getattr(request, 'block_id', None)
+        if block_id:
+            catch_up(block_id, user=request.user)
+        else:
+            catch_up_user(request.user)
+        return view(request, *args, **kwargs)
+    return inner
+
+
 # -----------------------------
 # Live Simulation
 # -----------------------------
@@ -108,11 +163,14 @@ def live_simulation(request, block_id):
         messages.error(request, f"Error: {str(e)}")
         return redirect('dashboard')
     
+    # Lazily simulated blocks synthesize the readings since the last visit
+    catch_up(block.id)
+    
     # Get the latest sensor data for initial display
     latest_data = SensorData.objects.filter(block=block).order_by('-timestamp').first()
     
-    # Get active alerts
-    active_alerts = Alert.objects.filter(block=block, resolved=False).order_by('-timestamp')[:10]
+    # Get active alerts (evaluated once; the template slices and counts them)
+    active_alerts = list(Alert.objects.filter(block=block, resolved=False).order_by('-timestamp')[:10])
     
     # Check if simulator is running
     simulator_running = is_running(block)
@@ -150,7 +208,7 @@ def start_simulation_live(request, block_id):
 
 # monitoring/views.py - Update the AJAX views
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
@@ -217,6 +275,8 @@ def stop_simulation_live(request, block_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@_catches_up
+@revalidate(simulation_status_etag)
 def simulation_status(request, block_id):
     """
     API endpoint to check if simulation is running for a block.
@@ -228,18 +288,112 @@ def simulation_status(request, block_id):
         # Get latest data if simulation is running
         latest_data = None
         if is_running_status:
-            latest_data = SensorData.objects.filter(block=block).order_by('-timestamp').first()
+            latest_data = read_coalescer.do(
+                ('block-latest', block.id, request.etag),
+                lambda: _serialize_latest(SensorData.objects.filter(block=block)),
+            )
         
         return Response({
             'is_running': is_running_status,
             'block_id': block_id,
             'block_name': block.name,
-            'latest_data': SensorDataSerializer(latest_data).data if latest_data else None
+            'latest_data': latest_data
         })
     except FlockBlock.DoesNotExist:
         return Response({'error': 'Block not found'}, status=404)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@_catches_up
+def block_stats(request, block_id):
+    """
+    Streaming statistics of a block (EWMA, mean, variance, min/max per
+    sensor value; trend and time until empty for feed and water), kept in
+    memory by the simulator. Does not query SensorData.
+    """
+    if not FlockBlock.objects.filter(id=block_id, user=request.user).exists():
+        return Response({'error': 'Block not found'}, status=404)
+
+    stats = block_stats_snapshot(block_id)
+    return Response({
+        'block_id': block_id,
+        'updated_at': stats['updated_at'] if stats else None,
+        'metrics': stats['metrics'] if stats else {},
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@_catches_up
+def block_percentiles(request, block_id):
+    """
+    Percentiles of a block's sensor values over ?range= (same options as
+    history_detail, default 24h), merged from the stored sketches.
+    ?metrics=temperature,ammonia and ?q=0.5,0.95,0.99 pick what to return.
+    """
+    if not FlockBlock.objects.filter(id=block_id, user=request.user).exists():
+        return Response({'error': 'Block not found'}, status=404)
+
+    metrics_param = request.query_params.get('metrics')
+    metric_names = [m.strip() for m in metrics_param.split(',') if m.strip()] if metrics_param else None
+    unknown = set(metric_names or ()) - set(HISTORY_METRICS)
+    if unknown:
+        return Response({'error': f"Unknown metrics: {', '.join(sorted(unknown))}"}, status=400)
+    try:
+        quantiles = [float(q) for q in request.query_params.get('q', '0.5,0.95,0.99').split(',') if q.strip()]
+    except ValueError:
+        return Response({'error': 'q must be a comma-separated list of numbers between 0 and 1'}, status=400)
+    if not quantiles or not all(0 <= q <= 1 for q in quantiles):
+        return Response({'error': 'q must be a comma-separated list of numbers between 0 and 1'}, status=400)
+
+    range_option = request.query_params.get('range', '24h')
+    time_range = calculate_time_range(range_option)
+    return Response({
+        'block_id': block_id,
+        'range': range_option,
+        'start': time_range['start'],
+        'end': time_range['end'],
+        'metrics': sketch_percentiles(block_id, time_range['start'], time_range['end'], metric_names, quantiles),
+    })
+
+
+# -----------------------------
+# Simulator Introspection (staff only)
+# -----------------------------
+@staff_member_required
+def simulator_introspection(request):
+    """
+    JSON report of every running simulator: thread state, last tick,
+    average / p99 tick duration, error count and tracemalloc memory.
+    ?tracemalloc=start|stop toggles memory tracing (it slows allocations).
+    """
+    action = request.GET.get('tracemalloc')
+    if action == 'start':
+        introspection.start_memory_tracing()
+    elif action == 'stop':
+        introspection.stop_memory_tracing()
+    return JsonResponse(introspection.simulator_report())
+
+
+@staff_member_required
+def simulator_profile(request):
+    """
+    Sample simulator thread stacks for ?seconds=N (default 5, max 30) and
+    return a flamegraph-compatible collapsed-stack file.
+    """
+    try:
+        seconds = float(request.GET.get('seconds', 5))
+        interval = float(request.GET.get('interval', 0.005))
+        collapsed = introspection.sample_simulator_stacks(seconds, interval)
+    except ValueError:
+        return JsonResponse({'error': 'seconds and interval must be finite numbers'}, status=400)
+
+    response = HttpResponse(collapsed, content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="simulators.collapsed"'
+    return response
+
+
 # -----------------------------
 # Simulator Controls
 # -----------------------------
@@ -265,40 +419,188 @@ def stop_block_sim(request, block_id):
     return redirect(request.META.get("HTTP_REFERER", "monitoring:dashboard"))
 
 
+def _requested_blocks(request):
+    """
+    The user's blocks named by ``block_ids`` (repeated or comma-separated
+    POST values), or all of them when none are given.
+    """
+    blocks = FlockBlock.objects.filter(user=request.user).select_related('user').order_by('id')
+    ids = [part for value in request.POST.getlist('block_ids') for part in value.split(',') if part.strip()]
+    if ids:
+        if not all(part.strip().isdigit() for part in ids):
+            return None
+        blocks = blocks.filter(id__in=[int(part) for part in ids])
+    return list(blocks)
+
+
+@require_POST
+@login_required
+def start_all_sims(request):
+    """
+    Start the simulators of all the user's blocks (or of ``block_ids``) in
+    one request; their ticks are staggered over one interval.
+    """
+    blocks = _requested_blocks(request)
+    if blocks is None:
+        return JsonResponse({'success': False, 'error': 'block_ids must be block ids'}, status=400)
+    started = start_simulators(blocks)
+    return JsonResponse({
+        'success': True,
+        'started': started,
+        'already_running': [block.id for block in blocks if block.id not in started and is_running(block)],
+    })
+
+
+@require_POST
+@login_required
+def stop_all_sims(request):
+    """Stop the simulators of all the user's blocks (or of ``block_ids``) in one request."""
+    blocks = _requested_blocks(request)
+    if blocks is None:
+        return JsonResponse({'success': False, 'error': 'block_ids must be block ids'}, status=400)
+    return JsonResponse({'success': True, 'stopped': stop_simulators(block.id for block in blocks)})
+
+
 # -----------------------------
 # API Endpoints (DRF)
 # -----------------------------
+def _fast_list_response(request, serializer, coalesce_key=None):
+    """
+    Return a FastValuesSerializer result, writing the JSON text directly for
+    plain JSON clients and going through DRF rendering otherwise (e.g. the
+    browsable API). With a coalesce_key, concurrent identical JSON requests
+    share one query through read_coalescer.
+    """
+    if request.accepted_renderer.format == 'json':
+        if coalesce_key is not None:
+            body = read_coalescer.do(coalesce_key, serializer.json)
+        else:
+            body = serializer.json()
+        return HttpResponse(body, content_type='application/json')
+    return Response(serializer.data)
+
+
+def _serialize_latest(queryset):
+    """Serialized newest reading of ``queryset``, or None."""
+    latest = queryset.order_by('-timestamp').first()
+    return SensorDataSerializer(latest).data if latest else None
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@_block_id_param
+@_catches_up
+@revalidate(latest_data_etag)
 def latest_data(request):
     """
     Return the latest sensor reading for the logged-in user.
+    Optionally restricted to one block with ?block_id=<id>.
     """
-    latest = SensorData.objects.filter(user=request.user).first()
-    serializer = SensorDataSerializer(latest)
-    return Response(serializer.data)
+    qs = SensorData.objects.filter(user=request.user)
+    block_id = request.block_id
+    if block_id:
+        qs = qs.filter(block_id=block_id)
+
+    data = read_coalescer.do(
+        ('user-latest', request.user.pk, block_id, request.etag),
+        lambda: _serialize_latest(qs),
+    )
+    if data is None:
+        data = SensorDataSerializer(None).data
+    return Response(data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer])
+@_catches_up
 def data_history(request):
     """
     Return the last 200 sensor readings for the logged-in user.
+    Optionally filtered to one block with ?block=<id>.
+
+    With ?format=columnar the readings are returned oldest-first in the
+    compact columnar encoding (see services/history_codec.py) with an
+    extra "block" column of block ids.
     """
-    qs = SensorData.objects.filter(user=request.user).order_by('-timestamp')[:200]
-    serializer = SensorDataSerializer(qs, many=True)
-    return Response(serializer.data)
+    qs = SensorData.objects.filter(user=request.user).order_by('-timestamp')
+    block_id = request.query_params.get('block')
+    if block_id:
+        try:
+            block_id = int(block_id)
+        except ValueError:
+            return Response({'error': 'block must be a block id'}, status=400)
+        qs = qs.filter(block_id=block_id)
+    qs = qs[:200]
+
+    fmt = request.accepted_renderer.format
+    coalesce_key = ('data-history', request.user.pk, block_id, fmt)
+
+    if fmt == ColumnarJSONRenderer.format:
+        def build_columnar():
+            rows = list(qs.values_list('timestamp', 'block_id', *HISTORY_METRICS))
+            rows.reverse()
+            payload = encode_columnar((row[0],) + row[2:] for row in rows)
+            payload['block'] = [row[1] for row in rows]
+            return payload
+        return Response(read_coalescer.do(coalesce_key, build_columnar))
+
+    return _fast_list_response(request, FastSensorDataSerializer(qs), coalesce_key)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@revalidate(alerts_etag)
 def alerts(request):
     """
     Return the latest unresolved alerts for the logged-in user.
     """
     qs = Alert.objects.filter(user=request.user, resolved=False).order_by('-timestamp')[:50]
-    serializer = AlertSerializer(qs, many=True)
-    return Response(serializer.data)
+    return _fast_list_response(request, FastAlertSerializer(qs))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@_catches_up
+def farm_snapshot(request):
+    """
+    Return latest reading, running state and open-alert count for all of the
+    logged-in user's blocks, or only those listed in ?ids=1,2,3.
+    """
+    block_ids = None
+    ids_param = request.query_params.get('ids')
+    if ids_param:
+        try:
+            block_ids = [int(i) for i in ids_param.split(',') if i.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of block ids'}, status=400)
+
+    return Response({
+        'generated_at': timezone.now(),
+        'blocks': build_farm_snapshot(request.user, block_ids),
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ingest_readings(request):
+    """
+    Bulk ingest for sensor gateways: a JSON array of readings (or NDJSON with
+    Content-Type: application/x-ndjson) for any of the user's blocks.
+    Returns counts and a status per item; 207 when some were rejected.
+    See monitoring/services/ingest.py for the item format.
+    """
+    max_bytes = getattr(settings, 'INGEST_MAX_BODY_BYTES', 16 * 1024 * 1024)
+    # Read the stream directly: request.body stops at DATA_UPLOAD_MAX_MEMORY_SIZE
+    body = request.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        return Response({'error': f'Body larger than {max_bytes} bytes'}, status=413)
+    try:
+        items = ingest.parse_batch(body, request.content_type or '')
+    except ingest.IngestError as exc:
+        return Response({'error': str(exc)}, status=400)
+
+    result = ingest.ingest(request.user, items)
+    return Response(result, status=207 if result['rejected'] else 200)
 
 # -----------------------------
 # History Pages
@@ -346,6 +648,38 @@ def calculate_time_range(range_option):
     return {'start': start, 'end': end}
 
 
+HISTORY_RANGES = ('1h', '6h', '12h', '24h', '7d', '30d')
+
+
+def _load_history(block, range_option):
+    """
+    Read the block's readings for the range and prepare the chart payload,
+    per-metric averages and percentiles for history_detail.
+    """
+    if range_option not in HISTORY_RANGES:
+        range_option = '24h'
+    time_range = calculate_time_range(range_option)
+    
+    # Only the readings newer than the cached window are read; the rows that
+    # slid out of the range are dropped from its head
+    history_json, data_points, averages = history_cache.get(
+        block.id, range_option, time_range['start'], time_range['end'],
+    )
+    
+    return {
+        'history_json': history_json,
+        'data_points': data_points,
+        'averages': averages,
+        # p50/p95/p99 from the stored sketches rather than sorting the rows
+        'percentiles': sketch_percentiles(block.id, time_range['start'], time_range['end']),
+    }
+
+
+def _hours_until_empty(block_id, metric):
+    stats = block_stats_snapshot(block_id)
+    return stats['metrics'][metric]['hours_until_empty'] if stats else None
+
+
 @login_required
 def history_detail(request, block_id):
     """
@@ -354,41 +688,17 @@ def history_detail(request, block_id):
     """
    
     block = get_object_or_404(FlockBlock, id=block_id, user=request.user)
+    catch_up(block.id)
     
     # Get time range from request
     range_option = request.GET.get('range', '24h')
     
-    # Calculate time range
-    time_range = calculate_time_range(range_option)  # Implement this function
-    
-    # Get historical data
-    history = SensorData.objects.filter(
-        block=block,
-        timestamp__gte=time_range['start'],
-        timestamp__lte=time_range['end']
-    ).order_by('timestamp')
-    
-    # Prepare data
-    history_data = [{
-        'timestamp': h.timestamp.isoformat(),
-        'temperature': float(h.temperature) if h.temperature else 0,
-        'humidity': float(h.humidity) if h.humidity else 0,
-        'ammonia': float(h.ammonia) if h.ammonia else 0,
-        'feed_level': float(h.feed_level) if h.feed_level else 0,
-        'water_level': float(h.water_level) if h.water_level else 0,
-        'activity_level': float(h.activity_level) if h.activity_level else 0,
-    } for h in history]
-    
-    # Calculate averages
-    if history_data:
-        avg_temperature = sum(h['temperature'] for h in history_data) / len(history_data)
-        avg_humidity = sum(h['humidity'] for h in history_data) / len(history_data)
-        avg_ammonia = sum(h['ammonia'] for h in history_data) / len(history_data)
-        avg_feed = sum(h['feed_level'] for h in history_data) / len(history_data)
-        avg_water = sum(h['water_level'] for h in history_data) / len(history_data)
-        avg_activity = sum(h['activity_level'] for h in history_data) / len(history_data)
-    else:
-        avg_temperature = avg_humidity = avg_ammonia = avg_feed = avg_water = avg_activity = 0
+    # Concurrent viewers of the same block and range share one computation
+    history = read_coalescer.do(
+        ('history', block.id, range_option),
+        lambda: _load_history(block, range_option),
+    )
+    avg_temperature, avg_humidity, avg_ammonia, avg_feed, avg_water, avg_activity = history['averages']
     
     # Range options for template
     range_options = [
@@ -401,16 +711,21 @@ def history_detail(request, block_id):
     
     return render(request, "monitoring/history_detail.html", {
         'block': block,
-        'history_json': json.dumps(history_data),
+        'history_json': history['history_json'],
         'range_option': range_option,
         'range_options': range_options,
-        'data_points': len(history_data),
+        'data_points': history['data_points'],
         'avg_temperature': avg_temperature,
         'avg_humidity': avg_humidity,
         'avg_ammonia': avg_ammonia,
         'avg_feed': avg_feed,
         'avg_water': avg_water,
         'avg_activity': avg_activity,
+        'temperature_percentiles': history['percentiles'].get('temperature'),
+        'ammonia_percentiles': history['percentiles'].get('ammonia'),
+        # Current trend from the in-memory block statistics (None when not simulated here)
+        'feed_hours_until_empty': _hours_until_empty(block.id, 'feed_level'),
+        'water_hours_until_empty': _hours_until_empty(block.id, 'water_level'),
     })
 
 
@@ -430,6 +745,7 @@ import io
 def export_history_csv(request, block_id):
     """Export historical data as CSV"""
     block = get_object_or_404(FlockBlock, id=block_id, user=request.user)
+    catch_up(block.id)
     
     # Get time range from request
     range_option = request.GET.get('range', '24h')
@@ -467,6 +783,7 @@ def export_history_csv(request, block_id):
 def export_history_pdf(request, block_id):
     """Export historical data as PDF report"""
     block = get_object_or_404(FlockBlock, id=block_id, user=request.user)
+    catch_up(block.id)
     
     # Get time range from request
     range_option = request.GET.get('range', '24h')
@@ -0,0 +1,234 @@
+# poultry_monitoring/middleware.py
+import cProfile
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from monitoring.services.metrics import REQUEST_DURATION
+
+# Requests kept per URL name for the rolling percentiles
+SUMMARY_WINDOW = 200
+# Slowest statements kept per request / per URL name
+SLOWEST_STATEMENTS = 5
+
+PROFILE_QUERY_PARAM = "_profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+# Numbers the dumps, so two in the same second do not overwrite each other
+_profile_ids = itertools.count(1)
+
+
+class _QueryRecorder:
+    """connection.execute_wrapper that times every SQL statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            self.slowest.append((elapsed, sql))
+            if len(self.slowest) > SLOWEST_STATEMENTS * 4:
+                self._trim()
+
+    def _trim(self):
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[SLOWEST_STATEMENTS:]
+
+    def top(self):
+        self._trim()
+        return self.slowest
+
+
+class _UrlStats:
+    __slots__ = ("count", "total_time", "max_time", "total_queries", "total_db_time", "recent", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_queries = 0
+        self.total_db_time = 0.0
+        self.recent = deque(maxlen=SUMMARY_WINDOW)
+        self.slowest = []
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000 if recent else 0.0
+
+        return {
+            "requests": self.count,
+            "avg_ms": self.total_time / self.count * 1000,
+            "max_ms": self.max_time * 1000,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "avg_queries": self.total_queries / self.count,
+            "avg_db_ms": self.total_db_time / self.count * 1000,
+            "slowest_statements": [
+                {"ms": elapsed * 1000, "sql": sql[:500]} for elapsed, sql in self.slowest
+            ],
+        }
+
+
+_summary_lock = threading.Lock()
+_summary = {}
+
+
+def profiling_summary():
+    """Rolling per-URL-name request statistics recorded by RequestProfilingMiddleware."""
+    with _summary_lock:
+        return {name: stats.as_dict() for name, stats in sorted(_summary.items())}
+
+
+def reset_profiling_summary():
+    with _summary_lock:
+        _summary.clear()
+
+
+class RequestProfilingMiddleware:
+    """
+    Record wall time, SQL query count, SQL time and the slowest statements
+    for every request.
+
+    The numbers are returned in a ``Server-Timing`` header and folded into a
+    rolling in-memory summary per URL name (see ``profiling_summary``).
+
+    Adding ``?_profile=1`` or an ``X-Profile: 1`` header runs the request
+    under cProfile and writes a ``.prof`` file to ``PROFILE_DIR``. This is
+    only honoured for staff users, or for anyone when DEBUG is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profile_dir = Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = _QueryRecorder()
+        profiler = cProfile.Profile() if self._profile_requested(request) else None
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        elapsed = time.perf_counter() - started
+
+        url_name = self._url_name(request)
+        response["Server-Timing"] = (
+            f'total;dur={elapsed * 1000:.1f}, '
+            f'db;dur={recorder.total * 1000:.1f};desc="{recorder.count} queries"'
+        )
+        self._record(url_name, elapsed, recorder)
+        REQUEST_DURATION.observe(elapsed, view=url_name)
+
+        if profiler is not None:
+            self._dump_profile(profiler, url_name)
+        return response
+
+    async def __acall__(self, request):
+        """
+        Under ASGI. Sync views run in the request's sync thread, so the SQL
+        wrappers are installed there; async views query from worker threads
+        the wrappers cannot reach, so only their wall time is recorded.
+        cProfile is not available here.
+        """
+        recorder = _QueryRecorder()
+        stack = None
+        if not self._is_async_view(request):
+            stack = await sync_to_async(self._wrap_connections)(recorder)
+
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if stack is not None:
+                await sync_to_async(stack.close)()
+        elapsed = time.perf_counter() - started
+
+        url_name = self._url_name(request)
+        response["Server-Timing"] = f'total;dur={elapsed * 1000:.1f}'
+        if stack is not None:
+            response["Server-Timing"] += f', db;dur={recorder.total * 1000:.1f};desc="{recorder.count} queries"'
+        self._record(url_name, elapsed, recorder)
+        REQUEST_DURATION.observe(elapsed, view=url_name)
+        return response
+
+    @staticmethod
+    def _wrap_connections(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    @staticmethod
+    def _is_async_view(request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
+
+    def _profile_requested(self, request):
+        if request.GET.get(PROFILE_QUERY_PARAM) != "1" and request.META.get(PROFILE_HEADER) != "1":
+            return False
+        if settings.DEBUG:
+            return True
+        user = getattr(request, "user", None)
+        return bool(user and user.is_staff)
+
+    @staticmethod
+    def _url_name(request):
+        match = getattr(request, "resolver_match", None)
+        return match.view_name if match is not None else "<unresolved>"
+
+    @staticmethod
+    def _record(url_name, elapsed, recorder):
+        with _summary_lock:
+            stats = _summary.get(url_name)
+            if stats is None:
+                stats = _summary[url_name] = _UrlStats()
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.total_queries += recorder.count
+            stats.total_db_time += recorder.total
+            stats.recent.append(elapsed)
+            stats.slowest = sorted(
+                stats.slowest + recorder.top(), key=lambda item: item[0], reverse=True,
+            )[:SLOWEST_STATEMENTS]
+
+    def _dump_profile(self, profiler, url_name):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in url_name)
+        path = self.profile_dir / f"{safe_name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_ids)}.prof"
+        profiler.dump_stats(str(path))
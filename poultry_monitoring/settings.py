@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
     'users.middleware.FlockSetupMiddleware',
+    'poultry_monitoring.middleware.RequestProfilingMiddleware',
 ]
 
 AUTHENTICATION_BACKENDS = [
@@ -121,6 +123,11 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Runs the suites with the notification dispatcher and the event log turned
+# off (poultry_monitoring/testing.py)
+TEST_RUNNER = 'poultry_monitoring.testing.TestRunner'
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
@@ -131,6 +138,111 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# cProfile dumps written by RequestProfilingMiddleware (?_profile=1)
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Per-process metric snapshots merged by /metrics. Set to a shared directory
+# when running several worker processes; None keeps metrics in-process only.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5.0
+
+# "threads": every started block runs a BlockSimulatorThread writing every few
+# seconds. "lazy": started blocks are only simulated when viewed, catching up
+# on the gap since their last reading (at most LAZY_SIMULATION_MAX_GAP seconds).
+SIMULATION_MODE = "threads"
+LAZY_SIMULATION_MAX_GAP = 24 * 60 * 60
+
+# Simulator state is checkpointed every SIMULATOR_CHECKPOINT_INTERVAL seconds.
+# On startup, simulators that were running are restored after
+# SIMULATOR_RESTORE_DELAY seconds, spread over SIMULATOR_RESTORE_SPREAD seconds.
+# Set SIMULATOR_RESTORE_ON_STARTUP=1 in the environment of the server
+# processes only, not of management commands; with runserver, pass
+# --noreload so its autoreloader process does not restore them as well.
+SIMULATOR_CHECKPOINT_INTERVAL = 60.0
+SIMULATOR_RESTORE_ON_STARTUP = os.environ.get("SIMULATOR_RESTORE_ON_STARTUP") == "1"
+SIMULATOR_RESTORE_DELAY = 2.0
+SIMULATOR_RESTORE_SPREAD = 3.0
+
+# In-memory per-block statistics (monitoring/services/online_stats.py)
+ONLINE_STATS_EWMA_ALPHA = 0.1
+ONLINE_STATS_TREND_WINDOW = 100
+
+# Streaming anomaly detection (monitoring/services/anomaly.py)
+ANOMALY_EWMA_ALPHA = 0.05
+ANOMALY_Z_THRESHOLD = 5.0
+ANOMALY_CUSUM_SLACK = 1.0
+ANOMALY_CUSUM_THRESHOLD = 12.0
+ANOMALY_WARMUP = 30
+ANOMALY_COOLDOWN = 100
+ANOMALY_FLUSH_INTERVAL = 1.0
+
+# Percentile sketches per block and time bucket (monitoring/services/sketches.py)
+SKETCH_METRICS = ("temperature", "ammonia")
+SKETCH_BUCKET_SECONDS = 300
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_FLUSH_INTERVAL = 10.0
+
+# Incremental history_detail cache per block and range (monitoring/services/history_cache.py)
+HISTORY_CACHE_MAX_ENTRIES = 256
+HISTORY_CACHE_MAX_ROWS = 1_000_000
+# Seconds before a cached window is rebuilt, so readings written late by
+# another process show up (LINE_INGEST_MAX_LATENESS)
+HISTORY_CACHE_TTL = 300.0
+
+# Bulk ingest API for sensor gateways (monitoring/services/ingest.py)
+INGEST_MAX_BATCH = 50000
+INGEST_MAX_BODY_BYTES = 16 * 1024 * 1024
+INGEST_MAX_CLOCK_SKEW = 300
+INGEST_MAX_AGE_DAYS = 30
+INGEST_KEY_WINDOW = 100_000
+
+# Line-protocol listener, `manage.py ingest_listener` (monitoring/services/line_protocol.py)
+LINE_INGEST_BATCH_SIZE = 5000
+LINE_INGEST_FLUSH_INTERVAL = 1.0
+LINE_INGEST_MAX_QUEUE = 100_000
+LINE_INGEST_MAX_LATENESS = 300.0
+# Source address -> username whose blocks that gateway may write to
+LINE_INGEST_GATEWAYS = {}
+
+# Append-only event log of readings and alerts (monitoring/services/event_log.py)
+EVENT_LOG_ENABLED = True
+EVENT_LOG_DIR = BASE_DIR / 'eventlog'
+EVENT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024
+EVENT_LOG_RETENTION_BYTES = 1024 * 1024 * 1024
+EVENT_LOG_RETENTION_HOURS = 24 * 7
+EVENT_LOG_RETENTION_INTERVAL = 300.0
+EVENT_LOG_FSYNC = False
+
+# Alert notifications (monitoring/services/notifications.py). Channels are
+# delivered by a dispatcher thread in each process that raises alerts; set
+# ALERT_DISPATCH_IN_PROCESS = False to leave it to `manage.py dispatch_notifications`.
+ALERT_NOTIFICATIONS_ENABLED = True
+ALERT_NOTIFICATION_CHANNELS = {
+    "email": {
+        "BACKEND": "monitoring.services.notifications.EmailChannel",
+        "EMAIL_BACKEND": "django.core.mail.backends.filebased.EmailBackend",
+        "FILE_PATH": BASE_DIR / "sent_mail",
+    },
+    # "webhook": {
+    #     "BACKEND": "monitoring.services.notifications.WebhookChannel",
+    #     "URL": "http://127.0.0.1:9000/alerts",
+    # },
+}
+ALERT_NOTIFY_MIN_INTERVAL = 60        # seconds between two messages to a user per channel
+ALERT_NOTIFY_MAX_PER_SECOND = 10      # messages per channel and process
+ALERT_DISPATCH_IN_PROCESS = True
+ALERT_DISPATCH_INTERVAL = 2.0
+ALERT_DISPATCH_BATCH = 500
+ALERT_DISPATCH_MAX_ATTEMPTS = 8
+ALERT_DISPATCH_RETRY_BASE = 5.0
+ALERT_DISPATCH_RETRY_MAX = 900.0
+ALERT_NOTIFICATION_RETENTION_DAYS = 30
+
+# Serve the polled read endpoints (latest data, history, alerts, simulation
+# status) with the native async views in monitoring/async_views.py. Only
+# useful under an ASGI server (poultry_monitoring/asgi.py).
+ASYNC_READ_API = False
+
 
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
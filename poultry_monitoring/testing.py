@@ -0,0 +1,114 @@
+# poultry_monitoring/testing.py
+"""Shared helpers for the test suites in each app's tests.py and the benchmarks."""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from flock.models import FlockBlock
+from monitoring.models import SensorData, Alert
+from monitoring.services.history_cache import history_cache
+from monitoring.services.notifications import dispatcher
+from monitoring.services.singleflight import read_coalescer
+
+# Background work that must not run against a test database: the
+# notification dispatcher thread would compete with the test for SQLite
+# locks and deliver through the configured channels, and test readings
+# would be appended to the real event log
+ISOLATED_SETTINGS = {
+    "ALERT_DISPATCH_IN_PROCESS": False,
+    "EVENT_LOG_ENABLED": False,
+}
+
+# Farm sizes every budget is checked against
+FARM_SIZES = (1, 3, 12)
+READINGS_PER_BLOCK = 30
+ALERTS_PER_BLOCK = 8
+
+
+def seed_farm(username, blocks, readings=READINGS_PER_BLOCK, alerts=ALERTS_PER_BLOCK):
+    """Create a user with ``blocks`` FlockBlocks, each with readings and open alerts."""
+    user = User.objects.create_user(username, f"{username}@example.com", "password")
+    now = timezone.now()
+    farm = [
+        FlockBlock.objects.create(user=user, name=f"Block {i + 1}", breed="broiler", age_group="adult")
+        for i in range(blocks)
+    ]
+    SensorData.objects.bulk_create([
+        SensorData(
+            user=user, block=block, timestamp=now - timedelta(seconds=3 * (readings - n)),
+            temperature=30.0, humidity=60.0, ammonia=10.0,
+            feed_level=80.0, water_level=80.0, activity_level=70.0,
+        )
+        for block in farm for n in range(readings)
+    ])
+    Alert.objects.bulk_create([
+        Alert(user=user, block=block, alert_type="Temperature Alert", message="Temperature too high: 35")
+        for block in farm for _ in range(alerts)
+    ])
+    return user, farm
+
+
+@contextmanager
+def isolated_background_work():
+    """Apply ISOLATED_SETTINGS for the block; stop the dispatcher on exit."""
+    with override_settings(**ISOLATED_SETTINGS):
+        try:
+            yield
+        finally:
+            dispatcher.stop()
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner that runs the suite under ``isolated_background_work``."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolation = isolated_background_work()
+        self._isolation.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolation.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """
+    assertQueryBudget fails with the captured SQL when a request issues
+    more queries than its budget.
+    """
+
+    def setUp(self):
+        super().setUp()
+        read_coalescer.clear()
+        history_cache.clear()
+
+    def assertQueryBudget(self, budget, url, status=200, **extra):
+        read_coalescer.clear()
+        history_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, status, f"GET {url} returned {response.status_code}")
+        if len(ctx.captured_queries) > budget:
+            sql = "\n".join(
+                f"{n}. {query['sql']}" for n, query in enumerate(ctx.captured_queries, start=1)
+            )
+            self.fail(f"GET {url} ran {len(ctx.captured_queries)} queries, budget is {budget}:\n{sql}")
+        return response
+
+    def assertBudgetForAllFarmSizes(self, budget, url_for, status=200):
+        """
+        Check ``budget`` for a user with each of FARM_SIZES blocks (and a
+        matching number of readings per block). ``url_for(farm)`` builds the
+        URL from the user's list of blocks.
+        """
+        for size in FARM_SIZES:
+            with self.subTest(blocks=size):
+                # Larger farms also get longer histories per block
+                user, farm = seed_farm(f"budget{size}", size, readings=READINGS_PER_BLOCK * size)
+                self.client.force_login(user)
+                self.assertQueryBudget(budget, url_for(farm), status=status)
@@ -1,15 +1,17 @@
 # poultry_monitoring/urls.py
 from django.contrib import admin
 from django.urls import path, include
-from .views import home
+from .views import home, metrics_view, profiling_summary_view
 from django.conf import settings
 
 urlpatterns = [
+    path('admin/profiling/', profiling_summary_view, name='profiling-summary'),
     path('admin/', admin.site.urls),
     path('api/', include('monitoring.urls')),  # For API endpoints
     path('m/', include('monitoring.urls')),     # For web views
     path("users/", include("users.urls")),
     path("flock/", include("flock.urls")),
+    path('metrics', metrics_view, name='metrics'),
     path('', home, name='home'),
 ]
 
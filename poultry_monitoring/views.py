@@ -1,5 +1,21 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render 
 
+from monitoring.services.metrics import REGISTRY
+from .middleware import profiling_summary
+
 
 def home(request):
-    return render(request, "home.html")
\ No newline at end of file
+    return render(request, "home.html")
+
+
+@staff_member_required
+def profiling_summary_view(request):
+    """Rolling per-URL request timings from RequestProfilingMiddleware."""
+    return JsonResponse(profiling_summary())
+
+
+def metrics_view(request):
+    """Prometheus text exposition of simulator, ingest and request metrics."""
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,35 @@
+// history_codec.js - Decoder for the columnar history payload
+// (see monitoring/services/history_codec.py for the format)
+window.PGHistory = (function() {
+
+  // Turn a columnar payload into { timestamps: [Date], series: { metric: [Number] }, length };
+  // null values (not finite when encoded) stay null, i.e. gaps in the chart
+  function decode(payload) {
+    if (!payload || !payload.dt) {
+      return { timestamps: [], series: {}, length: 0 };
+    }
+
+    const length = payload.dt.length;
+    const timestamps = new Array(length);
+    let ts = payload.base;
+    for (let i = 0; i < length; i++) {
+      ts += payload.dt[i];
+      timestamps[i] = new Date(ts * 1000);
+    }
+
+    const scale = payload.scale || 1;
+    const series = {};
+    Object.keys(payload.series || {}).forEach(metric => {
+      const raw = payload.series[metric];
+      const values = new Array(raw.length);
+      for (let i = 0; i < raw.length; i++) {
+        values[i] = raw[i] === null ? null : raw[i] / scale;
+      }
+      series[metric] = values;
+    });
+
+    return { timestamps: timestamps, series: series, length: length };
+  }
+
+  return { decode: decode };
+})();
@@ -1,52 +1,67 @@
 # users/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
 from flock.models import FlockBlock
 
 class FlockSetupMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    # Define paths that don't require flock setup
+    allowed_paths = [
+        '/flock/setup/',  # Setup page itself
+        '/flock/create/',  # Create block page
+        '/logout/',        # Logout
+        '/profile/',       # Profile page
+        '/api/',           # API endpoints (if any)
+    ]
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
+    # The check runs here rather than in process_view: under ASGI a sync
+    # process_view costs every request (async API views included) a thread hop
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        # Skip if user is not authenticated
-        if not request.user.is_authenticated:
-            return None
-        
-        # Define paths that don't require flock setup
-        allowed_paths = [
-            '/flock/setup/',  # Setup page itself
-            '/flock/create/',  # Create block page
-            '/logout/',        # Logout
-            '/profile/',       # Profile page
-            '/api/',           # API endpoints (if any)
-        ]
-        
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Skip allowed paths before touching request.user
+        if not self._is_allowed(request) and request.user.is_authenticated:
+            # Check if user has flock blocks
+            if not FlockBlock.objects.filter(user=request.user).exists() and not self._on_setup_page(request):
+                return self._setup_redirect(request)
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._is_allowed(request):
+            user = await request.auser()
+            if user.is_authenticated and not await FlockBlock.objects.filter(user=user).aexists() and not self._on_setup_page(request):
+                return self._setup_redirect(request)
+
+        return await self.get_response(request)
+
+    def _is_allowed(self, request):
         # Check if current path is allowed
-        if any(request.path.startswith(path) for path in allowed_paths):
-            return None
-        
-        # Check if user has flock blocks
-        has_blocks = FlockBlock.objects.filter(user=request.user).exists()
-        
-        if not has_blocks:
-            # If user is already on setup page, don't redirect again
-            if request.path == reverse('flock:flock_setup'):
-                return None
-            
-            # Show appropriate message based on where they're trying to go
-            if request.path == reverse('dashboard'):
-                messages.info(request, "🎯 Welcome! To get started, please create your first poultry block.")
-            elif 'flock' in request.path:
-                messages.warning(request, "📋 You need to complete setup first before accessing flock pages.")
-            else:
-                messages.info(request, "👋 Hello! Let's set up your poultry monitoring system by creating your first flock block.")
-            
-            # Redirect to setup page
-            return redirect('flock:flock_setup')
-        
-        return None
\ No newline at end of file
+        return any(request.path.startswith(path) for path in self.allowed_paths)
+
+    @staticmethod
+    def _on_setup_page(request):
+        # If user is already on setup page, don't redirect again
+        return request.path == reverse('flock:flock_setup')
+
+    def _setup_redirect(self, request):
+        # Show appropriate message based on where they're trying to go
+        if request.path == reverse('dashboard'):
+            messages.info(request, "🎯 Welcome! To get started, please create your first poultry block.")
+        elif 'flock' in request.path:
+            messages.warning(request, "📋 You need to complete setup first before accessing flock pages.")
+        else:
+            messages.info(request, "👋 Hello! Let's set up your poultry monitoring system by creating your first flock block.")
+
+        # Redirect to setup page
+        return redirect('flock:flock_setup')
@@ -1,3 +1,17 @@
 from django.test import TestCase
 
-# Create your tests here.
+from poultry_monitoring.testing import QueryBudgetMixin
+
+# Session and user lookups plus FlockSetupMiddleware's has-blocks check
+BASE_QUERIES = 3
+
+
+class UserViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts must not grow with the number of blocks or readings."""
+
+    def test_dashboard(self):
+        # blocks, last 20 readings of every block
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 2, lambda farm: "/users/dashboard/")
+
+    def test_profile(self):
+        self.assertBudgetForAllFarmSizes(BASE_QUERIES + 1, lambda farm: "/users/profile/")
@@ -12,8 +12,13 @@ from django.contrib.sites.shortcuts import get_current_site
 import json
 import logging
 
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
 from users.forms import RegisterForm, LoginForm, ProfileUpdateForm
 from monitoring.models import SensorData
+from monitoring.services.block_simulator import catch_up_user
+from monitoring.services.history_codec import encode_columnar
 from flock.models import FlockBlock
 from .tokens import account_activation_token
 
@@ -110,11 +115,14 @@ def profile_view(request):
 @login_required
 def dashboard(request):
     try:
+        # Bring lazily simulated blocks up to date before reading them
+        catch_up_user(request.user)
+
         # Get all flock blocks for the user
-        blocks = FlockBlock.objects.filter(user=request.user)
+        blocks = list(FlockBlock.objects.filter(user=request.user))
         
         # Check if user has any blocks
-        blocks_exist = blocks.exists()
+        blocks_exist = bool(blocks)
         
         if not blocks_exist:
             # No blocks at all - show empty state
@@ -123,26 +131,35 @@ def dashboard(request):
                 "block_data": [],
             })
         
+        # Last 20 readings of every block in one query (newest first per block)
+        recent = {}
+        for reading in SensorData.objects.filter(block__in=blocks).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('block_id')],
+                order_by=F('timestamp').desc(),
+            )
+        ).filter(row_number__lte=20).order_by('block_id', '-timestamp'):
+            recent.setdefault(reading.block_id, []).append(reading)
+        
         # User has blocks - prepare data for each block
         block_data = []
         for block in blocks:
-            # Get latest sensor data for this block
-            latest = SensorData.objects.filter(block=block).order_by('-timestamp').first()
+            readings = recent.get(block.id, [])
+            
+            # Latest sensor data for this block
+            latest = readings[0] if readings else None
             
-            # Prepare history data for chart (last 20 readings)
-            history_data = []
-            if latest:
-                history = SensorData.objects.filter(block=block).order_by('-timestamp')[:20]
-                for h in reversed(history):  # Reverse to show chronological order
-                    history_data.append({
-                        "timestamp": h.timestamp.isoformat() if h.timestamp else "",
-                        "temperature": float(h.temperature) if h.temperature else 0.0
-                    })
+            # History data for chart (last 20 readings, chronological order)
+            history = [(r.timestamp, r.temperature) for r in reversed(readings)]
             
             block_data.append({
                 "block": block,
                 "latest": latest,
-                "history_json": json.dumps(history_data),
+                "history_json": json.dumps(
+                    encode_columnar(history, metrics=("temperature",)),
+                    separators=(',', ':'),
+                ),
             })
         
         return render(request, "users/dashboard.html", {